@@ -1,3 +1,5 @@
+from pathlib import Path
+
 import bpy
 
 from ajc27_freemocap_blender_addon.core_functions.com_bos.add_bos import add_base_of_support
@@ -25,11 +27,16 @@ class FREEMOCAP_OT_add_base_of_support(bpy.types.Operator):
             # Set the show COM Vertical Projection property to True
             ui_props.show_com_vertical_projection = True
 
+        # Save the base of support data (e.g. the margin of stability) next to the recording's data
+        recording_path = context.scene.freemocap_properties.recording_path
+        output_directory = Path(recording_path) / "saved_data" if recording_path != "" else None
+
         # Add Base of Support
         add_base_of_support(data_parent_empty=data_parent_empty,
                             z_threshold=ui_props.base_of_support_z_threshold,
                             point_of_contact_radius=ui_props.base_of_support_point_radius,
-                            color=ui_props.base_of_support_color)
+                            color=ui_props.base_of_support_color,
+                            output_directory=output_directory)
 
         # Set the show Base of Support property to True
         ui_props.show_base_of_support = True
@@ -0,0 +1,51 @@
+import traceback
+
+import bpy
+
+
+class FREEMOCAP_OT_reorient_empties(bpy.types.Operator):
+    bl_idname = 'freemocap._reorient_empties'
+    bl_label = 'Reorient Empties'
+    bl_description = "Align the loaded capture to the ground and the vertical axis, moving its baked layers with it"
+    bl_options = {'REGISTER', 'UNDO_GROUPED'}
+
+    def execute(self, context):
+        from ...core_functions.empties.find_data_empties import find_data_empties
+        from ...core_functions.empties.reorient_empties import reorient_empties
+        from ...data_models.parameter_models.load_parameters_config import load_default_parameters_config
+        from ...freemocap_data_handler.utilities.get_or_create_freemocap_data_handler import \
+            get_freemocap_data_handler
+
+        handler = get_freemocap_data_handler()
+        data_parent_empty = context.scene.freemocap_properties.data_parent_empty
+        if handler is None or data_parent_empty is None:
+            print("No FreeMoCap data loaded in this session, load the data before reorienting the empties")
+            return {'CANCELLED'}
+
+        empties = find_data_empties(parent_object=data_parent_empty, trajectory_names=handler.trajectories.keys())
+        if not empties:
+            print(f"No empties of the loaded data found below {data_parent_empty.name}")
+            return {'CANCELLED'}
+        missing_names = [name for name in handler.trajectories.keys() if name not in empties]
+        if missing_names:
+            # e.g. removed as unused, the data is still reoriented so any empty made from it later matches
+            print(f"No empties found for {len(missing_names)} trajectories: {missing_names}")
+        adjust_empties_config = load_default_parameters_config().adjust_empties
+        try:
+            print("Reorienting empties....")
+            reorient_empties(
+                empties=empties,
+                z_align_ref_empty=adjust_empties_config.vertical_align_reference,
+                z_align_angle_offset=adjust_empties_config.vertical_align_angle_offset,
+                ground_ref_empty=adjust_empties_config.ground_align_reference,
+                z_translation_offset=adjust_empties_config.vertical_align_position_offset,
+                correct_fingers_empties=adjust_empties_config.correct_fingers_empties,
+                handler=handler,
+                baked_layers_parent=data_parent_empty,
+            )
+        except Exception as e:
+            print(f"Failed to reorient empties: {e}")
+            print(traceback.format_exc())
+            return {'CANCELLED'}
+
+        return {'FINISHED'}
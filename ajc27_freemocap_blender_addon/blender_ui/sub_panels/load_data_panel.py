@@ -20,6 +20,7 @@ class VIEW3D_PT_load_data(bpy.types.Panel):
         row.label(text="FreeMoCap Recording:")
         row.prop(context.scene.freemocap_properties, "recording_path", text="")
         box.operator('freemocap._load_data', text='Load Data')
+        box.operator('freemocap._reorient_empties', text='Reorient Empties')
 
         # Save data to disk panel
         box = layout.box()
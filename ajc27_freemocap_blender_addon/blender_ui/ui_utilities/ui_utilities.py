@@ -3,6 +3,18 @@ import re
 import mathutils
 import math as m
 
+import numpy as np
+
+from ajc27_freemocap_blender_addon.blender_ui.ui_utilities.geometry_nodes.create_geometry_nodes import \
+    create_geometry_nodes
+from ajc27_freemocap_blender_addon.core_functions.animation.bulk_keyframes import keyframe_property_in_bulk
+from ajc27_freemocap_blender_addon.core_functions.animation.sample_keyframes import sample_object_world_locations
+from ajc27_freemocap_blender_addon.core_functions.create_rig.rotation_math import matrices_to_eulers_xyz, \
+    normalized_rotation_matrices
+from ajc27_freemocap_blender_addon.data_models.mediapipe_names.mediapipe_biomechanics import joints_angle_points
+from ajc27_freemocap_blender_addon.freemocap_data_handler.operations.calculate_joint_angles import \
+    calculate_joint_angles
+
 
 
 # Function to draw a vector for debbuging purposes
@@ -152,86 +164,69 @@ def animate_angle_meshes(joints_angle_points: dict,
                          text_meshes: dict)->None:
 
     scene = bpy.context.scene
-
-    # Get current frame
-    current_frame = scene.frame_current
-
-    for frame in range(scene.frame_start, scene.frame_end):
-
-        scene.frame_set(frame)
-
-        for mesh in meshes:
-
-            # Get reference to the joint point
-            joint_point = bpy.data.objects[mesh]
-
-            # Get reference to the points comforming the angle
-            parent_point = bpy.data.objects[joints_angle_points[mesh]['parent']]
-            child_point = bpy.data.objects[joints_angle_points[mesh]['child']]
-
-            # Get the parent and child vectors
-            parent_vector = parent_point.matrix_world.translation - joint_point.matrix_world.translation
-            child_vector = child_point.matrix_world.translation - joint_point.matrix_world.translation
-
-            # Calculate the cross vector of the parent and child vectors to get their location plane
-            cross_vector = parent_vector.cross(child_vector)
-
-            # Get the local z-axis of the angle mesh
-            local_z = meshes[mesh].matrix_world.to_quaternion() @ mathutils.Vector((0, 0, 1))
-
-            # Calculate the rotation matrix to align the local z with the cross vector
-            rotation_matrix = local_z.rotation_difference(cross_vector).to_matrix().to_4x4()
-
-            # Apply the rotation to the angle mesh
-            meshes[mesh].matrix_world = rotation_matrix @ meshes[mesh].matrix_world
-
-            # Insert a keyframe for the mesh rotation
-            meshes[mesh].keyframe_insert(data_path="rotation_euler", frame=frame)
-
-            # Get the new local x and y axis
-            new_local_x = meshes[mesh].matrix_world.to_quaternion() @ mathutils.Vector((1, 0, 0))
-            new_local_y = meshes[mesh].matrix_world.to_quaternion() @ mathutils.Vector((0, 1, 0))
-
-            # Get the angles between the new local x axis and the parent and child vectors
-            nlx_parent_angle = m.degrees(new_local_x.angle(parent_vector))
-            nlx_child_angle = m.degrees(new_local_x.angle(child_vector))
-
-            # Get the dot product between the new local y axis and the parent and child vectors
-            nly_parent_dot = new_local_y.dot(parent_vector)
-            nly_child_dot = new_local_y.dot(child_vector)
-
-            # Get the angles around the cross vector (if the dot product is negative, angle = 360 - angle)
-            if nly_parent_dot >= 0:
-                nlx_parent_angle_norm = 360 - nlx_parent_angle
-            else:
-                nlx_parent_angle_norm = nlx_parent_angle
-
-            if nly_child_dot < 0:
-                nlx_child_angle = 360 - nlx_child_angle
-            
-            # Get the arc start angle
-            arc_start_angle = 360 - nlx_parent_angle_norm
-
-            # Get the arc sweep angle
-            arc_sweep_angle = (nlx_parent_angle_norm + nlx_child_angle) % 360
-
-            # Set the arc node start angle
-            meshes[mesh].modifiers[0].node_group.nodes["Arc"].inputs[5].default_value = m.radians(arc_start_angle)
-            # Set the arc node sweep angle
-            meshes[mesh].modifiers[0].node_group.nodes["Arc"].inputs[6].default_value = m.radians(arc_sweep_angle)
-
-            # Insert a keyframe for the arc node sweep angle
-            meshes[mesh].modifiers[0].node_group.nodes["Arc"].inputs[5].keyframe_insert(data_path='default_value', frame=frame)
-            meshes[mesh].modifiers[0].node_group.nodes["Arc"].inputs[6].keyframe_insert(data_path='default_value', frame=frame)
-
-            # Set the sweep angle in the String to Curves string value
-            text_meshes[mesh].modifiers[0].node_group.nodes["Value to String"].inputs[0].default_value = round(arc_sweep_angle, 1)
-
-            # Insert a keyframe to the corresponding text mesh
-            text_meshes[mesh].modifiers[0].node_group.nodes["Value to String"].inputs[0].keyframe_insert(data_path='default_value', frame=frame)
-
-    # Restore the current frame
-    scene.frame_current = current_frame
+    frames = np.arange(scene.frame_start, scene.frame_end)
+    if frames.shape[0] == 0:
+        return
+
+    # Read the trajectories of the points conforming the angles from their empties and calculate every angle at once
+    angle_points = {mesh: joints_angle_points[mesh] for mesh in meshes}
+    point_names = list(dict.fromkeys([name for mesh, points in angle_points.items()
+                                      for name in (mesh, points['parent'], points['child'])]))
+    point_locations = sample_object_world_locations(objects=[bpy.data.objects[name] for name in point_names],
+                                                    frames=frames)
+    joint_angles = calculate_joint_angles(
+        trajectories={name: point_locations[:, index, :] for index, name in enumerate(point_names)},
+        joints_angle_points=angle_points)
+
+    for joint_index, mesh in enumerate(joint_angles['joint_names']):
+        angle_mesh = meshes[mesh]
+
+        # Rotate the angle mesh so its local x axis points to the parent point and its local z axis is the normal of
+        # the angle plane. On frames without a plane (parallel vectors) it keeps the previous orientation
+        arc_orientations = joint_angles['arc_orientations'][:, joint_index]
+        valid_frames = ~np.isnan(arc_orientations).any(axis=(1, 2))
+        if valid_frames.any():
+            last_valid_frame = np.maximum.accumulate(np.where(valid_frames, np.arange(frames.shape[0]), -1))
+            last_valid_frame[last_valid_frame < 0] = np.argmax(valid_frames)
+            arc_orientations = arc_orientations[last_valid_frame]
+
+            # Convert the world orientations to the mesh's local rotation (its parents don't move)
+            parent_rotation = normalized_rotation_matrices(
+                np.array(angle_mesh.matrix_world @ angle_mesh.matrix_basis.inverted()))
+            rotation_eulers = np.unwrap(matrices_to_eulers_xyz(parent_rotation.T @ arc_orientations), axis=0)
+
+            angle_mesh.rotation_mode = 'XYZ'
+            angle_mesh.rotation_euler = rotation_eulers[-1]
+            keyframe_property_in_bulk(owner=angle_mesh,
+                                      property_name="rotation_euler",
+                                      values=rotation_eulers,
+                                      frames=frames)
+
+        # The arc starts at the local x axis (the parent point) and sweeps the joint angle towards the child point
+        arc_sweep_angles = joint_angles['flexion_angles'][:, joint_index]
+        arc_node = angle_mesh.modifiers[0].node_group.nodes["Arc"]
+        arc_node.inputs[5].default_value = 0
+        keyframe_socket_values(socket=arc_node.inputs[6], values=np.radians(arc_sweep_angles), frames=frames)
+
+        # Set the sweep angle in the String to Curves string value
+        keyframe_socket_values(
+            socket=text_meshes[mesh].modifiers[0].node_group.nodes["Value to String"].inputs[0],
+            values=np.round(arc_sweep_angles, 1),
+            frames=frames)
+
+
+def keyframe_socket_values(socket: bpy.types.NodeSocket,
+                           values: np.ndarray,
+                           frames: np.ndarray)->None:
+    # keep the previous value on frames where it couldn't be calculated
+    valid = ~np.isnan(values)
+    if not valid.any():
+        return
+    socket.default_value = float(values[valid][-1])
+    keyframe_property_in_bulk(owner=socket,
+                              property_name="default_value",
+                              values=values[valid],
+                              frames=frames[valid])
 
 
 def add_joint_angles(angles_color: tuple,
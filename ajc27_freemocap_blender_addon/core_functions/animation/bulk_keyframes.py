@@ -0,0 +1,88 @@
+from typing import List, Optional
+
+import bpy
+import numpy as np
+
+
+def keyframe_property_in_bulk(owner: bpy.types.bpy_struct,
+                              property_name: str,
+                              values: np.ndarray,
+                              frames: Optional[np.ndarray] = None,
+                              interpolation: Optional[str] = None,
+                              ) -> List[bpy.types.FCurve]:
+    """
+    Keyframe `owner.property_name` on every frame at once, instead of calling `keyframe_insert` once per frame.
+
+    The action and F-curves are created by a single `keyframe_insert` (so groups, action slots, etc. are set up just like
+    Blender would), then every keyframe point is allocated with `keyframe_points.add` and filled with `foreach_set`.
+    Existing keyframes on the F-curves are replaced.
+
+    `values` has shape (frame,) for single value properties (e.g. a node socket `default_value`) and (frame, channel)
+    for array properties (e.g. `location`). `frames` defaults to 0, 1, 2, ... and `interpolation` (e.g. `LINEAR`,
+    `CONSTANT`) to the user's preference for new keyframes.
+    """
+    values = np.asarray(values, dtype=np.float32)
+    if values.ndim == 1:
+        values = values[:, np.newaxis]
+    number_of_keyframes = values.shape[0]
+    if number_of_keyframes == 0:
+        return []
+
+    if frames is None:
+        frames = np.arange(number_of_keyframes)
+    frames = np.asarray(frames, dtype=np.float32)
+    if frames.shape != (number_of_keyframes,):
+        raise ValueError(f"Got {frames.shape[0]} frames for {number_of_keyframes} keyframe values")
+
+    is_array = owner.bl_rna.properties[property_name].is_array
+    indices = list(range(values.shape[1])) if is_array else [0]
+    if len(indices) != values.shape[1]:
+        raise ValueError(f"Property `{property_name}` is a single value, but got {values.shape[1]} channels")
+
+    if interpolation is None:
+        interpolation = bpy.context.preferences.edit.keyframe_new_interpolation_type
+    interpolation_value = bpy.types.Keyframe.bl_rna.properties["interpolation"].enum_items[interpolation].value
+
+    owner.keyframe_insert(data_path=property_name, index=-1, frame=float(frames[0]))
+
+    fcurves = []
+    for channel, index in enumerate(indices):
+        fcurve = find_fcurve(id_data=owner.id_data,
+                             data_path=owner.path_from_id(property_name),
+                             index=index)
+
+        keyframe_points = fcurve.keyframe_points
+        while len(keyframe_points) > number_of_keyframes:
+            keyframe_points.remove(keyframe_points[-1], fast=True)
+        keyframe_points.add(number_of_keyframes - len(keyframe_points))
+
+        frame_value = np.empty((number_of_keyframes, 2), dtype=np.float32)
+        frame_value[:, 0] = frames
+        frame_value[:, 1] = values[:, channel]
+        keyframe_points.foreach_set("co", frame_value.ravel())
+        keyframe_points.foreach_set("interpolation", np.full(number_of_keyframes, interpolation_value, dtype=np.int32))
+
+        # sorts the keyframes and recalculates the (auto) handles
+        fcurve.update()
+        fcurves.append(fcurve)
+
+    return fcurves
+
+
+def find_fcurve(id_data: bpy.types.ID, data_path: str, index: int = 0) -> Optional[bpy.types.FCurve]:
+    """
+    Find the F-curve animating `data_path[index]` in the action assigned to `id_data`
+    """
+    animation_data = id_data.animation_data
+    if animation_data is None or animation_data.action is None:
+        return None
+
+    if bpy.app.version >= (4, 4, 0):
+        # layered actions keep their F-curves per action slot
+        from bpy_extras import anim_utils
+        channelbag = anim_utils.action_get_channelbag_for_slot(animation_data.action, animation_data.action_slot)
+        if channelbag is None:
+            return None
+        return channelbag.fcurves.find(data_path, index=index)
+
+    return animation_data.action.fcurves.find(data_path, index=index)
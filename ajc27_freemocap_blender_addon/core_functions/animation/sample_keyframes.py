@@ -0,0 +1,113 @@
+from typing import List, Sequence
+
+import bpy
+import numpy as np
+
+from ajc27_freemocap_blender_addon.core_functions.animation.bulk_keyframes import find_fcurve
+
+
+def sample_property(owner: bpy.types.bpy_struct,
+                    property_name: str,
+                    frames: np.ndarray) -> np.ndarray:
+    """
+    Read the animated values of `owner.property_name` on `frames` straight from its F-curves, without `frame_set`.
+
+    Keyed frames are read in bulk with `foreach_get`, `fcurve.evaluate` is only used for frames in between keyframes
+    (or for every frame if the F-curve has modifiers). Channels without an F-curve keep the property's current value.
+    Returns a (frame, channel) array.
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    current_value = np.atleast_1d(np.array(getattr(owner, property_name), dtype=np.float64))
+    samples = np.repeat(current_value[np.newaxis, :], frames.shape[0], axis=0)
+
+    data_path = owner.path_from_id(property_name)
+    for index in range(current_value.shape[0]):
+        fcurve = find_fcurve(id_data=owner.id_data, data_path=data_path, index=index)
+        if fcurve is not None:
+            samples[:, index] = sample_fcurve(fcurve=fcurve, frames=frames)
+    return samples
+
+
+def sample_fcurve(fcurve: bpy.types.FCurve, frames: np.ndarray) -> np.ndarray:
+    frames = np.asarray(frames, dtype=np.float64)
+    samples = np.empty(frames.shape[0], dtype=np.float64)
+
+    number_of_keyframes = len(fcurve.keyframe_points)
+    keyed = np.zeros(frames.shape[0], dtype=bool)
+    if number_of_keyframes > 0 and len(fcurve.modifiers) == 0:
+        frame_value = np.empty(number_of_keyframes * 2, dtype=np.float32)
+        fcurve.keyframe_points.foreach_get("co", frame_value)
+        frame_value = frame_value.reshape(number_of_keyframes, 2)
+        frame_value = frame_value[np.argsort(frame_value[:, 0], kind="stable")]
+
+        positions = np.searchsorted(frame_value[:, 0], frames).clip(0, number_of_keyframes - 1)
+        keyed = frame_value[positions, 0] == frames
+        samples[keyed] = frame_value[positions[keyed], 1]
+
+    for frame_index in np.flatnonzero(~keyed):
+        samples[frame_index] = fcurve.evaluate(frames[frame_index])
+    return samples
+
+
+def sample_object_locations(objects: Sequence[bpy.types.Object],
+                            frames: np.ndarray,
+                            evaluate_constraints: bool = False) -> np.ndarray:
+    """
+    Sample the (parent relative) location of each object on `frames`, returns a (frame, object, xyz) array.
+
+    Locations come from the objects' F-curves. Constraints are ignored unless `evaluate_constraints` is set, in which case
+    objects that have constraints are sampled by stepping the scene through the frames (slow, it evaluates the whole
+    depsgraph on each frame).
+    """
+    frames = np.asarray(frames)
+    locations = np.empty((frames.shape[0], len(objects), 3), dtype=np.float64)
+
+    constrained_indices: List[int] = []
+    for object_index, blender_object in enumerate(objects):
+        if evaluate_constraints and len(blender_object.constraints) > 0:
+            constrained_indices.append(object_index)
+            continue
+        locations[:, object_index, :] = sample_property(owner=blender_object, property_name="location", frames=frames)
+
+    if constrained_indices:
+        scene = bpy.context.scene
+        current_frame = scene.frame_current
+        for frame_index, frame in enumerate(frames):
+            scene.frame_set(int(frame))
+            for object_index in constrained_indices:
+                locations[frame_index, object_index, :] = objects[object_index].matrix_local.translation
+        scene.frame_set(current_frame)
+
+    return locations
+
+
+def sample_object_world_locations(objects: Sequence[bpy.types.Object], frames: np.ndarray) -> np.ndarray:
+    """
+    Sample the world space location of each object on `frames`, returns a (frame, object, xyz) array.
+
+    Keyed (or static) objects are read from their F-curves and placed in the world by their current parent transform, so
+    their parents are assumed not to be animated. Objects with constraints are sampled by stepping the scene through
+    the frames.
+    """
+    frames = np.asarray(frames)
+    locations = np.empty((frames.shape[0], len(objects), 3), dtype=np.float64)
+
+    constrained_indices: List[int] = []
+    for object_index, blender_object in enumerate(objects):
+        if len(blender_object.constraints) > 0:
+            constrained_indices.append(object_index)
+            continue
+        parent_transform = np.array(blender_object.matrix_world @ blender_object.matrix_basis.inverted())
+        local_locations = sample_property(owner=blender_object, property_name="location", frames=frames)
+        locations[:, object_index, :] = local_locations @ parent_transform[:3, :3].T + parent_transform[:3, 3]
+
+    if constrained_indices:
+        scene = bpy.context.scene
+        current_frame = scene.frame_current
+        for frame_index, frame in enumerate(frames):
+            scene.frame_set(int(frame))
+            for object_index in constrained_indices:
+                locations[frame_index, object_index, :] = objects[object_index].matrix_world.translation
+        scene.frame_set(current_frame)
+
+    return locations
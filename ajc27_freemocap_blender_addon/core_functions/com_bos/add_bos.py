@@ -1,3 +1,6 @@
+from pathlib import Path
+from typing import Optional, Union
+
 import bpy
 
 from ajc27_freemocap_blender_addon.core_functions.com_bos.animate_bos_mesh import animate_base_of_support
@@ -9,7 +12,8 @@ from ajc27_freemocap_blender_addon.data_models.mediapipe_names.mediapipe_biomech
 def add_base_of_support(data_parent_empty: bpy.types.Object,
                         z_threshold: float,
                         point_of_contact_radius: float,
-                        color: tuple) -> None:
+                        color: tuple,
+                        output_directory: Optional[Union[str, Path]] = None) -> None:
     # Add a plane mesh
     bpy.ops.mesh.primitive_plane_add(enter_editmode=False,
                                      align='WORLD',
@@ -39,4 +43,6 @@ def add_base_of_support(data_parent_empty: bpy.types.Object,
     animate_base_of_support(data_parent_empty=data_parent_empty,
                             ground_contact_point_names=ground_contact_points,
                             base_of_support=base_of_support,
-                            z_threshold=z_threshold)
+                            z_threshold=z_threshold,
+                            point_of_contact_radius=point_of_contact_radius,
+                            output_directory=output_directory)
@@ -1,33 +1,49 @@
+from pathlib import Path
+from typing import Dict, Optional, Union
+
 import bpy
+import numpy as np
 
+from ajc27_freemocap_blender_addon.core_functions.animation.bulk_keyframes import keyframe_property_in_bulk
+from ajc27_freemocap_blender_addon.core_functions.animation.sample_keyframes import sample_object_world_locations
 from ajc27_freemocap_blender_addon.core_functions.com_bos.add_com_vertical_projection import COM_PROJECTION_MESH_NAME
+from ajc27_freemocap_blender_addon.core_functions.com_bos.base_of_support_math import calculate_base_of_support
+from ajc27_freemocap_blender_addon.freemocap_data_handler.utilities.file_writing import atomic_write
 
-import numpy as np
+BASE_OF_SUPPORT_NODE_GROUP_NAME = "Geometry Nodes_base_of_support"
+COM_PROJECTION_NODE_GROUP_NAME = "Geometry Nodes_COM_Vertical_Projection"
+BASE_OF_SUPPORT_DATA_FILE_NAME = "base_of_support_data.npz"
 
-def animate_base_of_support(data_parent_empty:bpy.types.Object,
+
+def animate_base_of_support(data_parent_empty: bpy.types.Object,
                             ground_contact_point_names: list,
                             base_of_support: bpy.types.Object,
-                            z_threshold: float):
-    try:
-        from shapely.geometry import Point, Polygon
-        from scipy.spatial import ConvexHull
-
-    except ImportError:
-        print("shapely module is not installed. Please install `shapely` and `scipy` to visualize the BOS mesh.")
-        return
-
-
+                            z_threshold: float,
+                            point_of_contact_radius: float = 0.0,
+                            output_directory: Optional[Union[str, Path]] = None) -> Dict[str, np.ndarray]:
+    """
+    Keyframe the base of support and COM vertical projection geometry nodes on every frame of the scene.
+
+    The contact point and center of mass trajectories are sampled from their empties once, the contact states, support
+    polygons and center of mass stability are calculated for all frames in numpy (`calculate_base_of_support`), and
+    the node inputs are keyframed in bulk. `point_of_contact_radius` is the contact circles' radius in cm.
+
+    If `output_directory` is given, the per frame results (including the margin of stability) are saved there as
+    `base_of_support_data.npz`. Returns the results by name.
+    """
     scene = bpy.context.scene
 
-    #get relevant objst
+    # get relevant objects
+    contact_point_names = []
     contact_point_objects = []
-    com_projection_mesh = None
     for point_name in ground_contact_point_names:
         for child in data_parent_empty.children_recursive:
             if point_name in child.name:
+                contact_point_names.append(point_name)
                 contact_point_objects.append(child)
                 break
 
+    com_projection_mesh = None
     for child in data_parent_empty.children_recursive:
         if COM_PROJECTION_MESH_NAME in child.name:
             com_projection_mesh = child
@@ -35,97 +51,76 @@ def animate_base_of_support(data_parent_empty:bpy.types.Object,
     if com_projection_mesh is None:
         raise ValueError("COM Projection Mesh not found")
 
-    # Set switch node index based on Blender version (to void an error)
-    switch_node_index = 1 if bpy.app.version < (4, 1, 0) else 0
-
-    # Get current frame to restore it at the end
-    current_frame = scene.frame_current
-
-    for frame in range(scene.frame_start, scene.frame_end):
-
-        scene.frame_set(frame)
-
-        # Variable to save if the base of support is visible or not (at least one point is below the threshold)
-        base_of_support_visible = False
-        for contact_point_object in contact_point_objects:
-
-            # Get the z coordinate of the point
-            contact_point_z = contact_point_object.matrix_world.translation.z
-
-            # If the z coordinate is less than the threshold, update the point circle mesh node location and enable it
-            if contact_point_z < z_threshold:
-
-                base_of_support_visible = True
-
-                # Update the x and y coordinates of the offset of the Set Position node
-                bpy.data.node_groups["Geometry Nodes_base_of_support"].nodes["Set Position_" + contact_point_object.name].inputs[3].default_value[0] = contact_point_object.matrix_world.translation.x
-                bpy.data.node_groups["Geometry Nodes_base_of_support"].nodes["Set Position_" + contact_point_object.name].inputs[3].default_value[1] = contact_point_object.matrix_world.translation.y
+    # the projection copies the x and y of the center of mass empty, sample the empty itself if it's there
+    center_of_mass_object = com_projection_mesh
+    copy_location_constraint = com_projection_mesh.constraints.get("Copy Location")
+    if copy_location_constraint is not None and copy_location_constraint.target is not None:
+        center_of_mass_object = copy_location_constraint.target
 
-                # Insert a keyframe to the corresponding point
-                bpy.data.node_groups["Geometry Nodes_base_of_support"].nodes["Set Position_" + contact_point_object.name].inputs[3].keyframe_insert(data_path='default_value', frame=frame)
+    frames = np.arange(scene.frame_start, scene.frame_end)
+    locations = sample_object_world_locations(objects=contact_point_objects + [center_of_mass_object], frames=frames)
 
-                # Enable the Mesh Switch node
-                bpy.data.node_groups["Geometry Nodes_base_of_support"].nodes["Switch_" + contact_point_object.name].inputs[switch_node_index].default_value = True
-
-                # Insert a keyframe to the corresponding point
-                bpy.data.node_groups["Geometry Nodes_base_of_support"].nodes["Switch_" + contact_point_object.name].inputs[switch_node_index].keyframe_insert(data_path='default_value', frame=frame)
-
-            else:
-
-                # Disable the Circle Mesh node
-                bpy.data.node_groups["Geometry Nodes_base_of_support"].nodes["Switch_" + contact_point_object.name].inputs[switch_node_index].default_value = False
-
-                # Insert a keyframe to the corresponding point
-                bpy.data.node_groups["Geometry Nodes_base_of_support"].nodes["Switch_" + contact_point_object.name].inputs[switch_node_index].keyframe_insert(data_path='default_value', frame=frame)
-
-        # Check if the COM Vertical Projection is intersecting with the base of support to change its material accordingly
-        if base_of_support_visible:
-
-            # Enable the BOS Visible Switch
-            bpy.data.node_groups["Geometry Nodes_COM_Vertical_Projection"].nodes["BOS Visible Switch"].inputs[switch_node_index].default_value = True
-
-            # Get the location of the COM Vertical Projection
-            com_vertical_projection_location = com_projection_mesh.matrix_world.translation
-            # Get the evaluated object with applied Geometry Nodes
-            evaluated_object = base_of_support.evaluated_get(bpy.context.evaluated_depsgraph_get())
-
-            # Get the a list of the coordinates of the points comforming the base of support
-            BOS_points = [v.co for v in evaluated_object.data.vertices]
-            if len(BOS_points) < 3:
-                continue
-            # Create the polygon object as a list of 2D points tuples from the x and y coordinates
-            points = np.array([(v[0], v[1]) for v in BOS_points])
-
-            # Create a convex hull from the list of 2D points
-            hull = ConvexHull(points)
-
-            # Get the indices of the points that form the convex hull
-            indices = hull.vertices
-
-            # Create a new list of consecutive points based on the convex hull indices
-            consecutive_points = [points[i] for i in indices]
-
-            # Initiate the Shapely objects
-            point = Point(com_vertical_projection_location[0], com_vertical_projection_location[1])
-            polygon = Polygon(consecutive_points)
-
-            # Check if the COM Vertical Projection is intersecting with the base of support
-            if polygon.contains(point):
-                # Change the material of the COM Vertical Projection to In Base of Support
-                bpy.data.node_groups["Geometry Nodes_COM_Vertical_Projection"].nodes["In-Out BOS Switch"].inputs[switch_node_index].default_value = True
-            else:
-                # Change the material of the COM Vertical Projection to Out Base of Support
-                bpy.data.node_groups["Geometry Nodes_COM_Vertical_Projection"].nodes["In-Out BOS Switch"].inputs[switch_node_index].default_value = False
-
-        else:
-            # Disable the BOS Visible Switch
-            bpy.data.node_groups["Geometry Nodes_COM_Vertical_Projection"].nodes["BOS Visible Switch"].inputs[switch_node_index].default_value = False
-
-        # Insert a keyframe to the COM Vertical Projection switch nodes
-        bpy.data.node_groups["Geometry Nodes_COM_Vertical_Projection"].nodes["In-Out BOS Switch"].inputs[switch_node_index].keyframe_insert(data_path='default_value', frame=frame)
-        bpy.data.node_groups["Geometry Nodes_COM_Vertical_Projection"].nodes["BOS Visible Switch"].inputs[switch_node_index].keyframe_insert(data_path='default_value', frame=frame)
-
-    # Restore the current frame
-    scene.frame_current = current_frame
+    base_of_support_data = calculate_base_of_support(contact_point_positions=locations[:, :-1, :],
+                                                     center_of_mass_positions=locations[:, -1, :],
+                                                     z_threshold=z_threshold,
+                                                     contact_radius=point_of_contact_radius / 100)
 
+    # Set switch node index based on Blender version (to void an error)
+    switch_node_index = 1 if bpy.app.version < (4, 1, 0) else 0
 
+    base_of_support_nodes = bpy.data.node_groups[BASE_OF_SUPPORT_NODE_GROUP_NAME].nodes
+    for point_index, point_name in enumerate(contact_point_names):
+        in_contact = base_of_support_data["contact_states"][:, point_index]
+
+        # the circle of a point is only moved (and shown) on the frames it touches the ground
+        if in_contact.any():
+            position_offset = base_of_support_nodes["Set Position_" + point_name].inputs[3]
+            offsets = np.empty((int(in_contact.sum()), 3))
+            offsets[:, :2] = locations[in_contact, point_index, :2]
+            offsets[:, 2] = position_offset.default_value[2]
+            position_offset.default_value = offsets[-1]
+            keyframe_property_in_bulk(owner=position_offset,
+                                      property_name="default_value",
+                                      values=offsets,
+                                      frames=frames[in_contact])
+
+        keyframe_switch(switch_socket=base_of_support_nodes["Switch_" + point_name].inputs[switch_node_index],
+                        states=in_contact,
+                        frames=frames)
+
+    # the COM Vertical Projection keeps its last in/out state on the frames without a base of support
+    base_of_support_visible = base_of_support_data["base_of_support_visible"]
+    com_projection_nodes = bpy.data.node_groups[COM_PROJECTION_NODE_GROUP_NAME].nodes
+    in_out_switch = com_projection_nodes["In-Out BOS Switch"].inputs[switch_node_index]
+    last_visible_frame = np.maximum.accumulate(np.where(base_of_support_visible, np.arange(frames.shape[0]), -1))
+    com_in_base_of_support = np.where(last_visible_frame >= 0,
+                                      base_of_support_data["com_in_base_of_support"][last_visible_frame.clip(0)],
+                                      bool(in_out_switch.default_value))
+
+    keyframe_switch(switch_socket=in_out_switch, states=com_in_base_of_support, frames=frames)
+    keyframe_switch(switch_socket=com_projection_nodes["BOS Visible Switch"].inputs[switch_node_index],
+                    states=base_of_support_visible,
+                    frames=frames)
+
+    base_of_support_data["frames"] = frames
+    base_of_support_data["contact_point_names"] = np.array(contact_point_names)
+
+    if output_directory is not None:
+        save_path = Path(output_directory) / BASE_OF_SUPPORT_DATA_FILE_NAME
+        save_path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_write(save_path) as file:
+            np.savez(file, **base_of_support_data)
+        print(f"Saved base of support data to {save_path}")
+
+    return base_of_support_data
+
+
+def keyframe_switch(switch_socket: bpy.types.NodeSocket, states: np.ndarray, frames: np.ndarray):
+    if len(frames) == 0:
+        return
+    switch_socket.default_value = bool(states[-1])
+    keyframe_property_in_bulk(owner=switch_socket,
+                              property_name="default_value",
+                              values=states.astype(np.float32),
+                              frames=frames,
+                              interpolation="CONSTANT")
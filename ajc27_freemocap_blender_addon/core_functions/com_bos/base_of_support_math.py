@@ -0,0 +1,119 @@
+from typing import Dict
+
+import numpy as np
+
+# tolerance for the "is on the left of the edge" tests, in squared meters
+_CROSS_PRODUCT_TOLERANCE = 1e-12
+
+
+def calculate_base_of_support(contact_point_positions: np.ndarray,
+                              center_of_mass_positions: np.ndarray,
+                              z_threshold: float,
+                              contact_radius: float = 0.0) -> Dict[str, np.ndarray]:
+    """
+    Calculate the base of support and the center of mass stability on every frame at once.
+
+    `contact_point_positions` is a (frame, contact_point, xyz) array and `center_of_mass_positions` a (frame, xyz) array,
+    both in world space. A contact point touches the ground on frames where its z is below `z_threshold`, and the base
+    of support is the convex hull of the touching points, grown by `contact_radius` (the radius of the contact circles).
+
+    Returns (frame, ...) arrays:
+    - `contact_states`: (frame, contact_point) bool, whether each point touches the ground
+    - `base_of_support_visible`: whether at least one point touches the ground
+    - `com_in_base_of_support`: whether the vertical projection of the center of mass is inside the base of support
+    - `margin_of_stability`: signed distance (m) from the center of mass projection to the edge of the base of support,
+      positive inside, NaN on frames without a base of support
+    """
+    contact_point_positions = np.asarray(contact_point_positions, dtype=np.float64)
+    center_of_mass_positions = np.asarray(center_of_mass_positions, dtype=np.float64)
+
+    with np.errstate(invalid="ignore"):
+        contact_states = contact_point_positions[..., 2] < z_threshold
+
+    margin_of_stability = signed_distance_to_convex_hull(points=contact_point_positions[..., :2],
+                                                         active=contact_states,
+                                                         query_points=center_of_mass_positions[..., :2])
+    margin_of_stability += contact_radius
+
+    with np.errstate(invalid="ignore"):
+        com_in_base_of_support = margin_of_stability >= 0
+
+    return {
+        "contact_states": contact_states,
+        "base_of_support_visible": contact_states.any(axis=1),
+        "com_in_base_of_support": com_in_base_of_support,
+        "margin_of_stability": margin_of_stability,
+    }
+
+
+def signed_distance_to_convex_hull(points: np.ndarray,
+                                   active: np.ndarray,
+                                   query_points: np.ndarray) -> np.ndarray:
+    """
+    Signed distance from each frame's query point to the convex hull of that frame's active points (positive inside).
+
+    `points` is (frame, point, xy), `active` (frame, point) and `query_points` (frame, xy). Meant for small point sets
+    (e.g. the feet contact points): every ordered pair of points is tested as a hull edge, which is
+    O(frames x points^3) but fully vectorized. The distance is measured to the hull's boundary edges only, points
+    inside the hull don't count. Degenerate hulls (a single point or a segment) have no inside, so the distance to them
+    (to the point or segment) is always negative. Frames without active points (or with NaN points) give NaN.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    active = np.asarray(active, dtype=bool) & ~np.isnan(points).any(axis=-1)
+    query_points = np.asarray(query_points, dtype=np.float64)
+    if points.shape[1] == 0:
+        return np.full(points.shape[0], np.nan)
+
+    # (frame, i, j, xy) edge vectors from point i to point j
+    edges = points[:, np.newaxis, :, :] - points[:, :, np.newaxis, :]
+    # cross[f, i, j, k] = cross(p_j - p_i, p_k - p_i), positive if point k is on the left of the edge i -> j
+    cross = (edges[:, :, :, np.newaxis, 0] * edges[:, :, np.newaxis, :, 1]
+             - edges[:, :, :, np.newaxis, 1] * edges[:, :, np.newaxis, :, 0])
+
+    # i -> j is a (counter-clockwise) hull edge if no active point is on its right
+    with np.errstate(invalid="ignore"):
+        right_of_edge = (cross < -_CROSS_PRODUCT_TOLERANCE) & active[:, np.newaxis, np.newaxis, :]
+    is_hull_edge = ~right_of_edge.any(axis=-1) & active[:, :, np.newaxis] & active[:, np.newaxis, :]
+
+    to_query = query_points[:, np.newaxis, :] - points
+    edge_lengths_squared = np.einsum("fijx,fijx->fij", edges, edges)
+    proper_hull_edge = is_hull_edge & (edge_lengths_squared > 0)
+    # the hull is flat (a point or a segment) if every proper hull edge is also a hull edge in the opposite direction
+    is_flat = ~(proper_hull_edge & ~np.swapaxes(proper_hull_edge, 1, 2)).any(axis=(1, 2))
+
+    # distance from the query point to the closest hull edge (as a segment). Zero length "edges" (i == j, or duplicate
+    # points) hold for every active point, so they are only used when the hull is flat - when it is a single point
+    boundary_edge = np.where(is_flat[:, np.newaxis, np.newaxis], is_hull_edge, proper_hull_edge)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        along_edge = np.einsum("fijx,fix->fij", edges, to_query) / edge_lengths_squared
+    along_edge = np.clip(np.nan_to_num(along_edge, nan=0.0), 0.0, 1.0)
+    closest_points = points[:, :, np.newaxis, :] + along_edge[..., np.newaxis] * edges
+    distances = np.linalg.norm(query_points[:, np.newaxis, np.newaxis, :] - closest_points, axis=-1)
+    distances = np.where(boundary_edge, distances, np.inf).min(axis=(1, 2))
+
+    # inside if the query point is on the left of every hull edge, and the hull isn't flat
+    query_cross = edges[..., 0] * to_query[:, :, np.newaxis, 1] - edges[..., 1] * to_query[:, :, np.newaxis, 0]
+    with np.errstate(invalid="ignore"):
+        query_on_right = (query_cross < -_CROSS_PRODUCT_TOLERANCE) & proper_hull_edge
+    inside = ~query_on_right.any(axis=(1, 2)) & ~is_flat
+
+    signed_distances = np.where(inside, distances, -distances)
+    signed_distances[~active.any(axis=1)] = np.nan
+    return signed_distances
+
+
+if __name__ == "__main__":
+    # check against known hulls: a unit square with a contact point in its center, then the segment and the point left
+    # when the contact points lift off
+    square_points = np.array([[[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0], [0.5, 0.5]]] * 4)
+    square_active = np.array([[True] * 5,
+                              [True] * 5,
+                              [True, True, False, False, False],
+                              [True, False, False, False, False]])
+    square_queries = np.array([[0.5, 0.45], [1.5, 0.5], [0.5, 0.5], [0.0, 2.0]])
+    square_distances = signed_distance_to_convex_hull(points=square_points,
+                                                      active=square_active,
+                                                      query_points=square_queries)
+    expected_distances = np.array([0.45, -0.5, -0.5, -2.0])
+    assert np.allclose(square_distances, expected_distances), f"{square_distances} != {expected_distances}"
+    print(f"Signed distances to the known hulls: {square_distances}")
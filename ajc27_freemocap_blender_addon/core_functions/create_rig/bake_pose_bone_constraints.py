@@ -0,0 +1,157 @@
+import math as m
+from typing import Dict, List, Optional
+
+import bpy
+import numpy as np
+
+from ajc27_freemocap_blender_addon.core_functions.animation.bulk_keyframes import keyframe_property_in_bulk
+from ajc27_freemocap_blender_addon.core_functions.animation.sample_keyframes import sample_object_world_locations
+from ajc27_freemocap_blender_addon.core_functions.create_rig.constraint_math import copy_location, damped_track, \
+    limit_rotation, locked_track
+from ajc27_freemocap_blender_addon.core_functions.create_rig.rotation_math import make_quaternions_continuous, \
+    matrices_to_quaternions
+
+BAKEABLE_CONSTRAINT_TYPES = ["COPY_LOCATION", "DAMPED_TRACK", "LOCKED_TRACK", "LIMIT_ROTATION"]
+
+
+def bake_pose_bone_constraints(rig: bpy.types.Object,
+                               frames: Optional[np.ndarray] = None,
+                               remove_constraints: bool = True) -> List[str]:
+    """
+    Bake the rig's pose bone constraints into quaternion (and location) keyframes, without stepping through the frames.
+
+    The constraint targets are sampled from their F-curves once, then the constraints are evaluated in NumPy bone by
+    bone, parents first, over every frame at once - the same math Blender does on each frame. The resulting local
+    (basis) transforms are written as bulk F-curves and, if `remove_constraints` is set, the baked constraints are
+    removed so playback and exports no longer evaluate them. `frames` defaults to the scene's frame range.
+
+    Returns the names of the baked bones. Raises a `ValueError` (before changing anything) if a constraint can not be
+    baked - see `BAKEABLE_CONSTRAINT_TYPES` and `check_constraint_is_bakeable`.
+    """
+    if frames is None:
+        scene = bpy.context.scene
+        frames = np.arange(scene.frame_start, scene.frame_end + 1)
+    frames = np.asarray(frames)
+    # the rig and target world matrices must be up to date (e.g. after parenting the rig)
+    bpy.context.view_layer.update()
+    print(f"Baking the constraints of {rig.name} on {frames.shape[0]} frames...")
+
+    bones = get_bones_parents_first(rig)
+    bone_constraints = {}
+    for bone in bones:
+        constraints = [constraint for constraint in rig.pose.bones[bone.name].constraints if not constraint.mute]
+        for constraint in constraints:
+            check_constraint_is_bakeable(constraint=constraint, bone=bone)
+        if constraints:
+            bone_constraints[bone.name] = constraints
+
+    # every target's location on every frame, in the armature's space
+    targets = list({constraint.target.name: constraint.target
+                    for constraints in bone_constraints.values()
+                    for constraint in constraints
+                    if getattr(constraint, "target", None) is not None}.values())
+    world_to_armature = np.linalg.inv(np.array(rig.matrix_world))
+    target_locations = sample_object_world_locations(objects=targets, frames=frames)
+    target_locations = target_locations @ world_to_armature[:3, :3].T + world_to_armature[:3, 3]
+    target_index = {target.name: index for index, target in enumerate(targets)}
+
+    pose_matrices: Dict[str, np.ndarray] = {}
+    for bone in bones:
+        pose_bone = rig.pose.bones[bone.name]
+        rest_matrix = np.array(bone.matrix_local)
+        if bone.parent is None:
+            unposed_matrices = np.broadcast_to(rest_matrix, (frames.shape[0], 4, 4))
+        else:
+            parent_rest_matrix = np.array(bone.parent.matrix_local)
+            unposed_matrices = pose_matrices[bone.parent.name] @ (np.linalg.inv(parent_rest_matrix) @ rest_matrix)
+
+        matrices = unposed_matrices @ np.array(pose_bone.matrix_basis)
+        for constraint in bone_constraints.get(bone.name, []):
+            if constraint.type == "LIMIT_ROTATION":
+                # local space: relative to the bone's rest pose, under its posed parent
+                local_matrices = np.linalg.solve(unposed_matrices, matrices)
+                local_matrices = limit_rotation(local_matrices,
+                                                use_limits=[constraint.use_limit_x,
+                                                            constraint.use_limit_y,
+                                                            constraint.use_limit_z],
+                                                minimums=[constraint.min_x, constraint.min_y, constraint.min_z],
+                                                maximums=[constraint.max_x, constraint.max_y, constraint.max_z],
+                                                wrap_angles=not getattr(constraint, "use_legacy_behavior", True))
+                matrices = unposed_matrices @ local_matrices
+                continue
+
+            locations = target_locations[:, target_index[constraint.target.name], :]
+            if constraint.type == "COPY_LOCATION":
+                matrices = copy_location(matrices, locations)
+            elif constraint.type == "DAMPED_TRACK":
+                matrices = damped_track(matrices, locations, track_axis=constraint.track_axis)
+            elif constraint.type == "LOCKED_TRACK":
+                matrices = locked_track(matrices, locations,
+                                        track_axis=constraint.track_axis,
+                                        lock_axis=constraint.lock_axis)
+        pose_matrices[bone.name] = matrices
+
+        if bone.name not in bone_constraints:
+            continue
+
+        basis_matrices = np.linalg.solve(unposed_matrices, matrices)
+        pose_bone.rotation_mode = 'QUATERNION'
+        keyframe_property_in_bulk(owner=pose_bone,
+                                  property_name="rotation_quaternion",
+                                  values=make_quaternions_continuous(matrices_to_quaternions(basis_matrices)),
+                                  frames=frames)
+        if any(constraint.type == "COPY_LOCATION" for constraint in bone_constraints[bone.name]):
+            keyframe_property_in_bulk(owner=pose_bone,
+                                      property_name="location",
+                                      values=basis_matrices[:, :3, 3],
+                                      frames=frames)
+
+    if remove_constraints:
+        for bone_name, constraints in bone_constraints.items():
+            for constraint in constraints:
+                rig.pose.bones[bone_name].constraints.remove(constraint)
+
+    print(f"Baked the constraints of {len(bone_constraints)} bones")
+    return list(bone_constraints.keys())
+
+
+def check_constraint_is_bakeable(constraint: bpy.types.Constraint, bone: bpy.types.Bone) -> None:
+    """
+    Raise a `ValueError` unless the constraint (and its bone) only use settings `bake_pose_bone_constraints` evaluates:
+    full influence, world space object targets, a standard bone parenting, and the plain copy location / local limit
+    rotation the rig is built with
+    """
+    problem = None
+    if bone.use_inherit_rotation is False or getattr(bone, "inherit_scale", "FULL") != "FULL" \
+            or bone.use_local_location is False or bone.use_relative_parent:
+        problem = "the bone does not fully inherit its parent's transform"
+    elif constraint.type not in BAKEABLE_CONSTRAINT_TYPES:
+        problem = f"type {constraint.type} is not supported"
+    elif not m.isclose(constraint.influence, 1.0):
+        problem = f"influence {constraint.influence} is not 1"
+    elif constraint.type == "LIMIT_ROTATION":
+        if constraint.owner_space != "LOCAL":
+            problem = f"owner space {constraint.owner_space} is not LOCAL"
+    elif getattr(constraint, "target", None) is None:
+        problem = "it has no target"
+    elif constraint.target.type == "ARMATURE" and getattr(constraint, "subtarget", ""):
+        problem = "bone targets are not supported"
+    elif constraint.type == "COPY_LOCATION" and (
+            not (constraint.use_x and constraint.use_y and constraint.use_z)
+            or constraint.invert_x or constraint.invert_y or constraint.invert_z
+            or constraint.use_offset
+            or constraint.target_space != "WORLD" or constraint.owner_space != "WORLD"):
+        problem = "only world space copy location on every axis, without offset, is supported"
+
+    if problem is not None:
+        raise ValueError(f"Can not bake constraint `{constraint.name}` of bone `{bone.name}`: {problem}")
+
+
+def get_bones_parents_first(rig: bpy.types.Object) -> List[bpy.types.Bone]:
+    bones = []
+    stack = [bone for bone in list(rig.data.bones)[::-1] if bone.parent is None]
+    while stack:
+        bone = stack.pop()
+        bones.append(bone)
+        stack.extend(list(bone.children)[::-1])
+    return bones
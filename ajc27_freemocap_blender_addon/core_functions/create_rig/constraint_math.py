@@ -0,0 +1,153 @@
+from typing import Sequence, Tuple
+
+import numpy as np
+
+from ajc27_freemocap_blender_addon.core_functions.create_rig.rotation_math import eulers_xyz_to_matrices, \
+    matrices_to_eulers_xyz
+
+# Vectorized versions of the Blender constraints used by the rig. Each one takes (..., 4, 4) owner matrices and (..., 3)
+# target locations in the same space and returns the constrained matrices, leaving the matrices unchanged wherever the
+# target is NaN or the constraint is undefined (e.g. the target sits on the owner's head), like Blender does.
+
+AXIS_INDICES = {"X": 0, "Y": 1, "Z": 2}
+
+_EPSILON = 1e-7
+
+
+def parse_track_axis(track_axis: str) -> Tuple[int, float]:
+    """
+    'TRACK_NEGATIVE_X' -> (0, -1.0), 'TRACK_Y' -> (1, 1.0), ...
+    """
+    return AXIS_INDICES[track_axis[-1]], -1.0 if "NEGATIVE" in track_axis else 1.0
+
+
+def parse_lock_axis(lock_axis: str) -> int:
+    """
+    'LOCK_X' -> 0, ...
+    """
+    return AXIS_INDICES[lock_axis[-1]]
+
+
+def copy_location(matrices: np.ndarray, target_locations: np.ndarray) -> np.ndarray:
+    """
+    COPY_LOCATION on every axis, without offset
+    """
+    result = np.array(matrices, dtype=np.float64, copy=True)
+    valid = np.isfinite(target_locations).all(axis=-1)
+    result[valid, :3, 3] = target_locations[valid]
+    return result
+
+
+def damped_track(matrices: np.ndarray, target_locations: np.ndarray, track_axis: str) -> np.ndarray:
+    """
+    DAMPED_TRACK - the smallest rotation that points the owner's track axis at the target, about the owner's head
+    """
+    axis_index, sign = parse_track_axis(track_axis)
+    result = np.array(matrices, dtype=np.float64, copy=True)
+    rotations = result[..., :3, :3]
+
+    owner_axes = sign * _normalized(rotations[..., :, axis_index])
+    target_directions = target_locations - result[..., :3, 3]
+    target_distances = np.linalg.norm(target_directions, axis=-1)
+    valid = np.isfinite(target_distances) & (target_distances > _EPSILON)
+
+    turns = rotations_between_vectors(owner_axes[valid], _normalized(target_directions[valid]))
+    result[valid, :3, :3] = turns @ rotations[valid]
+    return result
+
+
+def locked_track(matrices: np.ndarray, target_locations: np.ndarray, track_axis: str, lock_axis: str) -> np.ndarray:
+    """
+    LOCKED_TRACK - rotate about the owner's lock axis so its track axis points as close to the target as it can
+    """
+    track_index, sign = parse_track_axis(track_axis)
+    lock_index = parse_lock_axis(lock_axis)
+    if track_index == lock_index:
+        raise ValueError(f"Locked track can not track and lock the same axis ({track_axis}, {lock_axis})")
+    third_index = 3 - track_index - lock_index
+
+    result = np.array(matrices, dtype=np.float64, copy=True)
+    rotations = result[..., :3, :3]
+    scales = np.linalg.norm(rotations, axis=-2)
+
+    lock_axes = _normalized(rotations[..., :, lock_index])
+    target_directions = target_locations - result[..., :3, 3]
+    # the target direction projected on the plane the track axis can turn in
+    projected = target_directions - np.sum(target_directions * lock_axes, axis=-1, keepdims=True) * lock_axes
+    projected_lengths = np.linalg.norm(projected, axis=-1)
+    valid = np.isfinite(projected_lengths) & (projected_lengths > _EPSILON)
+
+    axes = np.empty(rotations.shape, dtype=np.float64)
+    axes[..., :, lock_index] = lock_axes
+    axes[..., :, track_index] = sign * _normalized(projected)
+    axes[..., :, third_index] = np.cross(axes[..., :, (third_index + 1) % 3], axes[..., :, (third_index + 2) % 3])
+
+    result[valid, :3, :3] = axes[valid] * scales[valid][..., np.newaxis, :]
+    return result
+
+
+def limit_rotation(local_matrices: np.ndarray,
+                   use_limits: Sequence[bool],
+                   minimums: Sequence[float],
+                   maximums: Sequence[float],
+                   wrap_angles: bool = False) -> np.ndarray:
+    """
+    LIMIT_ROTATION - clamp the 'XYZ' Euler angles (radians) of (..., 4, 4) matrices in the owner space of the constraint.
+
+    Angles outside a range are clamped to the nearest end of the range, or, with `wrap_angles` (Blender 4.2+ when the
+    constraint's legacy behavior is off), to the end that is angularly closest.
+    """
+    use_limits = np.asarray(use_limits, dtype=bool)
+    minimums = np.asarray(minimums, dtype=np.float64)
+    maximums = np.asarray(maximums, dtype=np.float64)
+
+    result = np.array(local_matrices, dtype=np.float64, copy=True)
+    scales = np.linalg.norm(result[..., :3, :3], axis=-2)
+    eulers = matrices_to_eulers_xyz(result)
+
+    clamped = np.clip(eulers, minimums, maximums)
+    if wrap_angles:
+        outside = (eulers < minimums) | (eulers > maximums)
+        to_minimum = np.abs(_wrapped_angles(eulers - minimums))
+        to_maximum = np.abs(_wrapped_angles(eulers - maximums))
+        clamped = np.where(outside, np.where(to_minimum <= to_maximum, minimums, maximums), eulers)
+    eulers = np.where(use_limits, clamped, eulers)
+
+    result[..., :3, :3] = eulers_xyz_to_matrices(eulers) * scales[..., np.newaxis, :]
+    return result
+
+
+def rotations_between_vectors(from_vectors: np.ndarray, to_vectors: np.ndarray) -> np.ndarray:
+    """
+    (..., 3, 3) smallest rotations taking the (..., 3) unit `from_vectors` to the unit `to_vectors`. Opposite vectors
+    are turned half way round about an axis perpendicular to them
+    """
+    cross = np.cross(from_vectors, to_vectors)
+    sines = np.linalg.norm(cross, axis=-1)
+    cosines = np.sum(from_vectors * to_vectors, axis=-1)
+
+    # Rodrigues' formula, R = I + K + K^2 (1 - cos) / sin^2 with K the cross product matrix of the (unnormalized) axis
+    cross_matrices = np.zeros(cross.shape[:-1] + (3, 3), dtype=np.float64)
+    cross_matrices[..., 0, 1], cross_matrices[..., 0, 2] = -cross[..., 2], cross[..., 1]
+    cross_matrices[..., 1, 0], cross_matrices[..., 1, 2] = cross[..., 2], -cross[..., 0]
+    cross_matrices[..., 2, 0], cross_matrices[..., 2, 1] = -cross[..., 1], cross[..., 0]
+    turning = sines > _EPSILON
+    factors = np.divide(1 - cosines, sines ** 2, out=np.zeros_like(sines), where=turning)
+    rotations = np.eye(3) + cross_matrices + cross_matrices @ cross_matrices * factors[..., np.newaxis, np.newaxis]
+
+    opposite = ~turning & (cosines < 0)
+    if opposite.any():
+        from_opposite = from_vectors[opposite]
+        helper_axes = np.where(np.abs(from_opposite[..., :1]) < 0.9, [1.0, 0.0, 0.0], [0.0, 1.0, 0.0])
+        half_turn_axes = _normalized(np.cross(from_opposite, helper_axes))
+        rotations[opposite] = 2 * half_turn_axes[..., :, np.newaxis] * half_turn_axes[..., np.newaxis, :] - np.eye(3)
+    return rotations
+
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    lengths = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return np.divide(vectors, lengths, out=np.zeros_like(vectors, dtype=np.float64), where=lengths > 0)
+
+
+def _wrapped_angles(angles: np.ndarray) -> np.ndarray:
+    return (angles + np.pi) % (2 * np.pi) - np.pi
@@ -5,6 +5,8 @@ import bpy
 from ajc27_freemocap_blender_addon.core_functions.create_rig.add_rig_by_method import add_rig_by_method
 from ajc27_freemocap_blender_addon.core_functions.create_rig.add_rig_method_enum import AddRigMethods
 from ajc27_freemocap_blender_addon.core_functions.create_rig.apply_bone_constraints import apply_bone_constraints
+from ajc27_freemocap_blender_addon.core_functions.create_rig.bake_pose_bone_constraints import \
+    bake_pose_bone_constraints
 from ajc27_freemocap_blender_addon.data_models.bones.bone_constraints import Constraint
 from ajc27_freemocap_blender_addon.data_models.data_references import ArmatureType, PoseType
 
@@ -18,6 +20,7 @@ def create_rig(
         add_fingers_constraints: bool = False,
         bone_constraint_definitions=Dict[str, Constraint],
         use_limit_rotation: bool = False,
+        bake_animation: bool = False,
 ) -> bpy.types.Object:
     # Deselect all objects
     for object in bpy.data.objects:
@@ -45,10 +48,14 @@ def create_rig(
     )
 
     ### Bake animation to the rig ###
-    # Get the empties ending frame
-    ending_frame = int(bpy.data.actions[0].frame_range[1])
-    # Bake animation
-    bpy.ops.nla.bake(frame_start=1, frame_end=ending_frame, bake_types={"POSE"})
+    if bake_animation:
+        # Compute the pose bone rotations from the empties' keyframes and replace the constraints with them
+        bake_pose_bone_constraints(rig=rig, remove_constraints=True)
+    else:
+        # Get the empties ending frame
+        ending_frame = int(bpy.data.actions[0].frame_range[1])
+        # Bake animation
+        bpy.ops.nla.bake(frame_start=1, frame_end=ending_frame, bake_types={"POSE"})
 
     # Change back to Object Mode
     bpy.ops.object.mode_set(mode="OBJECT")
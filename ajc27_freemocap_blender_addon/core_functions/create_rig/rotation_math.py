@@ -0,0 +1,122 @@
+import numpy as np
+
+
+def normalized_rotation_matrices(matrices: np.ndarray) -> np.ndarray:
+    """
+    Return the (..., 3, 3) rotation part of (..., 3|4, 3|4) matrices with unit length axes (i.e. scale removed),
+    like `mathutils.Matrix.to_quaternion` / `to_euler` do before converting
+    """
+    rotations = np.array(matrices[..., :3, :3], dtype=np.float64)
+    axis_lengths = np.linalg.norm(rotations, axis=-2, keepdims=True)
+    np.divide(rotations, axis_lengths, out=rotations, where=axis_lengths > 0)
+    return rotations
+
+
+def matrices_to_quaternions(matrices: np.ndarray) -> np.ndarray:
+    """
+    Convert (..., 3|4, 3|4) matrices to (..., 4) unit quaternions in Blender's (w, x, y, z) order, with w >= 0
+    """
+    rotations = normalized_rotation_matrices(matrices)
+    r = {(row, column): rotations[..., row, column] for row in range(3) for column in range(3)}
+    trace = r[0, 0] + r[1, 1] + r[2, 2]
+
+    # Shepperd's method - build the quaternion from the largest of w, x, y, z for numerical stability
+    with np.errstate(divide="ignore", invalid="ignore"):
+        candidates = []
+
+        s = 2 * np.sqrt(np.maximum(1 + trace, 0))
+        candidates.append([s / 4, (r[2, 1] - r[1, 2]) / s, (r[0, 2] - r[2, 0]) / s, (r[1, 0] - r[0, 1]) / s])
+
+        s = 2 * np.sqrt(np.maximum(1 + r[0, 0] - r[1, 1] - r[2, 2], 0))
+        candidates.append([(r[2, 1] - r[1, 2]) / s, s / 4, (r[0, 1] + r[1, 0]) / s, (r[0, 2] + r[2, 0]) / s])
+
+        s = 2 * np.sqrt(np.maximum(1 + r[1, 1] - r[0, 0] - r[2, 2], 0))
+        candidates.append([(r[0, 2] - r[2, 0]) / s, (r[0, 1] + r[1, 0]) / s, s / 4, (r[1, 2] + r[2, 1]) / s])
+
+        s = 2 * np.sqrt(np.maximum(1 + r[2, 2] - r[0, 0] - r[1, 1], 0))
+        candidates.append([(r[1, 0] - r[0, 1]) / s, (r[0, 2] + r[2, 0]) / s, (r[1, 2] + r[2, 1]) / s, s / 4])
+
+    # (..., candidate, wxyz)
+    candidates = np.stack([np.stack(candidate, axis=-1) for candidate in candidates], axis=-2)
+    best = np.argmax(np.stack([trace, r[0, 0], r[1, 1], r[2, 2]], axis=-1), axis=-1)
+    quaternions = np.take_along_axis(candidates, best[..., np.newaxis, np.newaxis], axis=-2)[..., 0, :]
+
+    quaternions /= np.linalg.norm(quaternions, axis=-1, keepdims=True)
+    quaternions *= np.where(quaternions[..., :1] < 0, -1.0, 1.0)
+    return quaternions
+
+
+def quaternions_to_matrices(quaternions: np.ndarray) -> np.ndarray:
+    """
+    Convert (..., 4) quaternions in Blender's (w, x, y, z) order to (..., 3, 3) rotation matrices (they are normalized
+    first, like `mathutils.Quaternion.to_matrix` does)
+    """
+    quaternions = np.asarray(quaternions, dtype=np.float64)
+    lengths = np.linalg.norm(quaternions, axis=-1, keepdims=True)
+    w, x, y, z = np.moveaxis(np.divide(quaternions, lengths, out=np.zeros_like(quaternions), where=lengths > 0), -1, 0)
+
+    return np.stack([
+        np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)], axis=-1),
+        np.stack([2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)], axis=-1),
+        np.stack([2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)], axis=-1),
+    ], axis=-2)
+
+
+def matrices_to_eulers_xyz(matrices: np.ndarray) -> np.ndarray:
+    """
+    Convert (..., 3|4, 3|4) matrices to (..., 3) 'XYZ' Euler angles (radians).
+
+    Same as `mathutils.Matrix.to_euler('XYZ')` - of the two equivalent solutions, the one with the smallest total
+    rotation is returned.
+    """
+    rotations = normalized_rotation_matrices(matrices)
+    r = {(row, column): rotations[..., row, column] for row in range(3) for column in range(3)}
+    cos_y = np.hypot(r[0, 0], r[1, 0])
+
+    first = np.stack([np.arctan2(r[2, 1], r[2, 2]),
+                      np.arctan2(-r[2, 0], cos_y),
+                      np.arctan2(r[1, 0], r[0, 0])], axis=-1)
+    second = np.stack([np.arctan2(-r[2, 1], -r[2, 2]),
+                       np.arctan2(-r[2, 0], -cos_y),
+                       np.arctan2(-r[1, 0], -r[0, 0])], axis=-1)
+
+    # gimbal lock - x and z rotate around the same axis, put it all in x
+    gimbal_locked = cos_y <= 16 * np.finfo(np.float32).eps
+    locked = np.stack([np.arctan2(-r[1, 2], r[1, 1]),
+                       np.arctan2(-r[2, 0], cos_y),
+                       np.zeros_like(cos_y)], axis=-1)
+    first = np.where(gimbal_locked[..., np.newaxis], locked, first)
+    second = np.where(gimbal_locked[..., np.newaxis], locked, second)
+
+    use_second = np.abs(first).sum(axis=-1) > np.abs(second).sum(axis=-1)
+    return np.where(use_second[..., np.newaxis], second, first)
+
+
+def eulers_xyz_to_matrices(eulers: np.ndarray) -> np.ndarray:
+    """
+    Convert (..., 3) 'XYZ' Euler angles (radians) to (..., 3, 3) rotation matrices, like `mathutils.Euler.to_matrix`
+    """
+    eulers = np.asarray(eulers, dtype=np.float64)
+    cos_x, cos_y, cos_z = np.moveaxis(np.cos(eulers), -1, 0)
+    sin_x, sin_y, sin_z = np.moveaxis(np.sin(eulers), -1, 0)
+
+    # Rz @ Ry @ Rx
+    return np.stack([
+        np.stack([cos_y * cos_z, sin_x * sin_y * cos_z - cos_x * sin_z, cos_x * sin_y * cos_z + sin_x * sin_z], axis=-1),
+        np.stack([cos_y * sin_z, sin_x * sin_y * sin_z + cos_x * cos_z, cos_x * sin_y * sin_z - sin_x * cos_z], axis=-1),
+        np.stack([-sin_y, sin_x * cos_y, cos_x * cos_y], axis=-1),
+    ], axis=-2)
+
+
+def make_quaternions_continuous(quaternions: np.ndarray) -> np.ndarray:
+    """
+    Flip the sign of (frame, ..., 4) quaternions where needed so each one is in the same hemisphere as the one on the
+    previous frame (q and -q are the same rotation, but keyframes interpolate the long way round between them)
+    """
+    quaternions = np.array(quaternions, dtype=np.float64, copy=True)
+    if quaternions.shape[0] < 2:
+        return quaternions
+    flips = np.sum(quaternions[1:] * quaternions[:-1], axis=-1) < 0
+    signs = np.cumprod(np.where(flips, -1.0, 1.0), axis=0)
+    quaternions[1:] *= signs[..., np.newaxis]
+    return quaternions
@@ -1,85 +1,130 @@
-import csv
+import json
 from pathlib import Path
 from typing import Dict, List
 
 import bpy
+import numpy as np
 
-from ajc27_freemocap_blender_addon.data_models.bones.bone_constraints import get_bone_constraint_definitions
+from ajc27_freemocap_blender_addon.core_functions.create_rig.rotation_math import matrices_to_eulers_xyz, \
+    matrices_to_quaternions
+from ajc27_freemocap_blender_addon.freemocap_data_handler.utilities.file_writing import atomic_write, write_csv
+
+EULER_ORDER = "XYZ"
+
+# data saved for each bone -> the names of its components, in column order
+BONE_DATA_COMPONENTS = {
+    "head_center_world": ["x", "y", "z"],
+    "tail_center_world": ["x", "y", "z"],
+    "rotation_quaternion": ["x", "y", "z", "w"],
+    "rotation_euler": ["x", "y", "z"],
+    "matrix": [f"{row}_{column}" for row in range(4) for column in range(4)],
+}
 
 
 def save_bone_and_joint_angles_from_rig(rig: bpy.types.Object,
                                         bone_names: List[str],
                                         csv_save_path: str,
                                         start_frame: int,
-                                        end_frame: int):
-    Path(csv_save_path).parent.mkdir(parents=True, exist_ok=True)
-    documentation_save_path = Path(csv_save_path).parent / "_BONE_AND_JOINT_DATA_README.md"
+                                        end_frame: int,
+                                        save_csv: bool = False):
+    """
+    Save the pose bones' head/tail positions, rotations and matrices on every frame from `start_frame` to `end_frame`.
+
+    Writes a `.npz` file (next to `csv_save_path`) with one (frame, bone, ...) array per entry of `BONE_DATA_COMPONENTS`,
+    plus a `_columns.json` index describing them. The (large) csv file is only written if `save_csv` is set.
+    """
+    csv_save_path = Path(csv_save_path)
+    csv_save_path.parent.mkdir(parents=True, exist_ok=True)
+    documentation_save_path = csv_save_path.parent / "_BONE_AND_JOINT_DATA_README.md"
+    npz_save_path = csv_save_path.with_suffix(".npz")
+    column_index_save_path = csv_save_path.with_name(f"{csv_save_path.stem}_columns.json")
 
     if rig.type != 'ARMATURE':
         raise TypeError(f"`rig` is not an armature!")
-    all_bone_data = {}
-    for frame_number in range(start_frame, end_frame + 1):
-        bpy.context.scene.frame_set(frame_number)
-        frame_data = {}
-        all_bone_data[frame_number] = frame_data
-        for bone in rig.pose.bones:
-            if bone.name not in bone_names:
-                continue
-            frame_data[bone.name] = get_bone_data(bone)
-
-    # Save as csv
-    column_names = []
-    for bone_key in all_bone_data[0].keys():
-        for data_name in list(next(iter(frame_data.values())).keys()):
-            column_names.append(f"{bone_key}_{data_name}")
-
-    with open(csv_save_path, 'w', newline='') as file:
-        writer = csv.DictWriter(file, fieldnames=column_names)
-        writer.writeheader()
-        for frame_data in all_bone_data.values():
-            row_data = []
-            for bone_data in frame_data.values():
-                row_data.extend(bone_data.values())
-            column_data_mappping = dict(zip(column_names, row_data))
-            writer.writerow(column_data_mappping)
+
+    bone_indices = [index for index, bone in enumerate(rig.pose.bones) if bone.name in bone_names]
+    saved_bone_names = [rig.pose.bones[index].name for index in bone_indices]
+    frames = np.arange(start_frame, end_frame + 1)
+
+    matrices = sample_pose_bone_matrices(rig=rig, frames=frames)[:, bone_indices]
+    lengths = np.empty(len(rig.pose.bones), dtype=np.float32)
+    rig.pose.bones.foreach_get("length", lengths)
+    bone_data = calculate_bone_data(matrices=matrices, lengths=lengths[bone_indices])
+
+    with atomic_write(npz_save_path) as file:
+        np.savez(file, frames=frames, bone_names=np.array(saved_bone_names), **bone_data)
+    print(f"Saved bone and joint data to {npz_save_path}")
+
+    column_names = [f"{bone_name}_{data_name}_{component}"
+                    for bone_name in saved_bone_names
+                    for data_name, components in BONE_DATA_COMPONENTS.items()
+                    for component in components]
+    column_index = {
+        "bone_names": saved_bone_names,
+        "frames": [int(start_frame), int(end_frame)],
+        "euler_order": EULER_ORDER,
+        "arrays": {data_name: {"dimensions": ["frame", "bone", *(["row", "column"] if data_name == "matrix" else
+                                                                 ["component"])],
+                               "components": components}
+                   for data_name, components in BONE_DATA_COMPONENTS.items()},
+        "csv_columns": column_names,
+    }
+    with atomic_write(column_index_save_path) as file:
+        file.write(json.dumps(column_index, indent=4).encode())
+
+    if save_csv:
+        csv_data = np.concatenate([bone_data[data_name].reshape(frames.shape[0], len(saved_bone_names), -1)
+                                   for data_name in BONE_DATA_COMPONENTS.keys()], axis=2)
+        write_csv(csv_save_path,
+                  csv_data.reshape(frames.shape[0], -1),
+                  header=",".join(column_names),
+                  comments="")
+        print(f"Saved bone and joint data csv to {csv_save_path}")
 
     # Save documentation
     with open(documentation_save_path, 'w') as file:
         file.write(DOCUMENTATION_STRING)
 
 
-def get_bone_data(bone: bpy.types.PoseBone) -> Dict[str, float]:
+def sample_pose_bone_matrices(rig: bpy.types.Object, frames: np.ndarray) -> np.ndarray:
+    """
+    Return the (frame, bone, 4, 4) pose matrices (armature space, after constraints) of every pose bone of `rig`
+    """
+    scene = bpy.context.scene
+    current_frame = scene.frame_current
+
+    number_of_bones = len(rig.pose.bones)
+    matrices = np.empty((frames.shape[0], number_of_bones, 4, 4), dtype=np.float32)
+    frame_matrices = np.empty(number_of_bones * 16, dtype=np.float32)
+    for frame_index, frame_number in enumerate(frames):
+        scene.frame_set(int(frame_number))
+        rig.pose.bones.foreach_get("matrix", frame_matrices)
+        # Blender stores matrices column by column
+        matrices[frame_index] = frame_matrices.reshape(number_of_bones, 4, 4).transpose(0, 2, 1)
+
+    scene.frame_set(current_frame)
+    return matrices
+
+
+def calculate_bone_data(matrices: np.ndarray, lengths: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Derive the `BONE_DATA_COMPONENTS` arrays from (frame, bone, 4, 4) pose matrices and the bones' lengths
+    """
+    heads = matrices[..., :3, 3]
+    # a pose bone's tail is its head moved along its y axis by the bone's length. `PoseBone.length` is the posed
+    # (already scaled) length, so the axis is normalized to not apply the bone's scale twice
+    y_axes = matrices[..., :3, 1]
+    y_axis_lengths = np.linalg.norm(y_axes, axis=-1, keepdims=True)
+    y_axes = np.divide(y_axes, y_axis_lengths, out=np.zeros_like(y_axes), where=y_axis_lengths > 0)
+    tails = heads + y_axes * lengths[np.newaxis, :, np.newaxis]
+    quaternions_wxyz = matrices_to_quaternions(matrices)
+
     return {
-        "head_center_world_x": bone.head.x,
-        "head_center_world_y": bone.head.y,
-        "head_center_world_z": bone.head.z,
-        "tail_center_world_x": bone.tail.x,
-        "tail_center_world_y": bone.tail.y,
-        "tail_center_world_z": bone.tail.z,
-        "rotation_quaternion_x": bone.matrix.to_quaternion().x,
-        "rotation_quaternion_y": bone.matrix.to_quaternion().y,
-        "rotation_quaternion_z": bone.matrix.to_quaternion().z,
-        "rotation_quaternion_w": bone.matrix.to_quaternion().w,
-        "rotation_euler_x": bone.matrix.to_euler().x,
-        "rotation_euler_y": bone.matrix.to_euler().y,
-        "rotation_euler_z": bone.matrix.to_euler().z,
-        "rotation_euler_order": bone.matrix.to_euler().order,
-        "matrix_0_0": bone.matrix[0][0],
-        "matrix_0_1": bone.matrix[0][1],
-        "matrix_0_2": bone.matrix[0][2],
-        "matrix_0_3": bone.matrix[0][3],
-        "matrix_1_0": bone.matrix[1][0],
-        "matrix_1_1": bone.matrix[1][1],
-        "matrix_1_2": bone.matrix[1][2],
-        "matrix_1_3": bone.matrix[1][3],
-        "matrix_2_0": bone.matrix[2][0],
-        "matrix_2_1": bone.matrix[2][1],
-        "matrix_2_2": bone.matrix[2][2],
-        "matrix_2_3": bone.matrix[2][3],
-        "matrix_3_0": bone.matrix[3][0],
-        "matrix_3_1": bone.matrix[3][1],
-        "matrix_3_2": bone.matrix[3][2],
-        "matrix_3_3": bone.matrix[3][3],
+        "head_center_world": heads,
+        "tail_center_world": tails,
+        "rotation_quaternion": quaternions_wxyz[..., [1, 2, 3, 0]],
+        "rotation_euler": matrices_to_eulers_xyz(matrices),
+        "matrix": matrices,
     }
 
 
@@ -94,6 +139,18 @@ For multi-part data (e.g. XYZ location), each component of the data is saved in
 
 To access the bone data in Blender, use the following command (e.g. to get the Thigh.L bone) in the Blender python console (e.g. in the Scripting Tab): `bone = bpy.context.object["righ"].pose.bone["thigh.L"]`
 
+The data is saved in `[recording_name]_bone_and_joint_data.npz` as one array per property, with dimensions
+(frame, bone, component) - or (frame, bone, row, column) for `matrix`. The `bone_names` and `frames` arrays give the bone
+and frame of each index. `[recording_name]_bone_and_joint_data_columns.json` describes the arrays and lists the columns
+of the (optional) `.csv` version of the data, which has one row per frame.
+
+```python
+import numpy as np
+bone_data = np.load("[recording_name]_bone_and_joint_data.npz")
+thigh_index = list(bone_data["bone_names"]).index("thigh.L")
+thigh_quaternions = bone_data["rotation_quaternion"][:, thigh_index, :]  # (frame, xyzw)
+```
+
 Theses are the properties of the bone object that are saved:
 
 # Bone Properties
@@ -118,7 +175,7 @@ https://docs.blender.org/api/current/bpy.types.PoseBone.html#bpy.types.PoseBone.
 https://en.wikipedia.org/wiki/Euler_angles
 
 ## `bone.rotation_euler.order` : str
-The order of the euler rotation (e.g. 'XYZ')
+The order of the euler rotation (always 'XYZ'), saved as `euler_order` in the `_columns.json` file
 https://docs.blender.org/api/current/bpy.types.PoseBone.html#bpy.types.PoseBone.rotation_euler
 https://en.wikipedia.org/wiki/Euler_angles
 
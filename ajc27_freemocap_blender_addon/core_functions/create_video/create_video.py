@@ -1,3 +1,5 @@
+from typing import Optional
+
 import bpy
 
 from ajc27_freemocap_blender_addon.core_functions.create_video.helpers.place_render_cameras import place_render_cameras
@@ -9,6 +11,7 @@ from ajc27_freemocap_blender_addon.core_functions.create_video.helpers.render_ca
 from ajc27_freemocap_blender_addon.core_functions.create_video.helpers.composite_video import composite_video
 from ajc27_freemocap_blender_addon.core_functions.create_video.helpers.reset_scene_defaults import reset_scene_defaults
 
+from ajc27_freemocap_blender_addon.freemocap_data_handler.handler import FreemocapDataHandler
 from ajc27_freemocap_blender_addon.data_models.parameter_models.video_config import (
     EXPORT_PROFILES,
 )
@@ -19,9 +22,17 @@ def create_video(
     start_frame: int,
     end_frame: int,
     export_profile: str = 'debug',
+    freemocap_data_handler: Optional[FreemocapDataHandler] = None,
+    data_parent_empty: Optional[bpy.types.Object] = None,
 ) -> None:
 
-    place_render_cameras(scene, export_profile)
+    place_render_cameras(
+        scene=scene,
+        export_profile=export_profile,
+        freemocap_data_handler=freemocap_data_handler,
+        recording_folder=recording_folder,
+        data_parent_empty=data_parent_empty,
+    )
 
     place_lights(scene)
 
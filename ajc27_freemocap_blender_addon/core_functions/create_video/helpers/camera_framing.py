@@ -0,0 +1,74 @@
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Percentiles used as the lower/upper bounds of the framed points, so a few outlier markers don't blow up the framing
+FRAMING_PERCENTILES = (1.0, 99.0)
+
+EXTREME_POINT_NAMES = ['lowest_x', 'highest_x', 'lowest_y', 'highest_y', 'lowest_z', 'highest_z']
+
+# (recording, data, windows) key -> windows, in insertion order so the oldest entries are dropped first
+_FRAMING_CACHE: Dict[Tuple, List[Tuple[int, Dict[str, np.ndarray]]]] = {}
+
+
+def calculate_extreme_points(points_frame_marker_xyz: np.ndarray,
+                             percentiles: Tuple[float, float] = FRAMING_PERCENTILES) -> Dict[str, np.ndarray]:
+    """
+    Find the points the render cameras have to frame: for each axis, the (x, y, z) point whose coordinate on that axis
+    is closest to the lower/upper percentile of all the (non-NaN) points' coordinates.
+    """
+    points = np.asarray(points_frame_marker_xyz, dtype=np.float64).reshape(-1, 3)
+    points = points[~np.isnan(points).any(axis=1)]
+    if points.shape[0] == 0:
+        return {name: np.zeros(3) for name in EXTREME_POINT_NAMES}
+
+    lower_bounds, upper_bounds = np.percentile(points, percentiles, axis=0)
+    extreme_points = {}
+    for axis, axis_name in enumerate(['x', 'y', 'z']):
+        extreme_points[f'lowest_{axis_name}'] = points[np.argmin(np.abs(points[:, axis] - lower_bounds[axis]))]
+        extreme_points[f'highest_{axis_name}'] = points[np.argmin(np.abs(points[:, axis] - upper_bounds[axis]))]
+    return extreme_points
+
+
+def calculate_framing_windows(points_frame_marker_xyz: np.ndarray,
+                              start_frame: int = 0,
+                              window_size: Optional[int] = None,
+                              percentiles: Tuple[float, float] = FRAMING_PERCENTILES,
+                              cache_key: Optional[str] = None,
+                              max_entries: int = 1,
+                              ) -> List[Tuple[int, Dict[str, np.ndarray]]]:
+    """
+    Split the frames in windows of `window_size` frames (one window with every frame if `window_size` is None) and
+    return a (first frame of the window, extreme points) pair per window.
+
+    If `cache_key` (e.g. the recording folder) is given, the result is cached in memory for the same key and data.
+    Caching a result drops the oldest ones of the same `cache_key` beyond `max_entries` (like `ProcessedDataCache`).
+    """
+    points_frame_marker_xyz = np.asarray(points_frame_marker_xyz)
+
+    key = None
+    if cache_key is not None:
+        data_hash = hashlib.blake2b(np.ascontiguousarray(points_frame_marker_xyz).reshape(-1).view(np.uint8),
+                                    digest_size=16).hexdigest()
+        key = (cache_key, data_hash, points_frame_marker_xyz.shape, start_frame, window_size, tuple(percentiles))
+        if key in _FRAMING_CACHE:
+            return _FRAMING_CACHE[key]
+
+    number_of_frames = points_frame_marker_xyz.shape[0]
+    window_size = window_size or max(number_of_frames, 1)
+    windows = [(start_frame + window_start,
+                calculate_extreme_points(points_frame_marker_xyz[window_start:window_start + window_size],
+                                         percentiles=percentiles))
+               for window_start in range(0, max(number_of_frames, 1), window_size)]
+
+    if key is not None:
+        _FRAMING_CACHE[key] = windows
+        same_recording_keys = [cached_key for cached_key in _FRAMING_CACHE if cached_key[0] == cache_key]
+        for cached_key in same_recording_keys[:-max(max_entries, 1)]:
+            del _FRAMING_CACHE[cached_key]
+    return windows
+
+
+def clear_framing_cache():
+    _FRAMING_CACHE.clear()
@@ -1,6 +1,14 @@
-import bpy
-from mathutils import Vector
 from math import radians, atan
+from typing import Dict, Optional, Tuple
+
+import bpy
+import numpy as np
+
+from ajc27_freemocap_blender_addon.core_functions.animation.bulk_keyframes import keyframe_property_in_bulk
+from ajc27_freemocap_blender_addon.core_functions.animation.sample_keyframes import sample_object_world_locations
+from ajc27_freemocap_blender_addon.core_functions.create_video.helpers.camera_framing import calculate_framing_windows
+from ajc27_freemocap_blender_addon.core_functions.empties.find_data_empties import find_data_empties
+from ajc27_freemocap_blender_addon.freemocap_data_handler.handler import FreemocapDataHandler
 from ajc27_freemocap_blender_addon.data_models.parameter_models.video_config import (
     LENS_FOVS,
 )
@@ -8,9 +16,20 @@ from ajc27_freemocap_blender_addon.data_models.parameter_models.video_config imp
     EXPORT_PROFILES,
 )
 
+NOT_FRAMED_EMPTY_NAMES = (
+    'freemocap_origin_axes',
+    'world_origin',
+    'center_of_mass_data_parent',
+    'head',
+)
+
+
 def place_render_cameras(
     scene: bpy.types.Scene=None,
     export_profile: str='debug',
+    freemocap_data_handler: Optional[FreemocapDataHandler]=None,
+    recording_folder: Optional[str]=None,
+    data_parent_empty: Optional[bpy.types.Object]=None,
 ) -> list:
 
     # Delete existing cameras
@@ -25,41 +44,16 @@ def place_render_cameras(
     camera_horizontal_fov = LENS_FOVS['50mm']['horizontal_fov']
     camera_vertical_fov = LENS_FOVS['50mm']['vertical_fov']
 
-    # Set the starting extreme points
-    lowest_x = Vector([0, 0, 0])
-    highest_x = Vector([0, 0, 0])
-    lowest_y = Vector([0, 0, 0])
-    highest_y = Vector([0, 0, 0])
-    lowest_z = Vector([0, 0, 0])
-    highest_z = Vector([0, 0, 0])
-
-    # Find the extreme points
-    for frame in range (scene.frame_start, scene.frame_end):
-        scene.frame_set(frame)
-        for object in scene.objects:
-            if (object.type == 'EMPTY'
-                and object.name not in (
-                    'freemocap_origin_axes',
-                    'world_origin',
-                    'center_of_mass_data_parent',
-                    'head',
-                )
-            ):
-                if object.matrix_world.translation[0] < lowest_x[0]:
-                    lowest_x = object.matrix_world.translation.copy()
-                if object.matrix_world.translation[0] > highest_x[0]:
-                    highest_x = object.matrix_world.translation.copy()
-                if object.matrix_world.translation[1] < lowest_y[1]:
-                    lowest_y = object.matrix_world.translation.copy()
-                if object.matrix_world.translation[1] > highest_y[1]:
-                    highest_y = object.matrix_world.translation.copy()
-                if object.matrix_world.translation[2] < lowest_z[2]:
-                    lowest_z = object.matrix_world.translation.copy()
-                if object.matrix_world.translation[2] > highest_z[2]:
-                    highest_z = object.matrix_world.translation.copy()
-
-    # Reset the scene frame to the start
-    scene.frame_set(scene.frame_start)
+    # Find the extreme points, for the whole recording or per window of frames
+    framed_points = get_framed_points(scene=scene,
+                                      freemocap_data_handler=freemocap_data_handler,
+                                      data_parent_empty=data_parent_empty)
+    framing_windows = calculate_framing_windows(
+        points_frame_marker_xyz=framed_points,
+        start_frame=scene.frame_start,
+        window_size=EXPORT_PROFILES[export_profile].get('framing_window_frames'),
+        cache_key=recording_folder,
+    )
 
     # Create the cameras of the export profile
     for camera in EXPORT_PROFILES[export_profile]['render_cameras']:
@@ -72,104 +66,196 @@ def place_render_cameras(
         # Get the camera view margin
         view_margin = EXPORT_PROFILES[export_profile]['render_cameras'][camera]['view_margin']
 
-        # Set the view leftmost, rightmost, lowest and highest points
-        # depending on the camera
-        if camera == 'Front':
-            leftmost_point = lowest_x
-            rightmost_point = highest_x
-            lowest_point = lowest_z
-            highest_point = highest_z
-        elif camera == 'Right':
-            leftmost_point = lowest_y
-            rightmost_point = highest_y
-            lowest_point = lowest_z
-            highest_point = highest_z
-        elif camera == 'Left':
-            leftmost_point = highest_y
-            rightmost_point = lowest_y
-            lowest_point = lowest_z
-            highest_point = highest_z
-        elif camera == 'Back':
-            leftmost_point = highest_x
-            rightmost_point = lowest_x
-            lowest_point = lowest_z
-            highest_point = highest_z
-        elif camera == 'Top':
-            leftmost_point = lowest_x
-            rightmost_point = highest_x
-            lowest_point = lowest_y
-            highest_point = highest_y
-        elif camera == 'Bottom':
-            leftmost_point = lowest_x
-            rightmost_point = highest_x
-            lowest_point = lowest_y
-            highest_point = highest_y
-
-        # Camera distances to cover the view extreme points
-        camera_distance_leftmost = (
-            leftmost_point[1]
-            - abs(leftmost_point[0])
-            / atan(radians(camera_horizontal_fov * (1 - view_margin) / 2))
+        camera_locations = []
+        camera_rotation = None
+        for _, extreme_points in framing_windows:
+            camera_location, camera_rotation = calculate_camera_transform(
+                camera=camera,
+                extreme_points=extreme_points,
+                camera_horizontal_fov=camera_horizontal_fov,
+                camera_vertical_fov=camera_vertical_fov,
+                view_margin=view_margin,
+            )
+            camera_locations.append(camera_location)
+
+        if camera_rotation is None:
+            continue
+        camera_object.location = camera_locations[0]
+        camera_object.rotation_euler = camera_rotation
+
+        # dolly the camera between the framing of each window
+        if len(camera_locations) > 1:
+            keyframe_property_in_bulk(owner=camera_object,
+                                      property_name="location",
+                                      values=np.array(camera_locations),
+                                      frames=np.array([window_start for window_start, _ in framing_windows]))
+
+    return
+
+
+def calculate_camera_transform(camera: str,
+                               extreme_points: Dict[str, np.ndarray],
+                               camera_horizontal_fov: float,
+                               camera_vertical_fov: float,
+                               view_margin: float,
+                               ) -> Tuple[Optional[Tuple[float, float, float]], Optional[Tuple[float, float, float]]]:
+    """
+    Calculate the location and rotation of a render camera so that it frames the extreme points
+    """
+    lowest_x = extreme_points['lowest_x']
+    highest_x = extreme_points['highest_x']
+    lowest_y = extreme_points['lowest_y']
+    highest_y = extreme_points['highest_y']
+    lowest_z = extreme_points['lowest_z']
+    highest_z = extreme_points['highest_z']
+    camera_location = None
+    camera_rotation = None
+
+    # Set the view leftmost, rightmost, lowest and highest points
+    # depending on the camera
+    if camera == 'Front':
+        leftmost_point = lowest_x
+        rightmost_point = highest_x
+        lowest_point = lowest_z
+        highest_point = highest_z
+    elif camera == 'Right':
+        leftmost_point = lowest_y
+        rightmost_point = highest_y
+        lowest_point = lowest_z
+        highest_point = highest_z
+    elif camera == 'Left':
+        leftmost_point = highest_y
+        rightmost_point = lowest_y
+        lowest_point = lowest_z
+        highest_point = highest_z
+    elif camera == 'Back':
+        leftmost_point = highest_x
+        rightmost_point = lowest_x
+        lowest_point = lowest_z
+        highest_point = highest_z
+    elif camera == 'Top':
+        leftmost_point = lowest_x
+        rightmost_point = highest_x
+        lowest_point = lowest_y
+        highest_point = highest_y
+    elif camera == 'Bottom':
+        leftmost_point = lowest_x
+        rightmost_point = highest_x
+        lowest_point = lowest_y
+        highest_point = highest_y
+
+    # Camera distances to cover the view extreme points
+    camera_distance_leftmost = (
+        leftmost_point[1]
+        - abs(leftmost_point[0])
+        / atan(radians(camera_horizontal_fov * (1 - view_margin) / 2))
+    )
+    camera_distance_rightmost = (
+        rightmost_point[1]
+        - abs(rightmost_point[0])
+        / atan(radians(camera_horizontal_fov * (1 - view_margin) / 2))
+    )
+    camera_distance_lowest = (
+        lowest_point[1]
+        - ((highest_point[2] - lowest_point[2]) / 2)
+        / atan(radians(camera_vertical_fov * (1 - view_margin) / 2))
+    )
+    camera_distance_highest = (
+        highest_point[1]
+        - ((highest_point[2] - lowest_point[2]) / 2)
+        / atan(radians(camera_vertical_fov * (1 - view_margin) / 2))
+    )
+
+    # Calculate the final position of the camera
+    camera_distance_on_axis = max(
+        abs(camera_distance_leftmost),
+        abs(camera_distance_rightmost),
+        abs(camera_distance_lowest),
+        abs(camera_distance_highest),
+    )
+
+    #  Set the location and rotation depending on the camera
+    if camera == 'Front':
+        camera_location = (
+            0,
+            -camera_distance_on_axis,
+            highest_point[2] - (highest_point[2] - lowest_point[2]) / 2
         )
-        camera_distance_rightmost = (
-            rightmost_point[1]
-            - abs(rightmost_point[0])
-            / atan(radians(camera_horizontal_fov * (1 - view_margin) / 2))
+        camera_rotation = (radians(90), 0, 0)
+    elif camera == 'Right':
+        camera_location = (
+            camera_distance_on_axis,
+            0,
+            highest_point[2] - (highest_point[2] - lowest_point[2]) / 2
         )
-        camera_distance_lowest = (
-            lowest_point[1]
-            - ((highest_point[2] - lowest_point[2]) / 2)
-            / atan(radians(camera_vertical_fov * (1 - view_margin) / 2))
+        camera_rotation = (radians(90), 0, radians(90))
+    elif camera == 'Left':
+        camera_location = (
+            -camera_distance_on_axis,
+            0,
+            highest_point[2] - (highest_point[2] - lowest_point[2]) / 2
         )
-        camera_distance_highest = (
-            highest_point[1]
-            - ((highest_point[2] - lowest_point[2]) / 2)
-            / atan(radians(camera_vertical_fov * (1 - view_margin) / 2))
+        camera_rotation = (radians(90), 0, radians(-90))
+    elif camera == 'Back':
+        camera_location = (
+            0,
+            camera_distance_on_axis,
+            highest_point[2] - (highest_point[2] - lowest_point[2]) / 2
         )
-
-        # Calculate the final position of the camera
-        camera_distance_on_axis = max(
-            abs(camera_distance_leftmost),
-            abs(camera_distance_rightmost),
-            abs(camera_distance_lowest),
-            abs(camera_distance_highest),
+        camera_rotation = (radians(90), 0, radians(180))
+    elif camera == 'Top':
+        camera_location = (
+            0,
+            0,
+            camera_distance_on_axis
         )
+        camera_rotation = (0, 0, 0)
 
-        #  Set the location and rotation depending on the camera
-        if camera == 'Front':
-            camera_object.location = (
-                0,
-                -camera_distance_on_axis,
-                highest_point[2] - (highest_point[2] - lowest_point[2]) / 2
-            )
-            camera_object.rotation_euler = (radians(90), 0, 0)
-        elif camera == 'Right':
-            camera_object.location = (
-                camera_distance_on_axis,
-                0,
-                highest_point[2] - (highest_point[2] - lowest_point[2]) / 2
-            )
-            camera_object.rotation_euler = (radians(90), 0, radians(90))
-        elif camera == 'Left':
-            camera_object.location = (
-                -camera_distance_on_axis,
-                0,
-                highest_point[2] - (highest_point[2] - lowest_point[2]) / 2
-            )
-            camera_object.rotation_euler = (radians(90), 0, radians(-90))
-        elif camera == 'Back':
-            camera_object.location = (
-                0,
-                camera_distance_on_axis,
-                highest_point[2] - (highest_point[2] - lowest_point[2]) / 2
-            )
-            camera_object.rotation_euler = (radians(90), 0, radians(180))
-        elif camera == 'Top':
-            camera_object.location = (
-                0,
-                0,
-                camera_distance_on_axis
-            )
-            camera_object.rotation_euler = (0, 0, 0)
+    return camera_location, camera_rotation
 
-    return
+
+def get_framed_points(scene: bpy.types.Scene,
+                      freemocap_data_handler: Optional[FreemocapDataHandler] = None,
+                      data_parent_empty: Optional[bpy.types.Object] = None) -> np.ndarray:
+    """
+    Get the world space (frame, point, xyz) positions of the empties to frame with the render cameras.
+
+    The handler's recording's empties (the ones below `data_parent_empty` with a trajectory in the handler) are taken
+    from the handler's data. The other empties, including other recordings' in the scene, are read from the scene -
+    from their F-curves, or by stepping through the frames for empties with constraints.
+    """
+    frames = np.arange(scene.frame_start, scene.frame_end)
+    framed_objects = [scene_object for scene_object in scene.objects
+                      if scene_object.type == 'EMPTY' and scene_object.name not in NOT_FRAMED_EMPTY_NAMES]
+
+    data_empty_trajectories = {}
+    if freemocap_data_handler is not None and data_parent_empty is not None:
+        trajectories = freemocap_data_handler.trajectories
+        data_empty_trajectories = {
+            empty.name: trajectories[name]
+            for name, empty in find_data_empties(parent_object=data_parent_empty,
+                                                 trajectory_names=trajectories.keys()).items()}
+    data_objects = []
+    scene_objects = []
+    for framed_object in framed_objects:
+        if framed_object.name in data_empty_trajectories:
+            data_objects.append(framed_object)
+        else:
+            scene_objects.append(framed_object)
+
+    framed_points = np.empty((frames.shape[0], len(framed_objects), 3), dtype=np.float64)
+    framed_points.fill(np.nan)
+
+    # from the source data, placed in the world by each empty's (static) parent transform
+    for object_index, data_object in enumerate(data_objects):
+        trajectory = data_empty_trajectories[data_object.name]
+        in_data = (frames >= 0) & (frames < trajectory.shape[0])
+        parent_transform = np.array(data_object.matrix_world @ data_object.matrix_basis.inverted())
+        framed_points[in_data, object_index, :] = \
+            trajectory[frames[in_data]] @ parent_transform[:3, :3].T + parent_transform[:3, 3]
+
+    # from the scene
+    if scene_objects:
+        framed_points[:, len(data_objects):, :] = sample_object_world_locations(objects=scene_objects, frames=frames)
+
+    return framed_points
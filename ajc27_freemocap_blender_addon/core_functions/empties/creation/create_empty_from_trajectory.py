@@ -1,29 +1,48 @@
-from typing import List, Union, Dict
+from typing import Iterable, List, Optional, Union, Dict
 
 import bpy
 import numpy as np
 
+from ajc27_freemocap_blender_addon.core_functions.animation.bulk_keyframes import keyframe_property_in_bulk
+
+EMPTIES_COLLECTION_NAME = "empties"
+
 
 def create_empties(trajectory_frame_marker_xyz: np.ndarray,
                    names_list: Union[List[str], str],
                    empty_scale: float,
                    empty_type: str,
                    parent_object: bpy.types.Object,
+                   collection: Optional[bpy.types.Collection] = None,
                    ) -> Dict[str, bpy.types.Object]:
+    """
+    Create one keyframed empty per trajectory, returned by trajectory name.
+
+    The empties are created directly with `bpy.data.objects.new` (no operators, so no depsgraph update or undo push per
+    empty), keyframed in bulk and then linked to `collection` all at once. If no collection is given, a new one is made
+    and linked next to the parent object after the empties are in it.
+    """
+    if trajectory_frame_marker_xyz.ndim == 2:
+        trajectory_frame_marker_xyz = trajectory_frame_marker_xyz[:, np.newaxis, :]
     if isinstance(names_list, str):
         names_list = [names_list] * trajectory_frame_marker_xyz.shape[1]
+
     empties = {}
-    number_of_trajectories = trajectory_frame_marker_xyz.shape[1]
-    for marker_number in range(number_of_trajectories):
-        trajectory_name = names_list[marker_number]
-        trajectory_fr_xyz = trajectory_frame_marker_xyz[:, marker_number, :]
-        empties[trajectory_name] = create_keyframed_empty_from_3d_trajectory_data(
-            trajectory_fr_xyz=trajectory_fr_xyz,
-            trajectory_name=trajectory_name,
-            parent_object=parent_object,
-            empty_scale=empty_scale,
-            empty_type=empty_type,
-        )
+    for marker_number, trajectory_name in enumerate(names_list):
+        empty_object = create_empty_object(name=trajectory_name,
+                                           parent_object=parent_object,
+                                           empty_scale=empty_scale,
+                                           empty_type=empty_type)
+        keyframe_empty_location(empty_object=empty_object,
+                                trajectory_fr_xyz=trajectory_frame_marker_xyz[:, marker_number, :])
+        empties[trajectory_name] = empty_object
+
+    if collection is None:
+        collection = bpy.data.collections.new(EMPTIES_COLLECTION_NAME)
+        link_objects_to_collection(objects=empties.values(), collection=collection)
+        link_collection_next_to_object(collection=collection, blender_object=parent_object)
+    else:
+        link_objects_to_collection(objects=empties.values(), collection=collection)
 
     return empties
 
@@ -34,26 +53,53 @@ def create_keyframed_empty_from_3d_trajectory_data(
         parent_object: bpy.types.Object,
         empty_scale: float = 0.1,
         empty_type: str = "PLAIN_AXES",
+        collection: Optional[bpy.types.Collection] = None,
 ) -> bpy.types.Object:
     """
-    Create a key framed empty from 3d trajectory data
+    Create a key framed empty from 3d trajectory data (linked to `collection`, or the active collection if not given)
     """
-    # print(f"Creating keyframed empty from: {trajectory_name}...")
-    bpy.ops.object.empty_add(type=empty_type)
-    empty_object = bpy.context.editable_objects[-1]
-    empty_object.name = trajectory_name
+    empty_object = create_empty_object(name=trajectory_name,
+                                       parent_object=parent_object,
+                                       empty_scale=empty_scale,
+                                       empty_type=empty_type)
+    keyframe_empty_location(empty_object=empty_object, trajectory_fr_xyz=trajectory_fr_xyz)
+    link_objects_to_collection(objects=[empty_object], collection=collection or bpy.context.collection)
+
+    return empty_object
 
-    empty_object.empty_display_size = empty_scale
 
+def create_empty_object(name: str,
+                        parent_object: Optional[bpy.types.Object],
+                        empty_scale: float,
+                        empty_type: str) -> bpy.types.Object:
+    """
+    Create an empty object without linking it to any collection
+    """
+    empty_object = bpy.data.objects.new(name, None)
+    empty_object.empty_display_type = empty_type
+    empty_object.empty_display_size = empty_scale
     empty_object.parent = parent_object
+    return empty_object
 
-    for frame_number in range(trajectory_fr_xyz.shape[0]):
-        empty_object.location = [
-            trajectory_fr_xyz[frame_number, 0],
-            trajectory_fr_xyz[frame_number, 1],
-            trajectory_fr_xyz[frame_number, 2],
-        ]
 
-        empty_object.keyframe_insert(data_path="location", frame=frame_number)
+def keyframe_empty_location(empty_object: bpy.types.Object, trajectory_fr_xyz: np.ndarray):
+    # leave the empty at its last position, like keying each frame in turn would
+    empty_object.location = trajectory_fr_xyz[-1, :]
+    keyframe_property_in_bulk(owner=empty_object,
+                              property_name="location",
+                              values=trajectory_fr_xyz)
 
-    return empty_object
+
+def link_collection_next_to_object(collection: bpy.types.Collection, blender_object: Optional[bpy.types.Object]):
+    """
+    Nest `collection` in the object's collection (or the scene's top collection if there's no object)
+    """
+    if blender_object is not None and len(blender_object.users_collection) > 0:
+        blender_object.users_collection[0].children.link(collection)
+    else:
+        bpy.context.scene.collection.children.link(collection)
+
+
+def link_objects_to_collection(objects: Iterable[bpy.types.Object], collection: bpy.types.Collection):
+    for blender_object in objects:
+        collection.objects.link(blender_object)
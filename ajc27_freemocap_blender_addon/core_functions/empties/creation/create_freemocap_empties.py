@@ -1,7 +1,7 @@
 import bpy
 from ajc27_freemocap_blender_addon.freemocap_data_handler.handler import FreemocapDataHandler
 
-from .create_empty_from_trajectory import create_empties
+from .create_empty_from_trajectory import EMPTIES_COLLECTION_NAME, create_empties, link_collection_next_to_object
 
 BODY_EMPTY_SCALE = 0.03
 
@@ -16,12 +16,16 @@ def create_freemocap_empties(handler: FreemocapDataHandler,
 
     empties = {}
     try:
+        # every empty goes in one collection, which is only linked to the scene once it's filled
+        collection = bpy.data.collections.new(EMPTIES_COLLECTION_NAME)
+
         # body trajectories
         empties["body"] = create_empties(trajectory_frame_marker_xyz=handler.body_frame_name_xyz,
                                          names_list=handler.body_names,
                                          empty_scale=body_empty_scale,
                                          empty_type="SPHERE",
-                                         parent_object=parent_object, )
+                                         parent_object=parent_object,
+                                         collection=collection)
 
         empties["hands"] = {}
         # right hand trajectories
@@ -31,6 +35,7 @@ def create_freemocap_empties(handler: FreemocapDataHandler,
             empty_scale=hand_empty_scale,
             empty_type="PLAIN_AXES",
             parent_object=parent_object,
+            collection=collection,
         )
         # left hand trajectories
         empties["hands"]["left"] = create_empties(
@@ -39,6 +44,7 @@ def create_freemocap_empties(handler: FreemocapDataHandler,
             empty_scale=hand_empty_scale,
             empty_type="PLAIN_AXES",
             parent_object=parent_object,
+            collection=collection,
         )
 
         empties["other"] = {}
@@ -47,8 +53,11 @@ def create_freemocap_empties(handler: FreemocapDataHandler,
             names_list="center_of_mass",
             empty_scale=body_empty_scale * 3,
             empty_type="ARROWS",
-            parent_object=center_of_mass_data_parent
+            parent_object=center_of_mass_data_parent,
+            collection=collection,
         )
+
+        link_collection_next_to_object(collection=collection, blender_object=parent_object)
         return empties
 
     except Exception as e:
@@ -1,12 +1,17 @@
-from typing import List, Dict
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
 
 import numpy as np
 
 from ajc27_freemocap_blender_addon.data_models.mediapipe_names.virtual_trajectories import \
     get_media_pipe_virtual_trajectory_definition
 
+# how far a virtual marker's weights may sum from 1 (float weights like 1/3 never sum to exactly 1)
+WEIGHT_SUM_TOLERANCE = 1e-6
 
-def validate_marker_definitions(virtual_marker_definitions: dict):
+
+def validate_marker_definitions(virtual_marker_definitions: dict, tolerance: float = WEIGHT_SUM_TOLERANCE):
     """
     Validate the virtual marker definitions dictionary to ensure that there are the same number of marker names and weights, and that the weights sum to 1
     """
@@ -16,68 +21,126 @@ def validate_marker_definitions(virtual_marker_definitions: dict):
         if len(names) != len(weights):
             raise ValueError(
                 f"marker_names and marker_weights must be the same length for virtual marker {virtual_marker_name}")
-        if sum(weights) != 1:
-            raise ValueError(f"marker_weights must sum to 1 for virtual marker {virtual_marker_name}")
+        if not np.isclose(np.sum(weights), 1, rtol=0, atol=tolerance):
+            raise ValueError(
+                f"marker_weights must sum to 1 for virtual marker {virtual_marker_name} (they sum to {np.sum(weights)})")
+
+
+def load_virtual_marker_definitions(path: Union[str, Path]) -> Dict[str, Dict[str, list]]:
+    """
+    Load user defined virtual markers from a JSON or TOML file, in the same format as the built-in definitions:
+
+        {"virtual_marker_name": {"marker_names": ["left_hip", "right_hip"], "marker_weights": [0.5, 0.5]}}
+
+    or, in TOML:
+
+        [virtual_marker_name]
+        marker_names = ["left_hip", "right_hip"]
+        marker_weights = [0.5, 0.5]
+    """
+    path = Path(path)
+    if path.suffix.lower() == ".toml":
+        try:
+            import tomllib
+        except ImportError:  # python < 3.11
+            try:
+                import tomli as tomllib
+            except ImportError:
+                raise ImportError(f"Reading {path} needs python 3.11+ or the `tomli` package, use a JSON file instead")
+        with open(path, "rb") as file:
+            definitions = tomllib.load(file)
+    elif path.suffix.lower() == ".json":
+        with open(path, "r") as file:
+            definitions = json.load(file)
+    else:
+        raise ValueError(f"Virtual marker definitions must be a .json or .toml file, got {path}")
+
+    for virtual_marker_name, definition in definitions.items():
+        if not isinstance(definition, dict) or "marker_names" not in definition or "marker_weights" not in definition:
+            raise ValueError(f"Virtual marker {virtual_marker_name} in {path} needs `marker_names` and `marker_weights`")
+    validate_marker_definitions(definitions)
+    print(f"Loaded {len(definitions)} virtual marker definitions from {path}")
+    return definitions
 
 
-def calculate_virtual_trajectory(all_trajectories: np.ndarray,
-                                 all_names: list,
-                                 component_names: List,
-                                 weights: List) -> np.ndarray:
+def calculate_virtual_marker_weights(virtual_marker_definitions: dict,
+                                     source_names: List[str]) -> Tuple[List[str], np.ndarray, np.ndarray]:
     """
-    Create a virtual marker from a set of component markers. A 'Virtual Marker' is a 'fake' marker created by combining the data from 'real' (measured) marker/trajectory data.
+    Compile the definitions into a (virtual marker, source) weight matrix over the sources that are actually used.
+
+    Virtual markers may be built from other virtual markers (defined earlier or later), which are expanded into their
+    own sources. Returns the virtual marker names, the indices of the used sources in `source_names` and the weights.
     """
-    try:
-        number_of_frames = all_trajectories.shape[0]
-        number_of_dimensions = all_trajectories.shape[2]
-        virtual_trajectory_frame_xyz = np.zeros((number_of_frames, number_of_dimensions), dtype=np.float32)
+    source_name_to_index = {name: index for index, name in enumerate(source_names)}
+    expanded_weights: Dict[str, Dict[str, float]] = {}
+
+    def expand(virtual_marker_name: str, visiting: Tuple[str, ...] = ()) -> Dict[str, float]:
+        if virtual_marker_name in expanded_weights:
+            return expanded_weights[virtual_marker_name]
+        if virtual_marker_name in visiting:
+            raise ValueError(f"Virtual marker {virtual_marker_name} is defined in terms of itself")
+
+        definition = virtual_marker_definitions[virtual_marker_name]
+        weights: Dict[str, float] = {}
+        for name, weight in zip(definition["marker_names"], definition["marker_weights"]):
+            if name in virtual_marker_definitions:
+                for source_name, source_weight in expand(name, visiting + (virtual_marker_name,)).items():
+                    weights[source_name] = weights.get(source_name, 0.0) + weight * source_weight
+            elif name in source_name_to_index:
+                weights[name] = weights.get(name, 0.0) + weight
+            else:
+                raise ValueError(f"Trajectory {name} (used by virtual marker {virtual_marker_name}) "
+                                 f"not found in trajectory names list")
+        expanded_weights[virtual_marker_name] = weights
+        return weights
 
-        for name, weight in zip(component_names, weights):
-            if name not in all_names:
-                raise ValueError(f"Trajectory {name} not found in trajectory names list")
+    virtual_marker_names = list(virtual_marker_definitions.keys())
+    for virtual_marker_name in virtual_marker_names:
+        expand(virtual_marker_name)
 
-            # pull out the trajectory data for this component trajectory and scale by its weight
-            component_xyz = all_trajectories[:, all_names.index(name), :] * weight
-            virtual_trajectory_frame_xyz += component_xyz
-    except Exception as e:
-        print(f"Error calculating virtual marker trajectory: {e}")
-        print(e)
-        raise
-    return virtual_trajectory_frame_xyz
+    used_source_names = list(dict.fromkeys(name
+                                           for virtual_marker_name in virtual_marker_names
+                                           for name in expanded_weights[virtual_marker_name].keys()))
+    used_source_index = {name: index for index, name in enumerate(used_source_names)}
+    weight_matrix = np.zeros((len(virtual_marker_names), len(used_source_names)), dtype=np.float64)
+    for virtual_marker_index, virtual_marker_name in enumerate(virtual_marker_names):
+        for name, weight in expanded_weights[virtual_marker_name].items():
+            weight_matrix[virtual_marker_index, used_source_index[name]] = weight
+
+    source_indices = np.array([source_name_to_index[name] for name in used_source_names], dtype=np.int64)
+    return virtual_marker_names, source_indices, weight_matrix
 
 
 def calculate_virtual_trajectories(body_frame_name_xyz: np.ndarray,
-                                   body_names: List[str]) -> Dict[str, np.ndarray]:
+                                   body_names: List[str],
+                                   virtual_marker_definitions: Optional[dict] = None) -> Tuple[List[str], np.ndarray]:
     """
-    Create virtual markers from the body data using the marker definitions.
+    Create virtual markers from the body data using the marker definitions (the built-in ones by default).
+
+    All virtual markers are computed with one matrix product over every frame and returned as a (frame, virtual marker,
+    xyz) array, with their names. A virtual marker is NaN on the frames where any of its own sources is NaN.
     """
-    mediapipe_virtual_trajectory_definitions = get_media_pipe_virtual_trajectory_definition()
-    print("Creating virtual markers...")
-    validate_marker_definitions(mediapipe_virtual_trajectory_definitions)
-
-    virtual_trajectories = {}
-    for virtual_trajectory_name, virtual_trajectory_definition in mediapipe_virtual_trajectory_definitions.items():
-        # print(f"Calculating virtual marker trajectory: {virtual_trajectory_name} \n"
-        #             f"Component trajectories: {virtual_trajectory_definition['marker_names']} \n"
-        #             f"weights: {virtual_trajectory_definition['marker_weights']}")
-
-        virtual_trajectory_frame_xyz = calculate_virtual_trajectory(
-            all_trajectories=body_frame_name_xyz,
-            all_names=body_names,
-            component_names=virtual_trajectory_definition["marker_names"],
-            weights=virtual_trajectory_definition["marker_weights"]
-        )
-
-        if virtual_trajectory_name in body_names:
-            raise ValueError(
-                f"Virtual marker name {virtual_trajectory_name} is already in the trajectory names list. This will cause problems later. Please choose a different name for your virtual marker.")
+    if virtual_marker_definitions is None:
+        virtual_marker_definitions = get_media_pipe_virtual_trajectory_definition()
+    print(f"Creating {len(virtual_marker_definitions)} virtual markers...")
+    validate_marker_definitions(virtual_marker_definitions)
 
-        if virtual_trajectory_frame_xyz.shape[0] != body_frame_name_xyz.shape[0] or virtual_trajectory_frame_xyz.shape[
-            1] != body_frame_name_xyz.shape[2]:
-            raise ValueError(
-                f"Virtual marker {virtual_trajectory_name} has shape {virtual_trajectory_frame_xyz.shape} but should have shape ({body_frame_name_xyz.shape[0]}, {body_frame_name_xyz.shape[2]})"
-            )
-        virtual_trajectories[virtual_trajectory_name] = virtual_trajectory_frame_xyz
+    duplicate_names = [name for name in virtual_marker_definitions.keys() if name in body_names]
+    if duplicate_names:
+        raise ValueError(
+            f"Virtual marker names {duplicate_names} are already in the trajectory names list. This will cause problems later. Please choose a different name for your virtual marker.")
+
+    virtual_marker_names, source_indices, weight_matrix = calculate_virtual_marker_weights(
+        virtual_marker_definitions=virtual_marker_definitions,
+        source_names=list(body_names))
+
+    source_frame_name_xyz = np.asarray(body_frame_name_xyz)[:, source_indices, :]
+    missing = np.isnan(source_frame_name_xyz)
+
+    # (virtual, source) @ (frame, source, xyz) -> (frame, virtual, xyz), with NaNs zeroed so they only affect the virtual
+    # markers that actually use them (0 * NaN would be NaN)
+    virtual_frame_name_xyz = np.matmul(weight_matrix, np.where(missing, 0, source_frame_name_xyz))
+    virtual_missing = np.matmul((weight_matrix != 0).astype(np.float64), missing.astype(np.float64)) > 0
+    virtual_frame_name_xyz[virtual_missing] = np.nan
 
-        # print(f"Finished calculating virtual marker trajectory: {virtual_trajectories.keys()}")
-    return virtual_trajectories
+    return virtual_marker_names, virtual_frame_name_xyz
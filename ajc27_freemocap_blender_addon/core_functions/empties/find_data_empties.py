@@ -0,0 +1,29 @@
+import re
+from typing import Dict, Iterable
+
+import bpy
+
+# the `.001`, `.002`, ... suffix Blender adds to a name that is already taken (e.g. by another recording's empties)
+BLENDER_NAME_SUFFIX_PATTERN = re.compile(r"\.\d{3}$")
+
+
+def strip_blender_name_suffix(name: str) -> str:
+    return BLENDER_NAME_SUFFIX_PATTERN.sub("", name)
+
+
+def find_data_empties(parent_object: bpy.types.Object, trajectory_names: Iterable[str]) -> Dict[str, bpy.types.Object]:
+    """
+    The `{trajectory name: empty}` of the empties in `parent_object`'s hierarchy that have a trajectory in
+    `trajectory_names`, matched by name without Blender's `.NNN` suffix - so the empties of one recording are found
+    even when another recording in the scene already took their names, and other recordings' empties are never
+    matched.
+    """
+    trajectory_names = set(trajectory_names)
+    data_empties = {}
+    for child in parent_object.children_recursive:
+        if child.type != 'EMPTY':
+            continue
+        name = strip_blender_name_suffix(child.name)
+        if name in trajectory_names and name not in data_empties:
+            data_empties[name] = child
+    return data_empties
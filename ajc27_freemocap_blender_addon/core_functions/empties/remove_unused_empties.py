@@ -0,0 +1,67 @@
+from typing import Any, Dict, Iterable, Set
+
+import bpy
+
+from ajc27_freemocap_blender_addon.data_models.mediapipe_names.mediapipe_biomechanics import ground_contact_points, \
+    joints_angle_points
+
+# empties the UI tools look up by name after loading (joint angles, base of support and COM vertical projection)
+UI_TOOL_EMPTY_NAMES = frozenset([name
+                                 for joint_name, points in joints_angle_points.items()
+                                 for name in (joint_name, points['parent'], points['child'])]
+                                + list(ground_contact_points)
+                                + ['center_of_mass'])
+
+
+def remove_unused_empties(empties: Dict[str, Any], keep_names: Iterable[str] = UI_TOOL_EMPTY_NAMES) -> Dict[str, Any]:
+    """
+    Delete the empties that nothing in the file depends on anymore (e.g. after baking the rig's constraints).
+
+    An empty is kept if it is the parent of an object, the target of a constraint of any object or pose bone, or its
+    trajectory name is in `keep_names` (by default the ones the joint angle and base of support tools use).
+    `empties` is the nested `{name: empty}` dictionary made by `create_freemocap_empties`, the same dictionary is
+    returned without the deleted empties.
+    """
+    used_objects = get_used_object_names()
+    keep_names = set(keep_names)
+    removed_names = []
+
+    def remove_from_dict(dictionary: Dict[str, Any]) -> Dict[str, Any]:
+        remaining = {}
+        for name, value in dictionary.items():
+            if isinstance(value, dict):
+                remaining[name] = remove_from_dict(value)
+            elif value.name in used_objects or name in keep_names:
+                remaining[name] = value
+            else:
+                removed_names.append(name)
+                bpy.data.objects.remove(value, do_unlink=True)
+        return remaining
+
+    remaining_empties = remove_from_dict(empties)
+    print(f"Removed {len(removed_names)} unused empties")
+    return remaining_empties
+
+
+def get_used_object_names() -> Set[str]:
+    """
+    Names of the objects that are the parent of an object or the (pole) target of a constraint
+    """
+    used_objects = set()
+
+    def add_constraint_targets(constraints):
+        for constraint in constraints:
+            for target_property in ["target", "pole_target"]:
+                target = getattr(constraint, target_property, None)
+                if target is not None:
+                    used_objects.add(target.name)
+
+    for blender_object in bpy.data.objects:
+        if blender_object.parent is not None:
+            used_objects.add(blender_object.parent.name)
+        add_constraint_targets(blender_object.constraints)
+        if blender_object.pose is not None:
+            for pose_bone in blender_object.pose.bones:
+                add_constraint_targets(pose_bone.constraints)
+    return used_objects
+
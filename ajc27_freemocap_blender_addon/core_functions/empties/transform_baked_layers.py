@@ -0,0 +1,101 @@
+from typing import List
+
+import bpy
+import numpy as np
+from mathutils import Matrix
+
+from ajc27_freemocap_blender_addon.core_functions.animation.bulk_keyframes import find_fcurve, keyframe_property_in_bulk
+from ajc27_freemocap_blender_addon.core_functions.animation.sample_keyframes import sample_property
+from ajc27_freemocap_blender_addon.core_functions.create_rig.rotation_math import make_quaternions_continuous, \
+    matrices_to_quaternions, quaternions_to_matrices
+from ajc27_freemocap_blender_addon.core_functions.meshes.center_of_mass.center_of_mass_trails import \
+    CENTER_OF_MASS_TRAIL_NAME
+from ajc27_freemocap_blender_addon.core_functions.meshes.rigid_body_meshes.helpers.joint_sphere_instances import \
+    JOINT_SPHERES_NAME
+
+# point meshes that store the trajectories in their vertices (see `create_joint_spheres`, `create_center_of_mass_trails`)
+TRAJECTORY_POINT_MESH_NAMES = [JOINT_SPHERES_NAME, CENTER_OF_MASS_TRAIL_NAME]
+
+
+def transform_baked_layers(parent_object: bpy.types.Object, world_transform: np.ndarray) -> List[str]:
+    """
+    Move the layers baked from the empties along with them, after the empties were moved by the rigid `world_transform`
+    (4x4, world space) - e.g. by `reorient_empties`.
+
+    The layers that follow the empties through constraints update on their own, the ones below `parent_object` that
+    store a copy of the motion are transformed in place:
+    - the trajectory point meshes of the joint spheres and the center of mass trail
+    - the bone keyframes of armatures whose bones have no constraints, i.e. a rig baked with `bake_pose_bone_constraints`
+      and the armature of the skinned rigid body mesh
+
+    Returns the names of the transformed objects.
+    """
+    world_transform = np.asarray(world_transform, dtype=np.float64)
+    bpy.context.view_layer.update()
+
+    transformed_names = []
+    for child in parent_object.children_recursive:
+        if child.type == 'MESH' and any(child.name.startswith(name) for name in TRAJECTORY_POINT_MESH_NAMES):
+            object_matrix = np.array(child.matrix_world)
+            local_transform = np.linalg.inv(object_matrix) @ world_transform @ object_matrix
+            child.data.transform(Matrix(local_transform.tolist()))
+            child.data.update()
+            transformed_names.append(child.name)
+        elif child.type == 'ARMATURE' and transform_baked_bones(armature_object=child,
+                                                                 world_transform=world_transform):
+            transformed_names.append(child.name)
+
+    print(f"Transformed the baked layers {transformed_names}")
+    return transformed_names
+
+
+def transform_baked_bones(armature_object: bpy.types.Object, world_transform: np.ndarray) -> List[str]:
+    """
+    Re-key the topmost keyframed bones without constraints of the armature so the armature moves by `world_transform`.
+
+    With full parent inheritance their children move with them, so only bones whose ancestors are not keyed (and are at
+    rest) are changed: `basis -> rest^-1 @ transform @ rest @ basis`, with the transform in armature space.
+    Returns the names of the re-keyed bones.
+    """
+    armature_matrix = np.array(armature_object.matrix_world)
+    armature_transform = np.linalg.inv(armature_matrix) @ world_transform @ armature_matrix
+
+    keyed_bone_names = set()
+    for pose_bone in armature_object.pose.bones:
+        if len(pose_bone.constraints) > 0:
+            continue
+        if find_fcurve(id_data=armature_object, data_path=pose_bone.path_from_id("rotation_quaternion")) is not None:
+            keyed_bone_names.add(pose_bone.name)
+
+    transformed_bone_names = []
+    for bone_name in keyed_bone_names:
+        bone = armature_object.data.bones[bone_name]
+        if any(parent.name in keyed_bone_names for parent in bone.parent_recursive):
+            continue
+
+        pose_bone = armature_object.pose.bones[bone_name]
+        rotation_fcurve = find_fcurve(id_data=armature_object,
+                                      data_path=pose_bone.path_from_id("rotation_quaternion"))
+        frame_value = np.empty(len(rotation_fcurve.keyframe_points) * 2, dtype=np.float32)
+        rotation_fcurve.keyframe_points.foreach_get("co", frame_value)
+        frames = np.unique(frame_value[0::2])
+
+        basis_matrices = np.tile(np.eye(4), (frames.shape[0], 1, 1))
+        basis_matrices[:, :3, :3] = quaternions_to_matrices(
+            sample_property(owner=pose_bone, property_name="rotation_quaternion", frames=frames))
+        basis_matrices[:, :3, 3] = sample_property(owner=pose_bone, property_name="location", frames=frames)
+
+        rest_matrix = np.array(bone.matrix_local)
+        basis_matrices = np.linalg.inv(rest_matrix) @ armature_transform @ rest_matrix @ basis_matrices
+
+        keyframe_property_in_bulk(owner=pose_bone,
+                                  property_name="rotation_quaternion",
+                                  values=make_quaternions_continuous(matrices_to_quaternions(basis_matrices)),
+                                  frames=frames)
+        keyframe_property_in_bulk(owner=pose_bone,
+                                  property_name="location",
+                                  values=basis_matrices[:, :3, 3],
+                                  frames=frames)
+        transformed_bone_names.append(bone_name)
+
+    return transformed_bone_names
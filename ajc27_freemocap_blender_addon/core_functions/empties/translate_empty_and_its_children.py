@@ -1,38 +1,42 @@
-from typing import Tuple, List, Union
+from typing import Tuple, List, Optional, Union
 
 import bpy
 import numpy as np
-from ajc27_freemocap_blender_addon.data_models.mediapipe_names.mediapipe_heirarchy import get_mediapipe_hierarchy
+from ajc27_freemocap_blender_addon.core_functions.animation.bulk_keyframes import keyframe_property_in_bulk
+from ajc27_freemocap_blender_addon.core_functions.animation.sample_keyframes import sample_property
+from ajc27_freemocap_blender_addon.data_models.skeleton_topology import get_skeleton_topology
 
 
 def translate_empty_and_its_children(empty_name: str,
-                                     frame_index: int,
-                                     delta: Union[List[float], Tuple[float, float, float], np.ndarray]):
-    mediapipe_hierarchy = get_mediapipe_hierarchy()
-    if isinstance(delta, np.ndarray) or isinstance(delta, tuple):
-        delta = list(delta)
+                                     delta: Union[List[float], Tuple[float, float, float], np.ndarray],
+                                     frames: Optional[np.ndarray] = None):
+    """
+    Translate the keyed location of an empty and all of its descendants in the mediapipe hierarchy.
+
+    `delta` is either one xyz offset, applied on every frame of the scene, or a (frame, xyz) array of per-frame offsets
+    (on frames 0, 1, 2, ... unless `frames` is given). Each empty is read and re-keyed in bulk.
+    """
+    delta = np.asarray(delta, dtype=np.float64)
+    if delta.shape[-1] != 3 or delta.ndim not in [1, 2]:
+        raise ValueError(f"Delta must be an xyz offset or a (frame, xyz) array, not shape {delta.shape}")
+
+    if frames is None:
+        if delta.ndim == 1:
+            scene = bpy.context.scene
+            frames = np.arange(scene.frame_start, scene.frame_end + 1)
+        else:
+            frames = np.arange(delta.shape[0])
+    frames = np.asarray(frames)
+    delta = np.broadcast_to(delta, (frames.shape[0], 3))
+
+    for name in get_skeleton_topology().subtree_names(empty_name):
+        empty = bpy.data.objects.get(name)
+        if empty is None or empty.animation_data is None or empty.animation_data.action is None:
+            # the empty does not exist or does not have animation data
+            continue
+        locations = sample_property(owner=empty, property_name="location", frames=frames)
+        keyframe_property_in_bulk(owner=empty,
+                                  property_name="location",
+                                  values=locations + delta,
+                                  frames=frames)
 
-    if not len(delta) == 3:
-        raise ValueError(f"Delta must be a list of length 3, not {len(delta)}")
-
-    try:
-        # Translate the empty in the animation location curve
-
-        bpy.data.objects[empty_name].animation_data.action.fcurves[0].keyframe_points[frame_index].co[1] += delta[0]
-
-        bpy.data.objects[empty_name].animation_data.action.fcurves[1].keyframe_points[frame_index].co[1] += delta[1]
-
-        bpy.data.objects[empty_name].animation_data.action.fcurves[2].keyframe_points[frame_index].co[1] = delta[2]
-    except:
-        # Empty does not exist or does not have animation data
-        # print('Empty ' + empty + ' does not have animation data on frame ' + str(frame_index))
-        pass
-
-    # If empty has children then call this function for every child
-    if empty_name in mediapipe_hierarchy.keys():
-        print(
-            f"Translating children of empty {empty_name}: {mediapipe_hierarchy[empty_name]['children']}")
-        for child in mediapipe_hierarchy[empty_name]['children']:
-            translate_empty_and_its_children(empty_name=child,
-                                             frame_index=frame_index,
-                                             delta=delta)
@@ -1,20 +1,27 @@
 import traceback
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, List
 
 import numpy as np
 from ajc27_freemocap_blender_addon.core_functions.load_videos.load_videos import load_videos_as_planes
 from ajc27_freemocap_blender_addon.core_functions.meshes.rigid_body_meshes.attach_rigid_body_meshes_to_rig import create_rigid_body_meshes
 from ajc27_freemocap_blender_addon.freemocap_data_handler.utilities.get_or_create_freemocap_data_handler import (
     get_or_create_freemocap_data_handler,
+    set_freemocap_data_handler,
 )
 from ajc27_freemocap_blender_addon.freemocap_data_handler.utilities.load_data import load_freemocap_data
+from ajc27_freemocap_blender_addon.freemocap_data_handler.utilities.processed_data_cache import ProcessedDataCache, \
+    read_saved_data_cache_key, write_saved_data_cache_key
+from ajc27_freemocap_blender_addon.freemocap_data_handler.utilities.recording_fps import get_recording_fps
 from .create_rig.add_rig_method_enum import AddRigMethods
 from .create_rig.create_rig import create_rig
 
 from .create_video.create_video import create_video
 from .export_3d_model.export_3d_model import export_3d_model
 from .empties.creation.create_freemocap_empties import create_freemocap_empties
+from .empties.creation.create_virtual_trajectories import load_virtual_marker_definitions
+from .empties.remove_unused_empties import remove_unused_empties
+from .empties.reorient_empties import reorient_empties
 from .meshes.center_of_mass.center_of_mass_mesh import create_center_of_mass_mesh
 from .meshes.center_of_mass.center_of_mass_trails import create_center_of_mass_trails
 from .meshes.skelly_mesh.attach_skelly_mesh import attach_skelly_mesh_to_rig
@@ -23,11 +30,14 @@ from .setup_scene.make_parent_empties import create_parent_empty
 from .setup_scene.set_start_end_frame import set_start_end_frame
 from ..data_models.bones.bone_constraints import get_bone_constraint_definitions
 from ..data_models.bones.bone_definitions import get_bone_definitions
+from ..data_models.freemocap_data.helpers.freemocap_data_paths import FreemocapDataPaths
+from ..data_models.mediapipe_names.virtual_trajectories import get_media_pipe_virtual_trajectory_definition
 from ..data_models.parameter_models.parameter_models import Config
 from ..freemocap_data_handler.helpers.saver import FreemocapDataSaver
 from ..freemocap_data_handler.operations.enforce_rigid_bodies.enforce_rigid_bodies import enforce_rigid_bodies
 from ..freemocap_data_handler.operations.fix_hand_data import fix_hand_data
 from ..freemocap_data_handler.operations.put_skeleton_on_ground import put_skeleton_on_ground
+from ..freemocap_data_handler.operations.reduce_shakiness import reduce_shakiness
 
 
 class MainController:
@@ -59,14 +69,28 @@ class MainController:
         self.bone_constraint_definitions = get_bone_constraint_definitions()
         self._create_parent_empties()
         self.freemocap_data_handler = get_or_create_freemocap_data_handler(
-            recording_path=self.recording_path
+            recording_path=self.recording_path,
+            **self._processing_stage_options,
         )
         self.empties = None
+        self._processed_data_cache_key = None
 
     @property
     def data_parent_empty(self):
         return self._data_parent_empty
 
+    @property
+    def _processing_stage_options(self) -> Dict[str, Any]:
+        """
+        The handler's processing stage memory budget and spill directory, from the config
+        """
+        processing_stages_config = self.config.processing_stages
+        memory_budget_bytes = None
+        if processing_stages_config.memory_budget_megabytes > 0:
+            memory_budget_bytes = int(processing_stages_config.memory_budget_megabytes * 1024 * 1024)
+        return {"stage_memory_budget_bytes": memory_budget_bytes,
+                "stage_spill_directory": processing_stages_config.spill_directory or None}
+
     @property
     def empty_names(self) -> List[str]:
         if self.empties is None:
@@ -124,7 +148,8 @@ class MainController:
         try:
             print("Loading freemocap data....")
             self.freemocap_data_handler = load_freemocap_data(
-                recording_path=self.recording_path
+                recording_path=self.recording_path,
+                **self._processing_stage_options,
             )
             self.freemocap_data_handler.mark_processing_stage("original_from_file")
             set_start_end_frame(
@@ -134,10 +159,38 @@ class MainController:
             print(f"Failed to load freemocap data: {e}")
             raise e
 
+    def reduce_shakiness(self):
+        reduce_shakiness_config = self.config.reduce_shakiness
+        if not reduce_shakiness_config.repair_spikes and not reduce_shakiness_config.low_pass_cutoff_frequency:
+            return
+        try:
+            recording_fps = get_recording_fps(recording_path=self.recording_path)
+            if recording_fps is None:
+                recording_fps = reduce_shakiness_config.recording_fps
+                print(f"Using the configured recording frame rate: {recording_fps} fps")
+            reduce_shakiness(
+                handler=self.freemocap_data_handler,
+                recording_fps=recording_fps,
+                repair_spikes=reduce_shakiness_config.repair_spikes,
+                spike_threshold=reduce_shakiness_config.spike_threshold,
+                minimum_spike_acceleration=reduce_shakiness_config.minimum_spike_acceleration,
+                spike_return_ratio=reduce_shakiness_config.spike_return_ratio,
+                low_pass_cutoff_frequency=reduce_shakiness_config.low_pass_cutoff_frequency or None,
+            )
+        except Exception as e:
+            print(f"Failed during `reduce shakiness`, error: `{e}`")
+            print(e)
+            raise e
+
     def calculate_virtual_trajectories(self):
         try:
             print("Calculating virtual trajectories....")
-            self.freemocap_data_handler.calculate_virtual_trajectories()
+            virtual_marker_definitions = get_media_pipe_virtual_trajectory_definition()
+            if self.config.virtual_markers.definitions_path:
+                virtual_marker_definitions.update(
+                    load_virtual_marker_definitions(path=self.config.virtual_markers.definitions_path))
+            self.freemocap_data_handler.calculate_virtual_trajectories(
+                virtual_marker_definitions=virtual_marker_definitions)
             self.freemocap_data_handler.mark_processing_stage(
                 "add_virtual_trajectories"
             )
@@ -180,12 +233,55 @@ class MainController:
             print(e)
             raise e
 
+    def load_processed_data_from_cache(self) -> bool:
+        """
+        Try to load the output of the data processing stages from the cache, returns True on a cache hit
+        """
+        if not self.config.processed_data_cache.enabled:
+            return False
+        try:
+            cache = ProcessedDataCache.for_recording(recording_path=self.recording_path,
+                                                     hash_content=self.config.processed_data_cache.hash_content)
+            self._processed_data_cache_key = cache.key(
+                data_paths=FreemocapDataPaths.from_recording_folder(self.recording_path),
+                config=self.config)
+            cached_handler = cache.load(key=self._processed_data_cache_key, **self._processing_stage_options)
+        except Exception as e:
+            print(f"Failed to check the processed data cache, processing data from scratch: {e}")
+            return False
+
+        if cached_handler is None:
+            return False
+
+        self.freemocap_data_handler = cached_handler
+        # the session's handler is the one the UI operators (e.g. reorienting the empties) work on
+        set_freemocap_data_handler(cached_handler)
+        set_start_end_frame(
+            number_of_frames=self.freemocap_data_handler.number_of_frames
+        )
+        return True
+
+    def save_processed_data_to_cache(self):
+        if not self.config.processed_data_cache.enabled or self._processed_data_cache_key is None:
+            return
+        try:
+            print("Saving processed data to cache...")
+            ProcessedDataCache.for_recording(recording_path=self.recording_path,
+                                             max_entries=self.config.processed_data_cache.max_entries).save(
+                key=self._processed_data_cache_key,
+                handler=self.freemocap_data_handler,
+            )
+        except Exception as e:
+            # the cache is an optimization, failing to write it shouldn't stop the rest of the pipeline
+            print(f"Failed to save processed data to cache: {e}")
+
     def save_data_to_disk(self):
         try:
             print("Saving data to disk...")
             FreemocapDataSaver(handler=self.freemocap_data_handler).save(
                 recording_path=self.recording_path
             )
+            write_saved_data_cache_key(recording_path=self.recording_path, key=self._processed_data_cache_key)
         except Exception as e:
             print(f"Failed to save data to disk: {e}")
             print(e)
@@ -204,6 +300,27 @@ class MainController:
         except Exception as e:
             print(f"Failed to create keyframed empties: {e}")
 
+    def reorient_empties(self):
+        if self.empties is None:
+            raise ValueError("Empties have not been created yet!")
+        adjust_empties_config = self.config.adjust_empties
+        try:
+            print("Reorienting empties....")
+            reorient_empties(
+                empties=self.empties,
+                z_align_ref_empty=adjust_empties_config.vertical_align_reference,
+                z_align_angle_offset=adjust_empties_config.vertical_align_angle_offset,
+                ground_ref_empty=adjust_empties_config.ground_align_reference,
+                z_translation_offset=adjust_empties_config.vertical_align_position_offset,
+                correct_fingers_empties=adjust_empties_config.correct_fingers_empties,
+                handler=self.freemocap_data_handler,
+                baked_layers_parent=self._data_parent_empty,
+            )
+        except Exception as e:
+            print(f"Failed to reorient empties: {e}")
+            print(traceback.format_exc())
+            raise e
+
     def add_rig(self):
         try:
             print("Adding rig...")
@@ -216,6 +333,7 @@ class MainController:
                 add_fingers_constraints=self.config.add_rig.add_fingers_constraints,
                 bone_constraint_definitions=self.bone_constraint_definitions,
                 use_limit_rotation=self.config.add_rig.use_limit_rotation,
+                bake_animation=self.config.add_rig.bake_animation,
             )
         except Exception as e:
             print(f"Failed to add rig: {e}")
@@ -235,6 +353,7 @@ class MainController:
                 csv_save_path=csv_file_path,
                 start_frame=0,
                 end_frame=self.freemocap_data_handler.number_of_frames,
+                save_csv=self.config.add_rig.save_bone_and_joint_data_csv,
             )
         except Exception as e:
             print(f"Failed to save joint angles: {e}")
@@ -255,6 +374,7 @@ class MainController:
                 rig=self.rig,
                 empties=self.empties,
                 parent_object=self._rigid_body_meshes_parent_object,
+                single_skinned_mesh=self.config.add_body_mesh.single_skinned_rigid_body_mesh,
             )
         except Exception as e:
             print(f"Failed to attach rigid bone meshes to rig: {e}")
@@ -297,7 +417,7 @@ class MainController:
                 center_of_mass_trajectory=np.squeeze(self.freemocap_data_handler.center_of_mass_trajectory),
                 parent_empty=self._data_parent_empty,
                 tail_past_frames=30,
-                trail_future_frames=30   ,
+                trail_future_frames=30,
                 trail_starting_width=0.045,
                 trail_minimum_width=0.01,
                 trail_size_decay_rate=0.8,
@@ -309,6 +429,17 @@ class MainController:
             print(e)
             raise e
 
+    def remove_unused_empties(self):
+        if self.empties is None:
+            raise ValueError("Empties have not been created yet!")
+        try:
+            print("Removing unused empties...")
+            self.empties = remove_unused_empties(empties=self.empties)
+        except Exception as e:
+            print(f"Failed to remove unused empties: {e}")
+            print(traceback.format_exc())
+            raise e
+
     def add_videos(self):
         try:
             print("Loading videos as planes...")
@@ -355,6 +486,8 @@ class MainController:
             start_frame=bpy.context.scene.frame_start,
             end_frame=bpy.context.scene.frame_end,
             export_profile="debug",
+            freemocap_data_handler=self.freemocap_data_handler,
+            data_parent_empty=self._data_parent_empty,
         )
 
 
@@ -382,12 +515,18 @@ class MainController:
 
         # Pure python stuff
         # TODO - move the non-blender stuff to a another module (prob `skellyforge`)
-        self.load_freemocap_data()
-        self.calculate_virtual_trajectories()
-        self.put_data_in_inertial_reference_frame()
-        self.enforce_rigid_bones()
-        self.fix_hand_data()
-        self.save_data_to_disk()
+        if not self.load_processed_data_from_cache():
+            self.load_freemocap_data()
+            self.reduce_shakiness()
+            self.calculate_virtual_trajectories()
+            self.put_data_in_inertial_reference_frame()
+            self.enforce_rigid_bones()
+            self.fix_hand_data()
+            self.save_data_to_disk()
+            self.save_processed_data_to_cache()
+        elif read_saved_data_cache_key(self.recording_path) != self._processed_data_cache_key:
+            # saved_data was written by a run with another config (or without the cache), rewrite it from the cache
+            self.save_data_to_disk()
 
         #Blender stuff
         self.create_empties()
@@ -396,7 +535,10 @@ class MainController:
         self.attach_rigid_body_mesh_to_rig()
         self.attach_skelly_mesh_to_rig()
         self.create_center_of_mass_mesh()
-        # self.create_center_of_mass_trails()
+        self.create_center_of_mass_trails()
+        if self.config.add_rig.bake_animation and self.config.add_rig.remove_unused_empties:
+            # with the rig baked, only the empties the meshes still follow are needed
+            self.remove_unused_empties()
         self.add_videos()
         self.setup_scene()
         # self.create_video()
@@ -1,44 +1,12 @@
-# from typing import Tuple
 from typing import Tuple
 
 import bpy
 import numpy as np
-from ajc27_freemocap_blender_addon.core_functions.empties.creation.create_empty_from_trajectory import \
-    create_keyframed_empty_from_3d_trajectory_data
 
+from ajc27_freemocap_blender_addon.core_functions.meshes.geometry_nodes_helpers import group_input_identifier, \
+    math_node, new_group_socket
 
-def create_trail_empties(trajectory: np.ndarray,
-                         parent_object: bpy.types.Object,
-                         tail_past_frames: int,
-                         trail_future_frames: int):
-    """
-    Create a trail of empties from a center of mass empty that correspond to the center of mass empty's location on past and future frames.    
-    """
-
-    past_com_trail_empties = []
-    for frame in range(1, tail_past_frames + 1):
-        past_shifted_trajectory = np.vstack((trajectory[:frame, :], trajectory[:-frame, :]))
-        past_com_trail_empties.append(create_keyframed_empty_from_3d_trajectory_data(
-            trajectory_fr_xyz=past_shifted_trajectory,
-            trajectory_name=f"past_com_trail_empty_{frame}",
-            parent_object=parent_object,
-            empty_scale=0.01,
-            empty_type="SPHERE",
-        )
-        )
-
-    future_com_trail_empties = []
-    for frame in range(trail_future_frames):
-        future_shifted_trajectory = np.vstack((trajectory[frame:, :], trajectory[:frame, :]))
-        future_com_trail_empties.append(create_keyframed_empty_from_3d_trajectory_data(
-            trajectory_fr_xyz=future_shifted_trajectory,
-            trajectory_name=f"future_com_trail_empty_{frame}",
-            parent_object=parent_object,
-            empty_scale=0.01,
-            empty_type="SPHERE",
-        )
-        )
-    return {"past": past_com_trail_empties, "future": future_com_trail_empties}
+CENTER_OF_MASS_TRAIL_NAME = "center_of_mass_trail"
 
 
 def create_center_of_mass_trails(center_of_mass_trajectory: np.ndarray,
@@ -49,51 +17,125 @@ def create_center_of_mass_trails(center_of_mass_trajectory: np.ndarray,
                                  trail_minimum_width: float,
                                  trail_size_decay_rate: float,
                                  trail_color: Tuple[float, float, float, float],
-                                 ):
-    com_trail_empties = create_trail_empties(trajectory=center_of_mass_trajectory,
-                                             parent_object=parent_empty,
-                                             tail_past_frames=tail_past_frames,
-                                             trail_future_frames=trail_future_frames)
-    for direction, empties in com_trail_empties.items():
-        for empty_number, empty in enumerate(empties):
-            scale = trail_starting_width * (trail_size_decay_rate ** empty_number)
-            if scale < trail_minimum_width:
-                scale = trail_minimum_width
-
-            length = 1  # Default length for now
-            if empty_number < len(empties) - 1:
-                # Here we calculate the distance to the next empty to set length
-                length = (empties[empty_number + 1].location - empty.location).length
-
-            # trail_point_mesh = make_bone_mesh(name=f"com_trail_sphere_{empty_number}",
-            #                                   axis_visible=False,
-            #                                   length=length,
-            #                                   squish_scale=(1, 1, 1),
-            #                                   )
-            bpy.ops.mesh.primitive_uv_sphere_add(segments=8,
-                                                    ring_count=8,
-                                                    scale=(scale, scale, scale),
-                                                    )                               
-            trail_point_mesh = bpy.context.active_object
-            trail_point_mesh.name = f"{empty.name}_trail_sphere"
-            trail_point_mesh.parent = empty
-
-
-            if empty_number < len(empties) - 1:
-                damped_track_constraint = trail_point_mesh.constraints.new(type='DAMPED_TRACK')
-                damped_track_constraint.target = empties[empty_number + 1]
-                damped_track_constraint.track_axis = 'TRACK_Z'
-                # driver = trail_point_mesh.driver_add("scale", 2).driver
-                # driver.type = 'SCRIPTED'
-                
-                # dist_var = driver.variables.new()
-                # dist_var.name = 'dist'
-                # dist_var.type = 'LOC_DIFF'
-                
-                # # Targets
-                # dist_var.targets[0].id = empties[empty_number]
-                # dist_var.targets[1].id = empties[empty_number + 1]
-
-                # driver.expression = 'dist'
-
-            empty.hide_set(True)
+                                 ) -> bpy.types.Object:
+    """
+    Create the center of mass trail: a single object showing spheres at the center of mass location on the past and
+    future frames around the current one.
+
+    The trajectory is stored once, as the vertices of a point mesh (vertex `i` is the location on frame `i`), and a
+    geometry nodes modifier instances the spheres on the vertices in the trail window of the current frame. The trail
+    lengths and widths are inputs of the modifier, so they can be changed from the modifier panel without rebuilding.
+    """
+    trail_mesh = create_trajectory_point_mesh(name=CENTER_OF_MASS_TRAIL_NAME, trajectory=center_of_mass_trajectory)
+    trail_object = bpy.data.objects.new(CENTER_OF_MASS_TRAIL_NAME, trail_mesh)
+    trail_object.parent = parent_empty
+
+    trail_material = bpy.data.materials.new(name=f"{CENTER_OF_MASS_TRAIL_NAME}_material")
+    trail_material.diffuse_color = trail_color
+    trail_material.use_nodes = True
+    principled_bsdf = trail_material.node_tree.nodes.get("Principled BSDF")
+    if principled_bsdf is not None:
+        principled_bsdf.inputs["Base Color"].default_value = trail_color
+
+    node_group = create_trail_geometry_nodes(name=f"Geometry Nodes_{CENTER_OF_MASS_TRAIL_NAME}",
+                                             material=trail_material)
+    modifier = trail_object.modifiers.new(name=node_group.name, type='NODES')
+    modifier.node_group = node_group
+    for input_name, value in [("Past Frames", tail_past_frames),
+                              ("Future Frames", trail_future_frames),
+                              ("Starting Width", trail_starting_width),
+                              ("Minimum Width", trail_minimum_width),
+                              ("Size Decay Rate", trail_size_decay_rate)]:
+        modifier[group_input_identifier(node_group, input_name)] = value
+
+    if parent_empty is not None and len(parent_empty.users_collection) > 0:
+        parent_empty.users_collection[0].objects.link(trail_object)
+    else:
+        bpy.context.scene.collection.objects.link(trail_object)
+
+    return trail_object
+
+
+def create_trajectory_point_mesh(name: str, trajectory: np.ndarray) -> bpy.types.Mesh:
+    """
+    Create a mesh with one vertex per frame of a (frame, xyz) trajectory. Frames without data (NaN) take the location of
+    the closest earlier frame that has data (or the first one that has, for frames before it).
+    """
+    trajectory = np.asarray(trajectory, dtype=np.float64).reshape(-1, 3)
+    valid = ~np.isnan(trajectory).any(axis=1)
+    if valid.any():
+        last_valid_frame = np.maximum.accumulate(np.where(valid, np.arange(trajectory.shape[0]), -1))
+        last_valid_frame[last_valid_frame < 0] = np.argmax(valid)
+        trajectory = trajectory[last_valid_frame]
+    else:
+        trajectory = np.zeros_like(trajectory)
+
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(trajectory.shape[0])
+    mesh.vertices.foreach_set("co", trajectory.astype(np.float32).ravel())
+    mesh.update()
+    return mesh
+
+
+def create_trail_geometry_nodes(name: str, material: bpy.types.Material) -> bpy.types.NodeTree:
+    """
+    Geometry nodes that keep the vertices whose index (frame) is within `Past Frames` before and `Future Frames` after
+    the current frame, and put a sphere on each of them, of width `Starting Width * Size Decay Rate ^ distance to the
+    current frame` (but at least `Minimum Width`).
+    """
+    node_group = bpy.data.node_groups.new(name=name, type='GeometryNodeTree')
+    new_group_socket(node_group, "Geometry", 'NodeSocketGeometry', in_out='INPUT')
+    new_group_socket(node_group, "Past Frames", 'NodeSocketInt', in_out='INPUT', default_value=30, min_value=0)
+    new_group_socket(node_group, "Future Frames", 'NodeSocketInt', in_out='INPUT', default_value=30, min_value=0)
+    new_group_socket(node_group, "Starting Width", 'NodeSocketFloat', in_out='INPUT', default_value=0.045)
+    new_group_socket(node_group, "Minimum Width", 'NodeSocketFloat', in_out='INPUT', default_value=0.01)
+    new_group_socket(node_group, "Size Decay Rate", 'NodeSocketFloat', in_out='INPUT', default_value=0.8)
+    new_group_socket(node_group, "Geometry", 'NodeSocketGeometry', in_out='OUTPUT')
+
+    nodes = node_group.nodes
+    links = node_group.links
+    group_input = nodes.new(type='NodeGroupInput')
+    group_output = nodes.new(type='NodeGroupOutput')
+
+    # frames from the current frame to each vertex's frame (negative in the past)
+    scene_time = nodes.new(type='GeometryNodeInputSceneTime')
+    index = nodes.new(type='GeometryNodeInputIndex')
+    frame_offset = math_node(node_group, 'SUBTRACT', index.outputs["Index"], scene_time.outputs["Frame"])
+
+    # in the trail window if -Past Frames <= offset < Future Frames
+    not_too_old = math_node(node_group, 'LESS_THAN',
+                            math_node(node_group, 'MULTIPLY', frame_offset, -1),
+                            math_node(node_group, 'ADD', group_input.outputs["Past Frames"], 0.5))
+    not_too_new = math_node(node_group, 'LESS_THAN', frame_offset, group_input.outputs["Future Frames"])
+    in_trail = math_node(node_group, 'MULTIPLY', not_too_old, not_too_new)
+
+    # sphere width decays with the distance to the current frame
+    decay = math_node(node_group, 'POWER',
+                      group_input.outputs["Size Decay Rate"],
+                      math_node(node_group, 'ABSOLUTE', frame_offset))
+    width = math_node(node_group, 'MAXIMUM',
+                      math_node(node_group, 'MULTIPLY', decay, group_input.outputs["Starting Width"]),
+                      group_input.outputs["Minimum Width"])
+
+    sphere = nodes.new(type='GeometryNodeMeshUVSphere')
+    sphere.inputs["Segments"].default_value = 8
+    sphere.inputs["Rings"].default_value = 8
+    sphere.inputs["Radius"].default_value = 1.0
+    set_material = nodes.new(type='GeometryNodeSetMaterial')
+    set_material.inputs["Material"].default_value = material
+    links.new(sphere.outputs["Mesh"], set_material.inputs["Geometry"])
+
+    mesh_to_points = nodes.new(type='GeometryNodeMeshToPoints')
+    links.new(group_input.outputs["Geometry"], mesh_to_points.inputs["Mesh"])
+
+    # the selection and width fields are evaluated on the points, where the index is still the frame
+    instance_on_points = nodes.new(type='GeometryNodeInstanceOnPoints')
+    links.new(mesh_to_points.outputs["Points"], instance_on_points.inputs["Points"])
+    links.new(in_trail, instance_on_points.inputs["Selection"])
+    links.new(set_material.outputs["Geometry"], instance_on_points.inputs["Instance"])
+    links.new(width, instance_on_points.inputs["Scale"])
+
+    links.new(instance_on_points.outputs["Instances"], group_output.inputs["Geometry"])
+
+    return node_group
+
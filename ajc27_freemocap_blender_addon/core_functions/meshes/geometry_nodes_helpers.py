@@ -0,0 +1,57 @@
+import bpy
+
+
+def new_group_socket(node_group: bpy.types.NodeTree,
+                     name: str,
+                     socket_type: str,
+                     in_out: str,
+                     **properties):
+    """
+    Add an input or output socket to a node group (the interface API changed in Blender 4.0)
+    """
+    if bpy.app.version >= (4, 0, 0):
+        socket = node_group.interface.new_socket(name=name, in_out=in_out, socket_type=socket_type)
+    elif in_out == 'INPUT':
+        socket = node_group.inputs.new(socket_type, name)
+    else:
+        socket = node_group.outputs.new(socket_type, name)
+
+    for property_name, value in properties.items():
+        setattr(socket, property_name, value)
+    return socket
+
+
+def group_input_identifier(node_group: bpy.types.NodeTree, name: str) -> str:
+    """
+    Identifier of a node group input, used to set its value on a geometry nodes modifier (`modifier[identifier]`)
+    """
+    if bpy.app.version >= (4, 0, 0):
+        return next(item.identifier for item in node_group.interface.items_tree
+                    if item.item_type == 'SOCKET' and item.in_out == 'INPUT' and item.name == name)
+    return node_group.inputs[name].identifier
+
+
+def math_node(node_group: bpy.types.NodeTree,
+              operation: str,
+              first_input,
+              second_input=None) -> bpy.types.NodeSocket:
+    """
+    Add a Math node doing `operation` to the node group and return its output. Each input is linked if it is a socket,
+    or set if it is a value
+    """
+    node = node_group.nodes.new(type='ShaderNodeMath')
+    node.operation = operation
+    for socket, value in zip(node.inputs, [first_input, second_input]):
+        if isinstance(value, bpy.types.NodeSocket):
+            node_group.links.new(value, socket)
+        elif value is not None:
+            socket.default_value = value
+    return node.outputs[0]
+
+
+def enabled_socket(sockets, name: str) -> bpy.types.NodeSocket:
+    """
+    The socket called `name` that is in use. Before Blender 4.0 nodes with a data type (Sample Index, Named Attribute,
+    etc.) have one socket per type with the same name, and only the one matching the node's type is enabled
+    """
+    return next(socket for socket in sockets if socket.name == name and socket.enabled)
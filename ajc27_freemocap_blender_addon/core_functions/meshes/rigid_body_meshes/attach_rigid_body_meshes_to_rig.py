@@ -11,6 +11,7 @@ def create_rigid_body_meshes(rig: bpy.types.Object,
                              parent_object: bpy.types.Object,
                              bone_data: Dict[str, BoneDefinition],
                              empties: Dict[str, bpy.types.Object] = None,
+                             single_skinned_mesh: bool = False,
                              ):
     try:
 
@@ -20,7 +21,8 @@ def create_rigid_body_meshes(rig: bpy.types.Object,
 
         put_rigid_body_meshes_on_empties(empties=empties,
                                          bone_data=bone_data,
-                                         parent_empty=parent_object)
+                                         parent_empty=parent_object,
+                                         single_skinned_mesh=single_skinned_mesh)
 
         # Deselect all
         bpy.ops.object.select_all(action='DESELECT')
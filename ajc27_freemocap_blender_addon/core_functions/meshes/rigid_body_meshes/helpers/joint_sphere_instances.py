@@ -0,0 +1,182 @@
+from typing import Optional
+
+import bpy
+import numpy as np
+
+from ajc27_freemocap_blender_addon.core_functions.materials.create_material import create_material
+from ajc27_freemocap_blender_addon.core_functions.meshes.geometry_nodes_helpers import enabled_socket, \
+    group_input_identifier, math_node, new_group_socket
+
+JOINT_SPHERES_NAME = "joint_spheres"
+MARKER_COLOR_ATTRIBUTE = "marker_color"
+MARKER_SCALE_ATTRIBUTE = "marker_scale"
+MARKER_EMISSION_ATTRIBUTE = "marker_emission"
+
+
+def create_joint_spheres(frame_marker_xyz: np.ndarray,
+                         marker_colors: np.ndarray,
+                         marker_scales: np.ndarray,
+                         marker_emission_strengths: np.ndarray,
+                         start_frame: int,
+                         parent_empty: Optional[bpy.types.Object] = None,
+                         name: str = JOINT_SPHERES_NAME,
+                         ) -> bpy.types.Object:
+    """
+    Create one object that shows a sphere on every marker, instead of one sphere object (and constraint) per marker.
+
+    The (frame, marker, xyz) locations are stored once as the vertices of a point mesh (vertex `frame * markers +
+    marker`), with the color (RGBA), scale and emission strength of each marker as point attributes. A geometry nodes
+    modifier samples the block of vertices of the current frame and instances a sphere on each of them, the material
+    reads the color and emission from the instances. Markers are hidden on the frames where their location is NaN.
+    """
+    frame_marker_xyz = np.asarray(frame_marker_xyz, dtype=np.float64)
+    number_of_frames, number_of_markers = frame_marker_xyz.shape[:2]
+    missing = np.isnan(frame_marker_xyz).any(axis=2)
+
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(number_of_frames * number_of_markers)
+    mesh.vertices.foreach_set("co", np.where(np.isnan(frame_marker_xyz), 0, frame_marker_xyz).astype(np.float32).ravel())
+
+    colors = np.broadcast_to(np.asarray(marker_colors, dtype=np.float32), (number_of_frames, number_of_markers, 4))
+    scales = np.where(missing, 0, np.asarray(marker_scales, dtype=np.float32)[np.newaxis, :])
+    emission_strengths = np.broadcast_to(np.asarray(marker_emission_strengths, dtype=np.float32),
+                                         (number_of_frames, number_of_markers))
+    mesh.attributes.new(MARKER_COLOR_ATTRIBUTE, type='FLOAT_COLOR', domain='POINT').data.foreach_set(
+        "color", np.ascontiguousarray(colors, dtype=np.float32).ravel())
+    mesh.attributes.new(MARKER_SCALE_ATTRIBUTE, type='FLOAT', domain='POINT').data.foreach_set(
+        "value", scales.astype(np.float32).ravel())
+    mesh.attributes.new(MARKER_EMISSION_ATTRIBUTE, type='FLOAT', domain='POINT').data.foreach_set(
+        "value", np.ascontiguousarray(emission_strengths, dtype=np.float32).ravel())
+    mesh.update()
+
+    spheres_object = bpy.data.objects.new(name, mesh)
+    spheres_object.parent = parent_empty
+
+    node_group = create_joint_sphere_geometry_nodes(name=f"Geometry Nodes_{name}",
+                                                    material=create_joint_sphere_material(name=f"{name}_material"))
+    modifier = spheres_object.modifiers.new(name=node_group.name, type='NODES')
+    modifier.node_group = node_group
+    for input_name, value in [("Markers", number_of_markers),
+                              ("Frames", number_of_frames),
+                              ("Start Frame", start_frame)]:
+        modifier[group_input_identifier(node_group, input_name)] = value
+
+    if parent_empty is not None and len(parent_empty.users_collection) > 0:
+        parent_empty.users_collection[0].objects.link(spheres_object)
+    else:
+        bpy.context.scene.collection.objects.link(spheres_object)
+
+    return spheres_object
+
+
+def create_joint_sphere_material(name: str) -> bpy.types.Material:
+    """
+    The usual emissive marker material, with its color and emission strength read from the sphere instances
+    """
+    material = create_material(name=name, color="#FFFFFF")
+    nodes = material.node_tree.nodes
+    links = material.node_tree.links
+
+    color_attribute = nodes.new(type="ShaderNodeAttribute")
+    color_attribute.attribute_type = 'INSTANCER'
+    color_attribute.attribute_name = MARKER_COLOR_ATTRIBUTE
+    emission_attribute = nodes.new(type="ShaderNodeAttribute")
+    emission_attribute.attribute_type = 'INSTANCER'
+    emission_attribute.attribute_name = MARKER_EMISSION_ATTRIBUTE
+
+    for node in nodes:
+        if node.type == 'BSDF_PRINCIPLED':
+            links.new(color_attribute.outputs["Color"], node.inputs[0])
+        elif node.type == 'EMISSION':
+            links.new(color_attribute.outputs["Color"], node.inputs[0])
+            links.new(emission_attribute.outputs["Fac"], node.inputs[1])
+    return material
+
+
+def create_joint_sphere_geometry_nodes(name: str, material: bpy.types.Material) -> bpy.types.NodeTree:
+    """
+    Geometry nodes that make `Markers` points, move each one to its vertex in the current frame's block of the input
+    mesh (`Start Frame` is the first block, frames outside the `Frames` blocks show the first or last one) and put a
+    sphere on it, with the marker's scale and its color and emission stored on the instance
+    """
+    node_group = bpy.data.node_groups.new(name=name, type='GeometryNodeTree')
+    new_group_socket(node_group, "Geometry", 'NodeSocketGeometry', in_out='INPUT')
+    new_group_socket(node_group, "Markers", 'NodeSocketInt', in_out='INPUT', default_value=1, min_value=1)
+    new_group_socket(node_group, "Frames", 'NodeSocketInt', in_out='INPUT', default_value=1, min_value=1)
+    new_group_socket(node_group, "Start Frame", 'NodeSocketInt', in_out='INPUT', default_value=0)
+    new_group_socket(node_group, "Sphere Scale", 'NodeSocketFloat', in_out='INPUT', default_value=1.0, min_value=0.0)
+    new_group_socket(node_group, "Geometry", 'NodeSocketGeometry', in_out='OUTPUT')
+
+    nodes = node_group.nodes
+    links = node_group.links
+    group_input = nodes.new(type='NodeGroupInput')
+    group_output = nodes.new(type='NodeGroupOutput')
+
+    def sample_attribute(data_type: str, value: bpy.types.NodeSocket, index: bpy.types.NodeSocket):
+        node = nodes.new(type='GeometryNodeSampleIndex')
+        node.data_type = data_type
+        node.domain = 'POINT'
+        links.new(group_input.outputs["Geometry"], node.inputs["Geometry"])
+        links.new(value, enabled_socket(node.inputs, "Value"))
+        links.new(index, node.inputs["Index"])
+        return enabled_socket(node.outputs, "Value")
+
+    def named_attribute(data_type: str, attribute_name: str) -> bpy.types.NodeSocket:
+        node = nodes.new(type='GeometryNodeInputNamedAttribute')
+        node.data_type = data_type
+        node.inputs["Name"].default_value = attribute_name
+        return enabled_socket(node.outputs, "Attribute")
+
+    # index of each point's vertex in the current frame's block
+    scene_time = nodes.new(type='GeometryNodeInputSceneTime')
+    frame_index = math_node(node_group, 'SUBTRACT', scene_time.outputs["Frame"], group_input.outputs["Start Frame"])
+    frame_index = math_node(node_group, 'MINIMUM',
+                            math_node(node_group, 'MAXIMUM', math_node(node_group, 'FLOOR', frame_index), 0),
+                            math_node(node_group, 'SUBTRACT', group_input.outputs["Frames"], 1))
+    index = nodes.new(type='GeometryNodeInputIndex')
+    vertex_index = math_node(node_group, 'ADD',
+                             math_node(node_group, 'MULTIPLY', frame_index, group_input.outputs["Markers"]),
+                             index.outputs["Index"])
+
+    points = nodes.new(type='GeometryNodePoints')
+    links.new(group_input.outputs["Markers"], points.inputs["Count"])
+
+    position = nodes.new(type='GeometryNodeInputPosition')
+    set_position = nodes.new(type='GeometryNodeSetPosition')
+    links.new(points.outputs["Geometry"], set_position.inputs["Geometry"])
+    links.new(sample_attribute('FLOAT_VECTOR', position.outputs["Position"], vertex_index),
+              set_position.inputs["Position"])
+
+    # the color and emission are stored on the points, so the instances (and their material) inherit them
+    geometry = set_position.outputs["Geometry"]
+    for data_type, attribute_name in [('FLOAT_COLOR', MARKER_COLOR_ATTRIBUTE),
+                                      ('FLOAT', MARKER_EMISSION_ATTRIBUTE)]:
+        store_attribute = nodes.new(type='GeometryNodeStoreNamedAttribute')
+        store_attribute.data_type = data_type
+        store_attribute.domain = 'POINT'
+        store_attribute.inputs["Name"].default_value = attribute_name
+        links.new(geometry, store_attribute.inputs["Geometry"])
+        links.new(sample_attribute(data_type, named_attribute(data_type, attribute_name), vertex_index),
+                  enabled_socket(store_attribute.inputs, "Value"))
+        geometry = store_attribute.outputs["Geometry"]
+
+    sphere = nodes.new(type='GeometryNodeMeshUVSphere')
+    sphere.inputs["Segments"].default_value = 8
+    sphere.inputs["Rings"].default_value = 8
+    sphere.inputs["Radius"].default_value = 1.0
+    set_material = nodes.new(type='GeometryNodeSetMaterial')
+    set_material.inputs["Material"].default_value = material
+    links.new(sphere.outputs["Mesh"], set_material.inputs["Geometry"])
+
+    scale = math_node(node_group, 'MULTIPLY',
+                      sample_attribute('FLOAT', named_attribute('FLOAT', MARKER_SCALE_ATTRIBUTE), vertex_index),
+                      group_input.outputs["Sphere Scale"])
+
+    instance_on_points = nodes.new(type='GeometryNodeInstanceOnPoints')
+    links.new(geometry, instance_on_points.inputs["Points"])
+    links.new(set_material.outputs["Geometry"], instance_on_points.inputs["Instance"])
+    links.new(scale, instance_on_points.inputs["Scale"])
+
+    links.new(instance_on_points.outputs["Instances"], group_output.inputs["Geometry"])
+
+    return node_group
@@ -1,99 +1,18 @@
-from typing import List, Tuple, Union
+from typing import List, Optional, Tuple, Union
 
 import bmesh
 import bpy
 import numpy as np
 from ajc27_freemocap_blender_addon.core_functions.materials.create_material import create_material
 
+BONE_MESH_TEMPLATE_PREFIX = "rigid_body_bone_template"
+BONE_MATERIAL_PREFIX = "rigid_body_bone_material"
 
-def make_cone_mesh(name: str = "cone_mesh",
-                   color: str = "#00FFFF",
-                   emission_strength: float = 1.0,
-                   transmittance: float = 0.0,
-                   vertices: int = 8,
-                   radius1: float = 0.035,
-                   radius2: float = 0.035,
-                   depth: float = 1,
-                   end_fill_type: str = 'TRIFAN',
-                   align: str = 'WORLD',
-                   location: tuple = (0, 0, 0),
-                   scale: tuple = (1, 1, 1)):
-    bpy.context.scene.cursor.location = (0, 0, 0)
-
-    # define cone object
-    bpy.ops.mesh.primitive_cone_add(vertices=vertices,
-                                    radius1=radius1,
-                                    radius2=radius2,
-                                    depth=depth,
-                                    end_fill_type=end_fill_type,
-                                    align=align,
-                                    location=location,
-                                    scale=scale)
-
-    cone = bpy.context.active_object
-    cone.name = name
-
-    material = create_material(name=f"{name}_material",
-                               color=color,
-                               )
-
-    cone_object = bpy.data.objects[name]
-    cone_mesh = cone_object.data
-    cone_mesh.materials.append(material)
-
-    # Go into edit mode
-    bpy.context.view_layer.objects.active = cone_object
-    bpy.ops.object.mode_set(mode='EDIT')
-
-    # Deselect all vertices
-    bm = bmesh.from_edit_mesh(cone_mesh)
-    bm.select_mode = {'VERT'}
-    bpy.ops.mesh.select_all(action='DESELECT')
-
-    bm.verts.ensure_lookup_table()  # This is important to access vertices by index
-    # Select the vertex you want to move the cursor to (i.e. center of the cone base)
-    for vertex in bm.verts:
-        x = vertex.co.x
-        y = vertex.co.y
-        z = vertex.co.z
-        if np.allclose(x, 0) and np.allclose(y, 0) and z < 0:
-            vertex.select = True
-            break
-
-    bpy.context.scene.cursor.location = bpy.context.object.matrix_world @ vertex.co
-
-    bpy.ops.object.mode_set(mode='OBJECT')
-
-    bpy.ops.object.origin_set(type='ORIGIN_CURSOR', center='MEDIAN')
-    cone.location = (0, 0, 0)
-    bpy.context.scene.cursor.location = (0, 0, 0)
-
-    return cone
-
-
-def make_joint_sphere_mesh(name: str = "joint_sphere_mesh",
-                           subdivisions: int = 2,
-                           radius: float = 0.075,
-                           align: str = 'WORLD',
-                           location: tuple = (0, 0, 0),
-                           scale: tuple = (1, 1, 1),
-                           color: Union[str, Tuple, List, np.ndarray] = "#00FFFF",
-                           ):
-    bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=subdivisions,
-                                          radius=radius,
-                                          align=align,
-                                          location=location,
-                                          scale=scale)
-    object = bpy.context.active_object
-    mesh = object.data
-    object.name = name
-
-    material = create_material(name=f"{name}_material",
-                               color=color,
-                               )
-    mesh.materials.append(material)
-
-    return object
+# unit length bone: an 8 sided stick from z=0 to z=1 with a sphere on its head
+CONE_VERTICES = 8
+CONE_RADIUS = 0.035
+JOINT_SPHERE_SUBDIVISIONS = 2
+JOINT_SPHERE_RADIUS = 0.075
 
 
 def make_bone_mesh(name: str = "bone_mesh",
@@ -102,31 +21,87 @@ def make_bone_mesh(name: str = "bone_mesh",
                    axis_visible: bool = True,
                    squish_scale: tuple = (.6, 1, 1),
                    length: float = 1,
+                   collection: Optional[bpy.types.Collection] = None,
                    ) -> bpy.types.Object:
-    cone = make_cone_mesh(name=f"{name}_cone_mesh",
-                          color=cone_color, )
-
-    joint_sphere = make_joint_sphere_mesh(name=f"{name}_joint_sphere_mesh",
-                                          color=joint_color, )
-    bpy.ops.object.select_all(action='DESELECT')
-    cone.select_set(True)
-    joint_sphere.select_set(True)
-    bpy.context.view_layer.objects.active = cone
-    bpy.ops.object.join()
-    bone_mesh_object = bpy.context.active_object
-    bone_mesh_object.name = name
-
-    if axis_visible:
-        bone_mesh_object.show_axis = True
-
-    bone_mesh_object.scale = squish_scale
-    bone_mesh_object.scale *= length
-    # apply scale
-    bpy.ops.object.transform_apply(scale=True)
-
+    """
+    Create a bone mesh object of the given length, pointing along its local z axis.
+
+    Every bone with the same colors and squish shares one unit length template mesh (a linked duplicate), the length is
+    the object's scale. The object is linked to `collection` (the scene's active collection by default).
+    """
+    template_mesh = get_bone_mesh_template(joint_color=joint_color,
+                                           cone_color=cone_color,
+                                           squish_scale=squish_scale)
+    bone_mesh_object = bpy.data.objects.new(name, template_mesh)
+    bone_mesh_object.scale = (length, length, length)
+    bone_mesh_object.show_axis = axis_visible
+
+    if collection is None:
+        collection = bpy.context.collection
+    collection.objects.link(bone_mesh_object)
     return bone_mesh_object
 
 
+def get_bone_mesh_template(joint_color: Union[str, Tuple, List, np.ndarray],
+                           cone_color: Union[str, Tuple, List, np.ndarray],
+                           squish_scale: tuple) -> bpy.types.Mesh:
+    """
+    Get (or build, the first time) the unit length bone mesh of a style. Built with bmesh, without operators or edit mode
+    """
+    name = f"{BONE_MESH_TEMPLATE_PREFIX}_{_color_key(cone_color)}_{_color_key(joint_color)}_" \
+           f"{'x'.join(f'{scale:g}' for scale in squish_scale)}"
+    template_mesh = bpy.data.meshes.get(name)
+    if template_mesh is not None:
+        return template_mesh
+
+    bm = bmesh.new()
+    try:
+        cone = bmesh.ops.create_cone(bm,
+                                     cap_ends=True,
+                                     cap_tris=True,
+                                     segments=CONE_VERTICES,
+                                     radius1=CONE_RADIUS,
+                                     radius2=CONE_RADIUS,
+                                     depth=1.0)
+        # base at the origin
+        bmesh.ops.translate(bm, vec=(0, 0, 0.5), verts=cone["verts"])
+
+        joint_sphere = bmesh.ops.create_icosphere(bm,
+                                                  subdivisions=JOINT_SPHERE_SUBDIVISIONS,
+                                                  radius=JOINT_SPHERE_RADIUS)
+        joint_sphere_faces = {face for vertex in joint_sphere["verts"] for face in vertex.link_faces}
+        for face in joint_sphere_faces:
+            face.material_index = 1
+
+        bmesh.ops.scale(bm, vec=squish_scale, verts=bm.verts)
+
+        template_mesh = bpy.data.meshes.new(name)
+        bm.to_mesh(template_mesh)
+    finally:
+        bm.free()
+
+    template_mesh.materials.append(get_bone_material(color=cone_color))
+    template_mesh.materials.append(get_bone_material(color=joint_color))
+    return template_mesh
+
+
+def get_bone_material(color: Union[str, Tuple, List, np.ndarray]) -> bpy.types.Material:
+    """
+    One material per color, shared by all the bone meshes
+    """
+    name = f"{BONE_MATERIAL_PREFIX}_{_color_key(color)}"
+    material = bpy.data.materials.get(name)
+    if material is None:
+        material = create_material(name=name, color=color)
+    return material
+
+
+def _color_key(color: Union[str, Tuple, List, np.ndarray]) -> str:
+    if isinstance(color, str):
+        return color.lstrip("#").lower()
+    return "".join(f"{int(round(channel * 255)):02x}" for channel in color)
+
+
 if __name__ == "__main__" or __name__ == "<run_path>":
     bone_mesh = make_bone_mesh(name="bone_mesh")
     bone_mesh.location = (0, 0, 0)
@@ -1,18 +1,76 @@
-from typing import Any, Dict, Tuple
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
 
 import bpy
+import numpy as np
 
 from ajc27_freemocap_blender_addon.data_models.bones.bone_definitions import BoneDefinition
-from ajc27_freemocap_blender_addon.data_models.mediapipe_names.mediapipe_heirarchy import get_mediapipe_hierarchy
+from ajc27_freemocap_blender_addon.data_models.skeleton_topology import get_skeleton_topology
+from ajc27_freemocap_blender_addon.core_functions.animation.sample_keyframes import sample_object_world_locations
+from ajc27_freemocap_blender_addon.core_functions.materials.create_material import color_to_rgba
+from .joint_sphere_instances import create_joint_spheres
 from .make_bone_mesh import make_bone_mesh
+from .skinned_rigid_body_mesh import create_skinned_rigid_body_mesh
 from .put_sphere_at_location import put_sphere_mesh_at_location
 
 
 
+@dataclass
+class RigidBodySegment:
+    """
+    One bone mesh of the rigid body meshes, from the `head_empty` to the `tail_empty`
+    """
+    name: str
+    bone_name: str
+    head_empty: bpy.types.Object
+    tail_empty: bpy.types.Object
+    length: float
+    color: str
+    squish_scale: Tuple[float, float, float]
+
+
 def put_rigid_body_meshes_on_empties(empties: Dict[str, bpy.types.Object],
                                      bone_data: Dict[str, Dict[str, Any]],
-                                     parent_empty: bpy.types.Object):
-    mediapipe_hierarchy = get_mediapipe_hierarchy()
+                                     parent_empty: bpy.types.Object,
+                                     single_skinned_mesh: bool = False):
+    """
+    Put a bone mesh on every bone of the skeleton, each one its own object following its empties with a copy location
+    and a damped track constraint. With `single_skinned_mesh`, all the bone meshes are merged into one object deformed
+    by an armature instead (see `create_skinned_rigid_body_mesh`), which looks the same but is much cheaper to play back.
+    """
+    segments = get_rigid_body_segments(empties=empties, bone_data=bone_data)
+
+    if single_skinned_mesh:
+        return create_skinned_rigid_body_mesh(segments=segments, parent_empty=parent_empty)
+
+    # the bone meshes are linked duplicates of one template mesh per style, they go next to the parent empty
+    collection = parent_empty.users_collection[0] \
+        if parent_empty is not None and len(parent_empty.users_collection) > 0 else None
+
+    for segment in segments:
+        bone_mesh = make_bone_mesh(name=segment.name,
+                                   length=segment.length,
+                                   squish_scale=segment.squish_scale,
+                                   joint_color=segment.color,
+                                   cone_color=segment.color,
+                                   axis_visible=False,
+                                   collection=collection,
+                                   )
+        location_constraint = bone_mesh.constraints.new(type="COPY_LOCATION")
+        location_constraint.target = segment.head_empty
+
+        track_to_constraint = bone_mesh.constraints.new(type="DAMPED_TRACK")
+        track_to_constraint.target = segment.tail_empty
+        track_to_constraint.track_axis = "TRACK_Z"
+        bone_mesh.parent = parent_empty
+
+
+def get_rigid_body_segments(empties: Dict[str, bpy.types.Object],
+                            bone_data: Dict[str, Dict[str, Any]]) -> List[RigidBodySegment]:
+    """
+    The bone meshes go on the hierarchy's parent -> child links that are bones (with data in `bone_data`)
+    """
+    topology = get_skeleton_topology()
     all_empties = {}
     for component in empties.values():
         all_empties.update(component)
@@ -23,40 +81,35 @@ def put_rigid_body_meshes_on_empties(empties: Dict[str, bpy.types.Object],
             for other_component in component.values():
                 all_empties.update(other_component)
 
-    for parent_empty_name in mediapipe_hierarchy.keys():
-        # print(f"Creating bone mesh for {parent_empty_name}...")
-        color, squish_scale = get_bone_mesh_color_and_squish(parent_empty_name)
+    segments = []
+    for child_index in np.flatnonzero(topology.parent_indices >= 0):
+        parent_empty_name = topology.marker_names[topology.parent_indices[child_index]]
+        child_name = topology.marker_names[child_index]
+        bone_index = topology.bone_index(head=parent_empty_name, tail=child_name)
+        if bone_index is None or topology.bone_names[bone_index] not in bone_data:
+            continue
 
-        for child_name in mediapipe_hierarchy[parent_empty_name]["children"]:
-            # segment length is the distance between the parent and child empty
-            def find_bone(parent_name: str, child_name: str):
-                for bone_name, bone in bone_data.items():
-                    if bone["head"] == parent_name and bone["tail"] == child_name:
-                        return bone
-                return None
-
-            bone = find_bone(parent_name=parent_empty_name, child_name=child_name)
-            if bone: 
-                # print(f"Segment length for {parent_empty_name} to {child_name} is {bone_data[parent_empty_name].median:.3f}m")
-                print(f"Created bone mesh for {parent_empty_name}: Segment length to {child_name} is {bone['median']:.3f}m")
-                bone_mesh = make_bone_mesh(name=f"{parent_empty_name}_bone_mesh",
-                                        length=bone['median'],
-                                        squish_scale=squish_scale,
-                                        joint_color=color,
-                                        cone_color=color,
-                                        axis_visible=False
-                                        )
-                location_constraint = bone_mesh.constraints.new(type="COPY_LOCATION")
-                location_constraint.target = all_empties[parent_empty_name]
-
-                track_to_constraint = bone_mesh.constraints.new(type="DAMPED_TRACK")
-                track_to_constraint.target = all_empties[child_name]
-                track_to_constraint.track_axis = "TRACK_Z"
-                bone_mesh.parent = parent_empty
+        bone = bone_data[topology.bone_names[bone_index]]
+        color, squish_scale = get_bone_mesh_color_and_squish(parent_empty_name)
+        print(f"Created bone mesh for {parent_empty_name}: Segment length to {child_name} is {bone['median']:.3f}m")
+        segments.append(RigidBodySegment(name=f"{parent_empty_name}_bone_mesh",
+                                         bone_name=topology.bone_names[bone_index],
+                                         head_empty=all_empties[parent_empty_name],
+                                         tail_empty=all_empties[child_name],
+                                         length=bone['median'],
+                                         color=color,
+                                         squish_scale=squish_scale))
+    return segments
 
 
 def put_spheres_on_empties(empties: Dict[str, bpy.types.Object],
                            parent_empty: bpy.types.Object):
+    """
+    Show a sphere on every empty, colored and sized by its group (body, hands, other).
+
+    All the spheres are instanced by a single object (see `create_joint_spheres`) from the empties' locations, sampled
+    once over the scene's frame range, so there are no per-sphere objects or constraints to evaluate on playback.
+    """
     meshes = []
 
     components = {}
@@ -68,6 +121,46 @@ def put_spheres_on_empties(empties: Dict[str, bpy.types.Object],
         for name, empty in other_component_dict.items():
             components["other"][name] = empty
 
+    if bpy.app.version < (3, 4, 0):
+        # the sphere instancing needs the Sample Index geometry node (Blender 3.4+)
+        return put_sphere_objects_on_empties(components=components, parent_empty=parent_empty)
+
+    marker_empties = []
+    marker_colors = []
+    marker_scales = []
+    marker_emission_strengths = []
+    for component_name, component_dict in components.items():
+        color, emission_strength, sphere_scale = get_segment_settings(component_name, emission_strength=1.0)
+        for empty in component_dict.values():
+            marker_empties.append(empty)
+            marker_colors.append([*color_to_rgba(color)[:3], 1.0])
+            marker_scales.append(sphere_scale)
+            marker_emission_strengths.append(emission_strength)
+
+    scene = bpy.context.scene
+    frames = np.arange(scene.frame_start, scene.frame_end + 1)
+    frame_marker_xyz = sample_object_world_locations(objects=marker_empties, frames=frames)
+    if parent_empty is not None:
+        # the spheres object is a child of the parent empty, store the locations in its space
+        world_to_parent = np.linalg.inv(np.array(parent_empty.matrix_world))
+        frame_marker_xyz = frame_marker_xyz @ world_to_parent[:3, :3].T + world_to_parent[:3, 3]
+
+    spheres_object = create_joint_spheres(frame_marker_xyz=frame_marker_xyz,
+                                          marker_colors=np.array(marker_colors),
+                                          marker_scales=np.array(marker_scales),
+                                          marker_emission_strengths=np.array(marker_emission_strengths),
+                                          start_frame=scene.frame_start,
+                                          parent_empty=parent_empty)
+    meshes.append(spheres_object)
+    return meshes
+
+
+def put_sphere_objects_on_empties(components: Dict[str, Dict[str, bpy.types.Object]],
+                                  parent_empty: bpy.types.Object) -> List[bpy.types.Object]:
+    """
+    One sphere object per empty, following it with a `COPY_LOCATION` constraint
+    """
+    meshes = []
     for component_name, component_dict in components.items():
         emission_strength = 1.0
 
@@ -86,6 +179,7 @@ def put_spheres_on_empties(empties: Dict[str, bpy.types.Object],
             constraint = sphere_mesh.constraints.new(type="COPY_LOCATION")
             constraint.target = empty
             sphere_mesh.parent = parent_empty
+            meshes.append(sphere_mesh)
 
     return meshes
 
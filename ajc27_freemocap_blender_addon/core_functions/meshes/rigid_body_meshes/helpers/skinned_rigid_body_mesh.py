@@ -0,0 +1,182 @@
+from typing import List, Optional, Tuple, TYPE_CHECKING
+
+import bpy
+import numpy as np
+
+from ajc27_freemocap_blender_addon.core_functions.animation.bulk_keyframes import keyframe_property_in_bulk
+from ajc27_freemocap_blender_addon.core_functions.animation.sample_keyframes import sample_object_world_locations
+from ajc27_freemocap_blender_addon.core_functions.create_rig.constraint_math import copy_location, damped_track
+from ajc27_freemocap_blender_addon.core_functions.create_rig.rotation_math import make_quaternions_continuous, \
+    matrices_to_quaternions
+from .make_bone_mesh import get_bone_mesh_template
+
+if TYPE_CHECKING:
+    from .put_meshes_on_empties import RigidBodySegment
+
+SKINNED_RIGID_BODY_MESH_NAME = "rigid_body_mesh"
+
+
+def create_skinned_rigid_body_mesh(segments: List['RigidBodySegment'],
+                                   parent_empty: Optional[bpy.types.Object],
+                                   name: str = SKINNED_RIGID_BODY_MESH_NAME,
+                                   frames: Optional[np.ndarray] = None,
+                                   ) -> bpy.types.Object:
+    """
+    Merge the bone meshes of all the segments into one mesh object, deformed by one Armature modifier.
+
+    Each segment has its own vertex group and bone in a (hidden) armature next to the mesh. The bones are keyframed
+    with the transforms the per-segment objects get from their copy location and damped track constraints (evaluated in
+    NumPy from the empties' F-curves over `frames`, the scene's frame range by default), so the mesh looks the same but
+    playback evaluates one armature and one deform pass instead of an object and two constraints per segment.
+    On frames where a segment's empties have no data, its bone keeps the pose of the last frame that has.
+    """
+    if frames is None:
+        scene = bpy.context.scene
+        frames = np.arange(scene.frame_start, scene.frame_end + 1)
+    collection = parent_empty.users_collection[0] \
+        if parent_empty is not None and len(parent_empty.users_collection) > 0 else bpy.context.collection
+
+    armature_object = create_segment_armature(segments=segments,
+                                              name=f"{name}_armature",
+                                              parent_empty=parent_empty,
+                                              collection=collection)
+    animate_segment_armature(armature_object=armature_object,
+                             segments=segments,
+                             parent_empty=parent_empty,
+                             frames=frames)
+
+    mesh, segment_vertex_ranges = create_segment_mesh(segments=segments, name=name)
+    mesh_object = bpy.data.objects.new(name, mesh)
+    for segment, vertex_indices in zip(segments, segment_vertex_ranges):
+        vertex_group = mesh_object.vertex_groups.new(name=segment.bone_name)
+        vertex_group.add(list(vertex_indices), 1.0, 'REPLACE')
+    armature_modifier = mesh_object.modifiers.new(name="Armature", type='ARMATURE')
+    armature_modifier.object = armature_object
+    armature_modifier.use_vertex_groups = True
+
+    # the mesh is in the armature's space, its vertices are the segments' rest pose
+    mesh_object.parent = armature_object
+    collection.objects.link(mesh_object)
+    return mesh_object
+
+
+def create_segment_armature(segments: List['RigidBodySegment'],
+                            name: str,
+                            parent_empty: Optional[bpy.types.Object],
+                            collection: bpy.types.Collection) -> bpy.types.Object:
+    """
+    An armature with one bone per segment, all of them at the origin pointing up the z axis (the rest pose of the
+    segment meshes). The bones are hidden, only the mesh they deform is shown
+    """
+    armature = bpy.data.armatures.new(name)
+    armature_object = bpy.data.objects.new(name, armature)
+    armature_object.parent = parent_empty
+    collection.objects.link(armature_object)
+
+    # bones can only be added in edit mode
+    bpy.context.view_layer.objects.active = armature_object
+    bpy.ops.object.mode_set(mode='EDIT')
+    for segment in segments:
+        edit_bone = armature.edit_bones.new(segment.bone_name)
+        edit_bone.head = (0, 0, 0)
+        edit_bone.tail = (0, 0, segment.length)
+    bpy.ops.object.mode_set(mode='OBJECT')
+
+    for bone in armature.bones:
+        bone.hide = True
+    return armature_object
+
+
+def animate_segment_armature(armature_object: bpy.types.Object,
+                             segments: List['RigidBodySegment'],
+                             parent_empty: Optional[bpy.types.Object],
+                             frames: np.ndarray) -> None:
+    """
+    Keyframe each segment's bone so it deforms the segment's rest mesh like the segment's constraints move its object:
+    to its head empty, turned (from the z axis) to point at its tail empty
+    """
+    empties = list({empty.name: empty
+                    for segment in segments
+                    for empty in [segment.head_empty, segment.tail_empty]}.values())
+    empty_index = {empty.name: index for index, empty in enumerate(empties)}
+
+    # the armature sits on the parent empty, so its space is the parent empty's
+    world_to_armature = np.linalg.inv(np.array(parent_empty.matrix_world)) if parent_empty is not None else np.eye(4)
+    locations = sample_object_world_locations(objects=empties, frames=frames)
+    locations = locations @ world_to_armature[:3, :3].T + world_to_armature[:3, 3]
+
+    frame_indices = np.arange(frames.shape[0])
+    for segment in segments:
+        heads = locations[:, empty_index[segment.head_empty.name], :]
+        tails = locations[:, empty_index[segment.tail_empty.name], :]
+
+        deform_matrices = np.tile(np.eye(4), (frames.shape[0], 1, 1))
+        deform_matrices = copy_location(deform_matrices, heads)
+        deform_matrices = damped_track(deform_matrices, tails, track_axis="TRACK_Z")
+
+        # hold the last pose over the frames without data (and the first one before them)
+        valid = np.isfinite(heads).all(axis=1) & np.isfinite(tails).all(axis=1)
+        if valid.any() and not valid.all():
+            source_frames = np.maximum.accumulate(np.where(valid, frame_indices, -1))
+            source_frames[source_frames < 0] = np.argmax(valid)
+            deform_matrices = deform_matrices[source_frames]
+
+        # a bone deforms by pose @ rest^-1, with pose = rest @ basis
+        rest_matrix = np.array(armature_object.data.bones[segment.bone_name].matrix_local)
+        basis_matrices = np.linalg.inv(rest_matrix) @ deform_matrices @ rest_matrix
+
+        pose_bone = armature_object.pose.bones[segment.bone_name]
+        pose_bone.rotation_mode = 'QUATERNION'
+        keyframe_property_in_bulk(owner=pose_bone,
+                                  property_name="rotation_quaternion",
+                                  values=make_quaternions_continuous(matrices_to_quaternions(basis_matrices)),
+                                  frames=frames)
+        keyframe_property_in_bulk(owner=pose_bone,
+                                  property_name="location",
+                                  values=basis_matrices[:, :3, 3],
+                                  frames=frames)
+
+
+def create_segment_mesh(segments: List['RigidBodySegment'], name: str) -> Tuple[bpy.types.Mesh, List[range]]:
+    """
+    The bone meshes of all the segments in one mesh, each one scaled to its segment's length at the origin (like the
+    per-segment objects' scale does), with their materials. Also returns the range of each segment's vertices
+    """
+    vertices = []
+    vertex_ranges = []
+    faces = []
+    face_material_indices = []
+    face_smooth = []
+    materials = []
+    vertex_offset = 0
+    for segment in segments:
+        template_mesh = get_bone_mesh_template(joint_color=segment.color,
+                                               cone_color=segment.color,
+                                               squish_scale=segment.squish_scale)
+
+        coordinates = np.empty(len(template_mesh.vertices) * 3, dtype=np.float32)
+        template_mesh.vertices.foreach_get("co", coordinates)
+        vertices.append(coordinates.reshape(-1, 3) * segment.length)
+
+        material_indices = []
+        for material in template_mesh.materials:
+            if material not in materials:
+                materials.append(material)
+            material_indices.append(materials.index(material))
+
+        for polygon in template_mesh.polygons:
+            faces.append([vertex_offset + vertex_index for vertex_index in polygon.vertices])
+            face_material_indices.append(material_indices[polygon.material_index])
+            face_smooth.append(polygon.use_smooth)
+        vertex_ranges.append(range(vertex_offset, vertex_offset + len(template_mesh.vertices)))
+        vertex_offset += len(template_mesh.vertices)
+
+    mesh = bpy.data.meshes.new(name)
+    mesh.from_pydata(np.concatenate(vertices).tolist() if vertices else [], [], faces)
+    for material in materials:
+        mesh.materials.append(material)
+    mesh.polygons.foreach_set("material_index", np.array(face_material_indices, dtype=np.int32))
+    mesh.polygons.foreach_set("use_smooth", np.array(face_smooth, dtype=bool))
+    mesh.update()
+    return mesh, vertex_ranges
+
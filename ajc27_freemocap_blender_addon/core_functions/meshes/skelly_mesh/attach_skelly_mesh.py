@@ -20,9 +20,11 @@ from ajc27_freemocap_blender_addon.data_models.armatures.bone_name_map import (
 from ajc27_freemocap_blender_addon.data_models.meshes.skelly_bones import (
     get_skelly_bones,
 )
+from ajc27_freemocap_blender_addon.core_functions.meshes.skelly_mesh.skelly_mesh_library import (
+    get_skelly_part_meshes,
+)
 
 SKELLY_MESH_PATH = str(Path(PACKAGE_ROOT_PATH) / "assets" / "skelly_lowpoly_mesh.fbx")
-SKELLY_BONES_PATH = str(Path(PACKAGE_ROOT_PATH) / "assets" / "skelly_bones")
 
 class AddSkellyMeshMethods(Enum):
     BY_BONE_MESH = "by_bone_mesh"
@@ -101,25 +103,20 @@ def attach_skelly_by_bone_mesh(
     # Define the list that will contain the different Skelly meshes
     skelly_meshes = []
 
+    # Get the template mesh of every part (loaded once per session from the skelly bones library)
+    part_meshes = get_skelly_part_meshes(part_names=list(skelly_bones.keys()))
+
     # Iterate through the skelly bones dictionary and add the corresponding skelly mesh
     for mesh in skelly_bones:
-        # print("Adding Skelly_" + mesh + " mesh...")
-        try:
-            # Import the skelly mesh
-            mesh_path = SKELLY_BONES_PATH + '/Skelly_' + mesh + '.fbx'
-            if not Path(mesh_path).is_file():
-                raise FileNotFoundError(f"Could not find skelly mesh at {mesh_path}")
-            bpy.ops.import_scene.fbx(filepath=str(mesh_path))
-
-        except Exception as e:
-            print(f"Error while importing skelly mesh: {e}")
-            print(traceback.format_exc())
+        if mesh not in part_meshes:
+            print(f"missing skelly mesh for: {mesh}, excluding it from final mesh")
             continue
 
-        skelly_meshes.append(bpy.data.objects['Skelly_' + mesh])
+        # Add the Skelly part as a copy of its template mesh
+        skelly_mesh = bpy.data.objects.new('Skelly_' + mesh, part_meshes[mesh].copy())
+        bpy.context.collection.objects.link(skelly_mesh)
 
-        # Get reference to the imported mesh
-        skelly_mesh = bpy.data.objects['Skelly_' + mesh]
+        skelly_meshes.append(skelly_mesh)
 
         # Get the rotation matrix
         if mesh == 'head':
@@ -163,8 +160,9 @@ def attach_skelly_by_bone_mesh(
             # Get new bone vector after applying the position offset
             new_bone_vector = skelly_bones[mesh].bones_end - part_location
             
-            # Apply the rotations to the Skelly part
-            bpy.ops.object.transform_apply(location=False, rotation=True, scale=False)
+            # Apply the rotations to the Skelly part (the scale is uniform, so it commutes with the rotation)
+            skelly_mesh.data.transform(skelly_mesh.rotation_euler.to_matrix().to_4x4())
+            skelly_mesh.rotation_euler = (0, 0, 0)
 
             # Get the angle between the two vectors
             rotation_quaternion = bone_vector.rotation_difference(new_bone_vector)
@@ -174,11 +172,14 @@ def attach_skelly_by_bone_mesh(
             skelly_mesh.rotation_quaternion = rotation_quaternion
 
         # Apply the transformations to the Skelly part
-        bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
+        skelly_mesh.data.transform(skelly_mesh.matrix_basis)
+        skelly_mesh.matrix_basis = Matrix.Identity(4)
  
-    # Set material 'Base' as material 0 for all skelly bone meshes
-    for skelly_mesh in skelly_meshes:
-        skelly_mesh.data.materials[0] = bpy.data.materials['Bone']
+    # Set material 'Bone' as material 0 for all skelly bone meshes
+    bone_material = bpy.data.materials.get('Bone')
+    if bone_material is not None:
+        for skelly_mesh in skelly_meshes:
+            skelly_mesh.data.materials[0] = bone_material
 
     # Rename the first mesh to skelly_mesh
     skelly_meshes[0].name = "skelly_mesh"
@@ -0,0 +1,125 @@
+import traceback
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import bpy
+
+from ajc27_freemocap_blender_addon import PACKAGE_ROOT_PATH
+
+SKELLY_BONES_PATH = str(Path(PACKAGE_ROOT_PATH) / "assets" / "skelly_bones")
+SKELLY_BONES_LIBRARY_PATH = str(Path(PACKAGE_ROOT_PATH) / "assets" / "skelly_bones.blend")
+
+# mesh names of the parts in the library file, and of the (in-session) template meshes in bpy.data
+SKELLY_PART_PREFIX = "Skelly_"
+SKELLY_PART_TEMPLATE_PREFIX = "skelly_part_template_"
+
+
+def get_skelly_part_meshes(part_names: Iterable[str],
+                           library_path: str = SKELLY_BONES_LIBRARY_PATH,
+                           fbx_directory: str = SKELLY_BONES_PATH) -> Dict[str, bpy.types.Mesh]:
+    """
+    Get the template mesh of each skelly part, to be copied (not modified) by the caller.
+
+    The templates have a fake user, so they stay in bpy.data for the rest of the session (and in saved files) even when
+    no object uses them, and rebuilding a scene reuses them. The parts that are
+    not loaded yet are appended from the `.blend` library in one `bpy.data.libraries.load` call, parts missing from the
+    library (or all of them, if it has not been built) are imported from their FBX files. Parts that can not be found
+    are left out of the returned dictionary.
+    """
+    part_meshes = {}
+    missing_parts = []
+    for part_name in part_names:
+        template_mesh = bpy.data.meshes.get(SKELLY_PART_TEMPLATE_PREFIX + part_name)
+        if template_mesh is not None:
+            part_meshes[part_name] = template_mesh
+        else:
+            missing_parts.append(part_name)
+
+    if missing_parts and Path(library_path).is_file():
+        part_meshes.update(append_part_meshes_from_library(part_names=missing_parts, library_path=library_path))
+        missing_parts = [part_name for part_name in missing_parts if part_name not in part_meshes]
+
+    for part_name in missing_parts:
+        try:
+            template_mesh = import_part_mesh_from_fbx(
+                fbx_path=str(Path(fbx_directory) / f"{SKELLY_PART_PREFIX}{part_name}.fbx"))
+        except Exception as e:
+            print(f"Error while importing skelly mesh: {e}")
+            print(traceback.format_exc())
+            continue
+        template_mesh.name = SKELLY_PART_TEMPLATE_PREFIX + part_name
+        template_mesh.use_fake_user = True
+        part_meshes[part_name] = template_mesh
+
+    return part_meshes
+
+
+def append_part_meshes_from_library(part_names: List[str],
+                                    library_path: str = SKELLY_BONES_LIBRARY_PATH) -> Dict[str, bpy.types.Mesh]:
+    """
+    Append the meshes of the given parts (and their materials) from the library file, in one load
+    """
+    with bpy.data.libraries.load(library_path, link=False) as (data_from, data_to):
+        available_meshes = set(data_from.meshes)
+        library_parts = [part_name for part_name in part_names
+                         if SKELLY_PART_PREFIX + part_name in available_meshes]
+        data_to.meshes = [SKELLY_PART_PREFIX + part_name for part_name in library_parts]
+
+    part_meshes = {}
+    for part_name, mesh in zip(library_parts, data_to.meshes):
+        if mesh is None:
+            continue
+        mesh.name = SKELLY_PART_TEMPLATE_PREFIX + part_name
+        mesh.use_fake_user = True
+        part_meshes[part_name] = mesh
+
+    print(f"Loaded {len(part_meshes)} skelly part meshes from {library_path}")
+    return part_meshes
+
+
+def import_part_mesh_from_fbx(fbx_path: str) -> bpy.types.Mesh:
+    """
+    Import a skelly part FBX file and keep only its mesh data (the imported objects are removed)
+    """
+    if not Path(fbx_path).is_file():
+        raise FileNotFoundError(f"Could not find skelly mesh at {fbx_path}")
+
+    existing_object_names = set(bpy.data.objects.keys())
+    bpy.ops.import_scene.fbx(filepath=fbx_path)
+    imported_objects = [bpy_object for bpy_object in bpy.data.objects if bpy_object.name not in existing_object_names]
+
+    part_meshes = [bpy_object.data for bpy_object in imported_objects if bpy_object.type == 'MESH']
+    for bpy_object in imported_objects:
+        bpy.data.objects.remove(bpy_object, do_unlink=True)
+
+    if not part_meshes:
+        raise ValueError(f"No mesh found in {fbx_path}")
+    return part_meshes[0]
+
+
+def build_skelly_bones_library(fbx_directory: str = SKELLY_BONES_PATH,
+                               library_path: str = SKELLY_BONES_LIBRARY_PATH) -> None:
+    """
+    Build step: pack the mesh of every `Skelly_<part>.fbx` in `fbx_directory` (and its materials) into one `.blend`
+    library file, so scenes load all the parts at once instead of importing an FBX file per part.
+
+    The library is not committed, the release workflow (`.github/workflows/flit_publish_to_pypi.yml`)
+    builds it before packaging with
+    `blender --background --python-use-system-env --python core_functions/meshes/skelly_mesh/skelly_mesh_library.py`
+    and the repository root on `PYTHONPATH`. Without it the parts are imported from their FBX files.
+    """
+    part_meshes = set()
+    for fbx_path in sorted(Path(fbx_directory).glob(f"{SKELLY_PART_PREFIX}*.fbx")):
+        mesh = import_part_mesh_from_fbx(fbx_path=str(fbx_path))
+        mesh.name = fbx_path.stem
+        part_meshes.add(mesh)
+
+    bpy.data.libraries.write(library_path, part_meshes, fake_user=True, compress=True)
+    print(f"Wrote {len(part_meshes)} skelly part meshes to {library_path}")
+
+    for mesh in part_meshes:
+        bpy.data.meshes.remove(mesh)
+
+
+if __name__ == "__main__" or __name__ == "<run_path>":
+    build_skelly_bones_library()
@@ -2,14 +2,18 @@ from copy import deepcopy
 from dataclasses import dataclass, field
 from typing import Dict
 
+import numpy as np
+
 
 @dataclass
 class BoneDefinition:
     head: str
     tail: str
-    lengths: list = field(default_factory=list)
+    lengths: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float32))
     median: float = 0.0
     stdev: float = 0.0
+    median_absolute_deviation: float = 0.0
+    percentiles: Dict[float, float] = field(default_factory=dict)
 
 
 _BONE_DEFINITIONS: Dict[str, BoneDefinition] = {
@@ -63,11 +67,11 @@ _BONE_DEFINITIONS: Dict[str, BoneDefinition] = {
     ),
     'hand.R': BoneDefinition(
         head='right_wrist',
-        tail='right_index',
+        tail='right_hand_middle',
     ),
     'hand.L': BoneDefinition(
         head='left_wrist',
-        tail='left_index',
+        tail='left_hand_middle',
     ),
     'thumb.carpal.R': BoneDefinition(
         head='right_hand_wrist',
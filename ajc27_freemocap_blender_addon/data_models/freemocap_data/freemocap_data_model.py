@@ -1,16 +1,17 @@
 from dataclasses import dataclass, field
-from typing import Any, Dict, Optional, Union, Literal
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union, Literal
 
 import numpy as np
 from ajc27_freemocap_blender_addon.core_functions.setup_scene.get_path_to_sample_data import get_path_to_sample_data
 
-from .helpers.freemocap_component_data import FreemocapComponentData
+from .helpers.freemocap_component_data import FreemocapComponentData, LazyFreemocapComponentData
 from .helpers.freemocap_data_paths import FreemocapDataPaths
 from .helpers.freemocap_data_stats import FreemocapDataStats
 from ..mediapipe_names.mediapipe_trajectory_names import MediapipeTrajectoryNames, \
     HumanTrajectoryNames
 
 FREEMOCAP_DATA_COMPONENT_TYPES = Literal["body", "right_hand", "left_hand", "face", "other"]
+OPTIONAL_COMPONENT_NAMES = ["right_hand", "left_hand", "face", "center_of_mass"]
 
 
 @dataclass
@@ -161,24 +162,78 @@ class FreemocapData:
     def from_data_paths(cls,
                         data_paths: FreemocapDataPaths,
                         scale: float = 1000,
+                        lazy: bool = False,
+                        components: Optional[Sequence[str]] = None,
+                        frame_range: Optional[Tuple[int, int]] = None,
                         **kwargs):
+        """
+        Load the data from the `.npy` files in `data_paths`. The files are memory-mapped, so only the parts that are
+        used get read from disk.
+
+        :param lazy: if True, defer reading (and scaling) each component until its `data` is first accessed. A
+                     `FreemocapDataHandler` reads every component when it is created, so this only helps callers
+                     that use the `FreemocapData` on its own
+        :param components: allow-list of components to load (any of `OPTIONAL_COMPONENT_NAMES`), e.g. skip the face.
+                           Components that are left out are empty (no trajectories). `body` is always loaded.
+        :param frame_range: (start, stop) window of frames to load, defaults to all frames
+        """
         if "metadata" in kwargs.keys():
             metadata = kwargs["metadata"]
         else:
             metadata = {}
 
-        return cls.from_data(
-            body_frame_name_xyz=np.load(data_paths.body_npy) / scale,
-            right_hand_frame_name_xyz=np.load(data_paths.right_hand_npy) / scale,
-            left_hand_frame_name_xyz=np.load(data_paths.left_hand_npy) / scale,
-            face_frame_name_xyz=np.load(data_paths.face_npy) / scale,
-            error=np.load(data_paths.reprojection_error_npy),
-
-            other={"center_of_mass": FreemocapComponentData(name="center_of_mass",
-                                                            data=np.load(
-                                                                data_paths.center_of_mass_npy) / scale,
-                                                            data_source="freemocap",
-                                                            trajectory_names=["center_of_mass"])},
+        if components is None:
+            components = OPTIONAL_COMPONENT_NAMES
+        unknown_components = set(components) - set(OPTIONAL_COMPONENT_NAMES) - {"body"}
+        if unknown_components:
+            raise ValueError(
+                f"Unknown components {unknown_components} - choose from {['body', *OPTIONAL_COMPONENT_NAMES]}")
+
+        trajectory_names = MediapipeTrajectoryNames()
+        error = np.load(data_paths.reprojection_error_npy, mmap_mode="r")
+        if frame_range is not None:
+            error = error[frame_range[0]:frame_range[1]]
+        if not lazy:
+            error = np.array(error)
+        (body_error,
+         face_error,
+         left_hand_error,
+         right_hand_error) = cls._split_up_reprojection_error(error=error,
+                                                              trajectory_names=trajectory_names)
+
+        def load_component(component_name: str,
+                           npy_path: str,
+                           names: List[str],
+                           component_error: Optional[np.ndarray],
+                           data_source: str = "mediapipe") -> FreemocapComponentData:
+            component = LazyFreemocapComponentData(name=component_name,
+                                                   npy_path=npy_path,
+                                                   data_source=data_source,
+                                                   trajectory_names=names,
+                                                   scale=scale,
+                                                   frame_range=frame_range,
+                                                   error=component_error)
+            if component_name != "body" and component_name not in components:
+                number_of_frames = component.mapped_data.shape[0]
+                return FreemocapComponentData(name=component_name,
+                                              data=np.empty((number_of_frames, 0, 3)),
+                                              data_source=data_source,
+                                              trajectory_names=[],
+                                              error=np.empty((number_of_frames, 0)))
+            if not lazy:
+                component.data  # read and scale it now
+            return component
+
+        return cls(
+            body=load_component("body", data_paths.body_npy, trajectory_names.body, body_error),
+            hands={"right": load_component("right_hand", data_paths.right_hand_npy,
+                                           trajectory_names.right_hand, right_hand_error),
+                   "left": load_component("left_hand", data_paths.left_hand_npy,
+                                          trajectory_names.left_hand, left_hand_error)},
+            face=load_component("face", data_paths.face_npy, trajectory_names.face, face_error),
+            other={"center_of_mass": load_component("center_of_mass", data_paths.center_of_mass_npy,
+                                                    ["center_of_mass"], None, data_source="freemocap")}
+            if "center_of_mass" in components else {},
             metadata=metadata,
         )
 
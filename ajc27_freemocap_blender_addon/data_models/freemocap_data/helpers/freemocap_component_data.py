@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional, Tuple
 
 import numpy as np
 
@@ -21,14 +21,73 @@ class FreemocapComponentData:
         if isinstance(self.trajectory_names, str):
             self.trajectory_names = list(self.trajectory_names)
 
-        if self.data.ndim == 3:
+        self._validate_shape(self.data.shape)
+
+    def _validate_shape(self, shape: Tuple[int, ...]):
+        if len(shape) == 3:
             self.data_dimensions = ["frame", "marker", "xyz"]
-            if not self.data.shape[1] == len(self.trajectory_names):
+            if not shape[1] == len(self.trajectory_names):
                 raise ValueError(
-                    f"Data frame shape {self.data.shape} does not match trajectory names length {len(self.trajectory_names)}")
+                    f"Data frame shape {shape} does not match trajectory names length {len(self.trajectory_names)}")
 
-        elif self.data.ndim == 2:
+        elif len(shape) == 2:
             if not len(self.trajectory_names) == 1:
                 raise ValueError(
-                    f"Data frame shape {self.data.shape} does not match trajectory names length {len(self.trajectory_names)}")
+                    f"Data frame shape {shape} does not match trajectory names length {len(self.trajectory_names)}")
             self.data_dimensions = ["frame", "xyz"]
+
+
+class LazyFreemocapComponentData(FreemocapComponentData):
+    """
+    A `FreemocapComponentData` backed by a memory-mapped `.npy` file.
+
+    Only the `.npy` header is read on creation. The (optionally frame-windowed) data is read and divided by `scale`
+    the first time `data` is accessed, so components that are never touched (e.g. the face) never get loaded.
+    """
+
+    def __init__(self,
+                 name: str,
+                 npy_path: str,
+                 data_source: str,
+                 trajectory_names: List[str],
+                 scale: float = 1.0,
+                 frame_range: Optional[Tuple[int, int]] = None,
+                 error: np.ndarray = None,
+                 error_type: str = "mean_reprojection_error"):
+        self.name = name
+        self.data_source = data_source
+        self.trajectory_names = trajectory_names
+        self.data_dimensions = None
+        self.error = error
+        self.error_type = error_type
+        self.npy_path = npy_path
+        self.scale = scale
+        self.frame_range = frame_range
+        self._data = None
+
+        self._validate_shape(self.mapped_data.shape)
+
+    @property
+    def mapped_data(self) -> np.ndarray:
+        """
+        The raw (unscaled, read-only) memory-mapped data, limited to `frame_range`
+        """
+        mapped_data = np.load(self.npy_path, mmap_mode="r")
+        if self.frame_range is not None:
+            mapped_data = mapped_data[self.frame_range[0]:self.frame_range[1]]
+        return mapped_data
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._data is not None
+
+    @property
+    def data(self) -> np.ndarray:
+        if self._data is None:
+            print(f"Loading `{self.name}` data from {self.npy_path}")
+            self._data = np.divide(self.mapped_data, self.scale, dtype=np.float64)
+        return self._data
+
+    @data.setter
+    def data(self, value: np.ndarray):
+        self._data = value
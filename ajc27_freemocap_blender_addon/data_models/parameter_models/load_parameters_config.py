@@ -2,7 +2,8 @@ import json
 from typing import Optional
 
 from .parameter_models import \
-    Config, AdjustEmpties, ReduceShakiness, ReduceBoneLengthDispersion, AddRig, AddBodyMesh
+    Config, AdjustEmpties, ReduceShakiness, ReduceBoneLengthDispersion, AddRig, AddBodyMesh, ProcessedDataCacheConfig, \
+    ProcessingStages, VirtualMarkers
 
 
 # Define the data classes to represent the JSON structure
@@ -16,10 +17,13 @@ def load_default_parameters_config(filename: Optional[str] = None) -> Config:
         return Config(
             # recording_path=data['recording_path'],
             adjust_empties=AdjustEmpties(**data['adjust_empties']),
+            virtual_markers=VirtualMarkers(**data.get('virtual_markers', {})),
             reduce_bone_length_dispersion=ReduceBoneLengthDispersion(**data['reduce_bone_length_dispersion']),
             reduce_shakiness=ReduceShakiness(**data['reduce_shakiness']),
             add_rig=AddRig(**data['add_rig']),
-            add_body_mesh=AddBodyMesh(**data['add_body_mesh'])
+            add_body_mesh=AddBodyMesh(**data['add_body_mesh']),
+            processing_stages=ProcessingStages(**data.get('processing_stages', {})),
+            processed_data_cache=ProcessedDataCacheConfig(**data.get('processed_data_cache', {})),
         )
     else:
         return Config()
@@ -11,6 +11,12 @@ class AdjustEmpties:
     add_hand_middle_empty: bool = True
 
 
+@dataclass
+class VirtualMarkers:
+    # JSON or TOML file with extra virtual markers, added after the built-in ones (empty for none)
+    definitions_path: str = ""
+
+
 @dataclass
 class ReduceBoneLengthDispersion:
     interval_variable: str = "median"
@@ -19,7 +25,13 @@ class ReduceBoneLengthDispersion:
 
 @dataclass
 class ReduceShakiness:
+    # only used if the frame rate can't be read from the recording's timestamps
     recording_fps: float = 30.0
+    repair_spikes: bool = False
+    spike_threshold: float = 6.0
+    minimum_spike_acceleration: float = 10.0
+    spike_return_ratio: float = 0.5
+    low_pass_cutoff_frequency: float = 0.0
 
 
 @dataclass
@@ -28,17 +40,40 @@ class AddRig:
     keep_symmetry: bool = False
     add_fingers_constraints: bool = True
     use_limit_rotation: bool = False
+    save_bone_and_joint_data_csv: bool = False
+    bake_animation: bool = False
+    remove_unused_empties: bool = False
 
 
 @dataclass
 class AddBodyMesh:
     body_mesh_mode: str = "custom"
+    single_skinned_rigid_body_mesh: bool = False
+
+
+@dataclass
+class ProcessingStages:
+    # memory the handler's processing stage snapshots may use before older stages are evicted (0 for no limit)
+    memory_budget_megabytes: float = 0.0
+    # where evicted stages are spilled to (and memory-mapped back from), empty to drop them instead
+    spill_directory: str = ""
+
+
+@dataclass
+class ProcessedDataCacheConfig:
+    enabled: bool = False
+    hash_content: bool = False
+    # cached results kept per recording, older ones are deleted when a new one is saved
+    max_entries: int = 1
 
 
 @dataclass
 class Config:
     adjust_empties: AdjustEmpties = field(default_factory=AdjustEmpties)
+    virtual_markers: VirtualMarkers = field(default_factory=VirtualMarkers)
     reduce_bone_length_dispersion: ReduceBoneLengthDispersion = field(default_factory=ReduceBoneLengthDispersion)
     reduce_shakiness: ReduceShakiness = field(default_factory=ReduceShakiness)
     add_rig: AddRig = field(default_factory=AddRig)
     add_body_mesh: AddBodyMesh = field(default_factory=AddBodyMesh)
+    processing_stages: ProcessingStages = field(default_factory=ProcessingStages)
+    processed_data_cache: ProcessedDataCacheConfig = field(default_factory=ProcessedDataCacheConfig)
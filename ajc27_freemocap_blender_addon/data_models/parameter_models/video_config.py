@@ -5,6 +5,7 @@ EXPORT_PROFILES = {
     'debug': {
         'resolution_x': 1920,
         'resolution_y': 1080,
+        'framing_window_frames': None, # reframe (dolly) the cameras every n frames, None frames the whole recording
         'render_cameras': {
             'Front': {
                 'resolution_x': 1920,
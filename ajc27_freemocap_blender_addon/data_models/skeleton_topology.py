@@ -0,0 +1,166 @@
+from dataclasses import dataclass, field
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from ajc27_freemocap_blender_addon.data_models.bones.bone_definitions import BoneDefinition, get_bone_definitions
+from ajc27_freemocap_blender_addon.data_models.mediapipe_names.mediapipe_heirarchy import get_mediapipe_hierarchy
+from ajc27_freemocap_blender_addon.data_models.mediapipe_names.virtual_trajectories import \
+    get_media_pipe_virtual_trajectory_definition
+
+# data source name -> functions returning its (hierarchy, bone definitions, virtual marker definitions)
+_SKELETON_DEFINITIONS = {
+    "mediapipe": (get_mediapipe_hierarchy, get_bone_definitions, get_media_pipe_virtual_trajectory_definition),
+}
+
+
+@dataclass(frozen=True)
+class SkeletonTopology:
+    """
+    A skeleton's hierarchy, bones and virtual markers compiled into integer index arrays.
+
+    Markers are stored in depth-first order, so every parent comes before its children and the subtree of marker `i`
+    is the contiguous range `i:subtree_ends[i]`. The arrays are read-only and the topology of a data source is built
+    once (see `get_skeleton_topology`), so it can be shared by every operation instead of re-reading the definitions.
+    """
+    marker_names: Tuple[str, ...]
+    parent_indices: np.ndarray  # (marker,) index of each marker's parent, -1 for roots
+    depths: np.ndarray  # (marker,) number of ancestors of each marker
+    depth_levels: Tuple[np.ndarray, ...]  # marker indices at depth 0, 1, 2, ...
+    subtree_ends: np.ndarray  # (marker,) end of each marker's subtree range (exclusive)
+    bone_names: Tuple[str, ...]
+    bone_head_indices: np.ndarray  # (bone,)
+    bone_tail_indices: np.ndarray  # (bone,)
+    virtual_marker_names: Tuple[str, ...]  # their weights are compiled by `calculate_virtual_marker_weights`
+    name_to_index: Mapping[str, int] = field(repr=False, compare=False)
+    bone_to_index: Mapping[Tuple[str, str], int] = field(repr=False, compare=False)
+
+    @classmethod
+    def compile(cls,
+                hierarchy: Dict[str, Dict[str, List[str]]],
+                bone_definitions: Optional[Dict[str, BoneDefinition]] = None,
+                virtual_marker_definitions: Optional[Dict[str, Dict[str, list]]] = None,
+                extra_names: Iterable[str] = ()) -> 'SkeletonTopology':
+        """
+        Compile a `{name: {'children': [...]}}` hierarchy, `{bone_name: BoneDefinition}` bones and
+        `{name: {'marker_names': [...], 'marker_weights': [...]}}` virtual markers. Markers that are only referenced by
+        bones, virtual markers or `extra_names` are added as roots.
+        """
+        bone_definitions = bone_definitions or {}
+        virtual_marker_definitions = virtual_marker_definitions or {}
+
+        parents = {}
+        for parent_name, parent_info in hierarchy.items():
+            for child_name in parent_info['children']:
+                if child_name in parents:
+                    raise ValueError(f"Trajectory `{child_name}` has more than one parent in the hierarchy.")
+                parents[child_name] = parent_name
+
+        referenced_names = list(hierarchy.keys()) + list(parents.keys())
+        for bone in bone_definitions.values():
+            referenced_names += [bone.head, bone.tail]
+        for virtual_marker_name, definition in virtual_marker_definitions.items():
+            referenced_names += [virtual_marker_name] + list(definition['marker_names'])
+        all_names = list(dict.fromkeys(referenced_names + list(extra_names)))
+
+        # depth-first, so each subtree is a contiguous range
+        marker_names = []
+        depths = []
+        stack = [(name, 0) for name in reversed(all_names) if name not in parents]
+        while stack:
+            name, depth = stack.pop()
+            marker_names.append(name)
+            depths.append(depth)
+            stack.extend((child_name, depth + 1) for child_name in reversed(hierarchy.get(name, {}).get('children', [])))
+
+        if len(marker_names) != len(all_names):
+            raise ValueError("Hierarchy contains a cycle - could not order trajectories from parents to children.")
+
+        name_to_index = {name: index for index, name in enumerate(marker_names)}
+        parent_indices = np.array([name_to_index[parents[name]] if name in parents else -1 for name in marker_names],
+                                  dtype=np.int64)
+        depths = np.array(depths, dtype=np.int64)
+
+        subtree_ends = np.arange(1, len(marker_names) + 1, dtype=np.int64)
+        for index in reversed(range(len(marker_names))):
+            if parent_indices[index] >= 0:
+                subtree_ends[parent_indices[index]] = max(subtree_ends[parent_indices[index]], subtree_ends[index])
+
+        depth_levels = tuple(np.flatnonzero(depths == depth) for depth in range(int(depths.max(initial=-1)) + 1))
+
+        bone_names = tuple(bone_definitions.keys())
+        bone_head_indices = np.array([name_to_index[bone.head] for bone in bone_definitions.values()], dtype=np.int64)
+        bone_tail_indices = np.array([name_to_index[bone.tail] for bone in bone_definitions.values()], dtype=np.int64)
+
+        arrays = [parent_indices, depths, subtree_ends, bone_head_indices, bone_tail_indices, *depth_levels]
+        for array in arrays:
+            array.flags.writeable = False
+
+        return cls(marker_names=tuple(marker_names),
+                   parent_indices=parent_indices,
+                   depths=depths,
+                   depth_levels=depth_levels,
+                   subtree_ends=subtree_ends,
+                   bone_names=bone_names,
+                   bone_head_indices=bone_head_indices,
+                   bone_tail_indices=bone_tail_indices,
+                   virtual_marker_names=tuple(virtual_marker_definitions.keys()),
+                   name_to_index=MappingProxyType(name_to_index),
+                   bone_to_index=MappingProxyType({(bone.head, bone.tail): index
+                                                   for index, bone in enumerate(bone_definitions.values())}),
+                   )
+
+    @property
+    def number_of_markers(self) -> int:
+        return len(self.marker_names)
+
+    def indices(self, names: Iterable[str]) -> np.ndarray:
+        return np.array([self.name_to_index[name] for name in names], dtype=np.int64)
+
+    def children_indices(self, name: str) -> np.ndarray:
+        return np.flatnonzero(self.parent_indices == self.name_to_index[name])
+
+    def subtree_indices(self, name: str, include_root: bool = True) -> np.ndarray:
+        index = self.name_to_index[name]
+        return np.arange(index if include_root else index + 1, self.subtree_ends[index])
+
+    def subtree_names(self, name: str, include_root: bool = True) -> List[str]:
+        return [self.marker_names[index] for index in self.subtree_indices(name, include_root=include_root)]
+
+    def bone_indices(self, bone_names: Iterable[str]) -> np.ndarray:
+        return np.array([self.bone_names.index(bone_name) for bone_name in bone_names], dtype=np.int64)
+
+    def bone_index(self, head: str, tail: str) -> Optional[int]:
+        return self.bone_to_index.get((head, tail))
+
+    def stack_trajectories(self, trajectories: Mapping[str, np.ndarray]) -> np.ndarray:
+        """
+        (frame, marker, xyz) array of the trajectories in marker order. Every marker must be in `trajectories`
+        """
+        return np.stack([trajectories[name] for name in self.marker_names], axis=1)
+
+    def propagate_to_children(self, frame_marker_delta: np.ndarray) -> np.ndarray:
+        """
+        Accumulate per-marker (frame, marker, xyz) deltas down the hierarchy, so each marker is moved by its own delta
+        plus the deltas of all of its ancestors. Each depth level is added in one vectorized step.
+        """
+        accumulated_delta = np.array(frame_marker_delta, copy=True)
+        for level in self.depth_levels[1:]:
+            accumulated_delta[:, level, :] += accumulated_delta[:, self.parent_indices[level], :]
+        return accumulated_delta
+
+
+@lru_cache(maxsize=None)
+def get_skeleton_topology(data_source: str = "mediapipe") -> SkeletonTopology:
+    """
+    The (cached) compiled topology of a data source's skeleton
+    """
+    if data_source not in _SKELETON_DEFINITIONS:
+        raise ValueError(f"No skeleton definitions for data source `{data_source}`, "
+                         f"available: {list(_SKELETON_DEFINITIONS.keys())}")
+    get_hierarchy, get_bones, get_virtual_markers = _SKELETON_DEFINITIONS[data_source]
+    return SkeletonTopology.compile(hierarchy=get_hierarchy(),
+                                    bone_definitions=get_bones(),
+                                    virtual_marker_definitions=get_virtual_markers())
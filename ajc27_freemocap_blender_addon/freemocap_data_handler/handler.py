@@ -1,5 +1,4 @@
-from copy import deepcopy
-from typing import List, Optional, Union, Dict, Any
+from typing import List, Optional, Tuple, Union, Dict, Any
 
 import numpy as np
 from ajc27_freemocap_blender_addon.core_functions.empties.creation.create_virtual_trajectories import \
@@ -8,18 +7,27 @@ from ajc27_freemocap_blender_addon.data_models.freemocap_data.freemocap_data_mod
     FREEMOCAP_DATA_COMPONENT_TYPES
 from ajc27_freemocap_blender_addon.data_models.freemocap_data.helpers.freemocap_component_data import \
     FreemocapComponentData
+from ajc27_freemocap_blender_addon.data_models.mediapipe_names.mediapipe_biomechanics import joints_angle_points \
+    as default_joints_angle_points
 
+from .operations.calculate_joint_angles import calculate_joint_angles
 from .operations.estimate_good_frame import estimate_good_frame
 from ..freemocap_data_handler.helpers.saver import FreemocapDataSaver
+from ..freemocap_data_handler.helpers.stage_store import ProcessingStageStore
+from ..freemocap_data_handler.helpers.trajectory_arena import TrajectoryArena
 from ..freemocap_data_handler.helpers.transformer import FreemocapDataTransformer
 
 
 class FreemocapDataHandler:
     def __init__(self,
-                 freemocap_data: FreemocapData):
+                 freemocap_data: FreemocapData,
+                 stage_memory_budget_bytes: Optional[int] = None,
+                 stage_spill_directory: Optional[str] = None):
 
         self.freemocap_data = freemocap_data
-        self._intermediate_stages = None
+        self._arena = TrajectoryArena(freemocap_data=freemocap_data)
+        self._intermediate_stages = ProcessingStageStore(memory_budget_bytes=stage_memory_budget_bytes,
+                                                         spill_directory=stage_spill_directory)
         self._transformer = FreemocapDataTransformer(handler=self)
         self._saver = FreemocapDataSaver(handler=self)
         self.mark_processing_stage(name="original_from_file")
@@ -27,9 +35,19 @@ class FreemocapDataHandler:
     @classmethod
     def from_recording_path(cls,
                             recording_path: str,
+                            components: Optional[List[str]] = None,
+                            frame_range: Optional[Tuple[int, int]] = None,
+                            **kwargs
                             ) -> "FreemocapDataHandler":
-        freemocap_data = FreemocapData.from_recording_path(recording_path=recording_path)
-        return cls(freemocap_data=freemocap_data)
+        """
+        Load a recording into a new handler. The handler keeps every loaded component in its trajectory arena, so the
+        data is always read in full - leave components out with `components` (or load a `frame_range`) to read less.
+        For lazy loading, use `FreemocapData.from_recording_path(lazy=True)` directly.
+        """
+        freemocap_data = FreemocapData.from_recording_path(recording_path=recording_path,
+                                                           components=components,
+                                                           frame_range=frame_range)
+        return cls(freemocap_data=freemocap_data, **kwargs)
 
     @property
     def metadata(self) -> Optional[Dict[Any, Any]]:
@@ -37,13 +55,8 @@ class FreemocapDataHandler:
 
     @property
     def trajectories(self) -> Dict[str, np.ndarray]:
-        trajectories = {}
-        trajectories.update(self.body_trajectories)
-        trajectories.update(self.right_hand_trajectories)
-        trajectories.update(self.left_hand_trajectories)
-        trajectories.update(self.face_trajectories)
-        trajectories.update(self.other_trajectories)
-        return trajectories
+        # the values are views into the data, the dict itself is a copy so callers can't corrupt the arena's cache
+        return dict(self._arena.trajectories())
 
     @property
     def center_of_mass_trajectory(self) -> np.ndarray:
@@ -79,26 +92,7 @@ class FreemocapDataHandler:
 
     @property
     def all_frame_name_xyz(self):
-        all_data = np.concatenate([self.body_frame_name_xyz,
-                                   self.right_hand_frame_name_xyz,
-                                   self.left_hand_frame_name_xyz,
-                                   self.face_frame_name_xyz], axis=1)
-
-        for other_component in self.freemocap_data.other.values():
-            if len(other_component.data.shape) == 2:
-                other_component.data = np.expand_dims(other_component.data, axis=1)
-            all_data = np.concatenate([all_data, other_component.data], axis=1)
-
-        if all_data.shape[0] != self.number_of_frames:
-            raise ValueError(
-                f"Number of frames ({self.number_of_frames}) does not match number of frames in all_frame_name_xyz ({all_data.shape[0]}).")
-        if all_data.shape[1] != self.number_of_trajectories:
-            raise ValueError(
-                f"Number of trajectories ({self.number_of_trajectories}) does not match number of trajectories in all_frame_name_xyz ({all_data.shape[1]}).")
-        if all_data.shape[2] != 3:
-            raise ValueError(f"all_frame_name_xyz should have 3 dimensions. Got {all_data.shape[2]} instead.")
-
-        return all_data
+        return self._arena.all_frame_name_xyz()
 
     @property
     def body_frame_name_xyz(self):
@@ -109,7 +103,7 @@ class FreemocapDataHandler:
         if value.shape != self.body_frame_name_xyz.shape:
             raise ValueError(
                 f"Shape of new body data ({value.shape}) does not match shape of old body data ({self.body_frame_name_xyz.shape}).")
-        self.freemocap_data.body.data = value
+        self._arena.write_component("body", value)
 
     @property
     def right_hand_frame_name_xyz(self):
@@ -120,7 +114,7 @@ class FreemocapDataHandler:
         if value.shape != self.right_hand_frame_name_xyz.shape:
             raise ValueError(
                 f"Shape of new right hand data ({value.shape}) does not match shape of old right hand data ({self.right_hand_frame_name_xyz.shape}).")
-        self.freemocap_data.hands["right"].data = value
+        self._arena.write_component("right_hand", value)
 
     @property
     def left_hand_frame_name_xyz(self):
@@ -131,7 +125,7 @@ class FreemocapDataHandler:
         if value.shape != self.left_hand_frame_name_xyz.shape:
             raise ValueError(
                 f"Shape of new left hand data ({value.shape}) does not match shape of old left hand data ({self.left_hand_frame_name_xyz.shape}).")
-        self.freemocap_data.hands["left"].data = value
+        self._arena.write_component("left_hand", value)
 
     @property
     def face_frame_name_xyz(self):
@@ -142,7 +136,7 @@ class FreemocapDataHandler:
         if value.shape != self.face_frame_name_xyz.shape:
             raise ValueError(
                 f"Shape of new face data ({value.shape}) does not match shape of old face data ({self.face_frame_name_xyz.shape}).")
-        self.freemocap_data.face.data = value
+        self._arena.write_component("face", value)
 
     @property
     def body_names(self):
@@ -162,9 +156,7 @@ class FreemocapDataHandler:
 
     @property
     def number_of_frames(self) -> int:
-        frame_counts = self._collect_frame_counts()
-        self._validate_frame_counts(frame_counts)
-        return frame_counts['body']
+        return self._arena.number_of_frames
 
     @property
     def number_of_body_trajectories(self):
@@ -191,7 +183,7 @@ class FreemocapDataHandler:
 
     @property
     def number_of_other_trajectories(self):
-        return sum([other_component.data.shape[1] for other_component in self.freemocap_data.other.values()])
+        return sum([len(other_component.trajectory_names) for other_component in self.freemocap_data.other.values()])
 
     @property
     def number_of_trajectories(self):
@@ -212,6 +204,15 @@ class FreemocapDataHandler:
     def estimate_good_clean_frame(self):
         return estimate_good_frame(trajectories_with_error=self.get_trajectories(with_error=True))
 
+    def calculate_joint_angles(self,
+                               joints_angle_points: Optional[Dict[str, Dict[str, str]]] = None
+                               ) -> Dict[str, np.ndarray]:
+        """
+        Calculate the joint angles (flexion and angle plane orientation) on every frame, see `calculate_joint_angles`
+        """
+        return calculate_joint_angles(trajectories=self.trajectories,
+                                      joints_angle_points=joints_angle_points or default_joints_angle_points)
+
 
     def add_trajectory(self,
                        trajectory: np.ndarray,
@@ -219,42 +220,10 @@ class FreemocapDataHandler:
                        component_type: FREEMOCAP_DATA_COMPONENT_TYPES,
                        source: str = None, # TODO: remove this from the chain if it isn't used anywhere
                        group_name: str = None):
-        if trajectory.shape[0] != self.number_of_frames:
-            raise ValueError(
-                f"Number of frames ({trajectory.shape[0]}) does not match number of frames in existing data ({self.number_of_frames}).")
-
-        if len(trajectory.shape) == 2:
-            num_dimensions = trajectory.shape[1]
-            trajectory = np.expand_dims(trajectory,
-                                        axis=1)  # add a dummy "name" dimenstion to trajectory so it can be concatenated with other trajectories
-        if len(trajectory.shape) == 3:
-            num_dimensions = trajectory.shape[2]
-
-            if num_dimensions != 3:
-                raise ValueError(
-                    f"Trajectory data should have 3 dimensions. Got {trajectory.shape[2]} instead.")
-
-        if component_type == "body":
-            self.freemocap_data.body.data = np.concatenate([self.body_frame_name_xyz, trajectory], axis=1)
-            self.freemocap_data.body.trajectory_names.append(trajectory_name)
-        elif component_type == "right_hand":
-            self.freemocap_data.hands["right"].data = np.concatenate([self.right_hand_frame_name_xyz, trajectory],
-                                                                     axis=1)
-            self.freemocap_data.hands["right"].trajectory_names.append(trajectory_name)
-        elif component_type == "left_hand":
-            self.freemocap_data.hands["left"].data = np.concatenate([self.left_hand_frame_name_xyz, trajectory], axis=1)
-            self.freemocap_data.hands["left"].trajectory_names.append(trajectory_name)
-        elif component_type == "face":
-            self.freemocap_data.face.data = np.concatenate([self.face_frame_name_xyz, trajectory], axis=1)
-            self.freemocap_data.face.trajectory_names.append(trajectory_name)
-        elif component_type == "other":
-            for other_component in self.freemocap_data.other.values():
-                if other_component.name == group_name:
-                    other_component.data = np.concatenate([other_component.data, trajectory], axis=1)
-                    other_component.trajectory_names.append(trajectory_name)
-        else:
-            raise ValueError(
-                f"Component type {component_type} not recognized.")
+        self.add_trajectories(trajectories={trajectory_name: trajectory},
+                              component_type=component_type,
+                              source=source,
+                              group_name=group_name)
 
     def add_trajectories(self,
                          trajectories: Dict[str, np.ndarray],
@@ -265,16 +234,64 @@ class FreemocapDataHandler:
         if not isinstance(component_type, list):
             component_types = [component_type] * len(trajectories)
         else:
-            component_types = [component_type]
+            component_types = component_type
 
-        for trajectory_number, trajectory_dict in enumerate(trajectories.items()):
-            trajectory_name, trajectory = trajectory_dict
+        if len(component_types) != len(trajectories):
+            raise ValueError(
+                f"Number of component types ({len(component_types)}) does not match number of trajectories ({len(trajectories)}).")
+
+        # group the new trajectories by destination so each component is grown at most once
+        new_trajectories_by_component = {}
+        for (trajectory_name, trajectory), trajectory_component_type in zip(trajectories.items(), component_types):
+            component_name = self._component_name_from_type(component_type=trajectory_component_type,
+                                                            group_name=group_name)
+            new_trajectories_by_component.setdefault(component_name, ([], []))
+            new_trajectories_by_component[component_name][0].append(self._validate_new_trajectory(trajectory))
+            new_trajectories_by_component[component_name][1].append(trajectory_name)
+
+        for component_name, (new_trajectories, new_names) in new_trajectories_by_component.items():
+            self._arena.append(component_name=component_name,
+                               trajectories_frame_name_xyz=np.concatenate(new_trajectories, axis=1),
+                               trajectory_names=new_names)
+
+    def append_trajectories(self,
+                            frame_name_xyz: np.ndarray,
+                            trajectory_names: List[str],
+                            component_type: FREEMOCAP_DATA_COMPONENT_TYPES,
+                            group_name: str = None):
+        """
+        Append a (frame, name, xyz) block of trajectories to a component in one go, without splitting it per trajectory
+        """
+        frame_name_xyz = self._validate_new_trajectory(frame_name_xyz)
+        self._arena.append(component_name=self._component_name_from_type(component_type=component_type,
+                                                                         group_name=group_name),
+                           trajectories_frame_name_xyz=frame_name_xyz,
+                           trajectory_names=list(trajectory_names))
+
+    def _component_name_from_type(self,
+                                  component_type: FREEMOCAP_DATA_COMPONENT_TYPES,
+                                  group_name: Optional[str] = None) -> str:
+        if component_type in ["body", "right_hand", "left_hand", "face"]:
+            return component_type
+        elif component_type == "other":
+            if group_name not in self.freemocap_data.other.keys():
+                raise ValueError(f"Other component {group_name} not found.")
+            return group_name
+        raise ValueError(
+            f"Component type {component_type} not recognized.")
+
+    def _validate_new_trajectory(self, trajectory: np.ndarray) -> np.ndarray:
+        if trajectory.shape[0] != self.number_of_frames:
+            raise ValueError(
+                f"Number of frames ({trajectory.shape[0]}) does not match number of frames in existing data ({self.number_of_frames}).")
 
-            self.add_trajectory(trajectory=trajectory,
-                                trajectory_name=trajectory_name,
-                                component_type=component_types[trajectory_number],
-                                source=source,
-                                group_name=group_name)
+        if len(trajectory.shape) == 2:
+            trajectory = np.expand_dims(trajectory,
+                                        axis=1)  # add a dummy "name" dimenstion to trajectory so it can be concatenated with other trajectories
+        if trajectory.shape[2] != 3:
+            raise ValueError(
+                f"Trajectory data should have 3 dimensions. Got {trajectory.shape[2]} instead.")
+        return trajectory
 
     def get_trajectories(self,
                          trajectory_names: List[str] = None,
@@ -297,62 +314,38 @@ class FreemocapDataHandler:
                                           with_error=with_error) for
                 name, component in zip(trajectory_names, components)}
 
+    def _find_trajectory(self,
+                         name: str,
+                         component_type: Optional[FREEMOCAP_DATA_COMPONENT_TYPES] = None):
+        matches = self._arena.lookup(name)
+        if component_type is not None:
+            matches = [(component_name, index) for component_name, index in matches
+                       if component_name == component_type or
+                       (component_type == "other" and component_name in self.freemocap_data.other.keys())]
+        if not matches:
+            raise ValueError(f"Trajectory {name} not found.")
+        return matches
+
     def get_trajectory(self,
                        name: str,
                        component_type: FREEMOCAP_DATA_COMPONENT_TYPES = None,
                        with_error: bool = False) -> Union[np.ndarray, Dict[str, np.ndarray]]:
 
-        trajectories = []
-        errors = []
-        if component_type is None:
-            if name in self.body_names:
-                trajectories.append(self.body_frame_name_xyz[:, self.body_names.index(name), :])
-                if with_error:
-                    errors.append(self.freemocap_data.body.error[:, self.body_names.index(name)])
-
-            if name in self.right_hand_names:
-                trajectories.append(self.right_hand_frame_name_xyz[:, self.right_hand_names.index(name), :])
-                if with_error:
-                    errors.append(self.freemocap_data.hands["right"].error[:, self.right_hand_names.index(name)])
-
-            if name in self.left_hand_names:
-                trajectories.append(self.left_hand_frame_name_xyz[:, self.left_hand_names.index(name), :])
-                if with_error:
-                    errors.append(self.freemocap_data.hands["left"].error[:, self.left_hand_names.index(name)])
-
-            if name in self.face_names:
-                trajectories.append(self.face_frame_name_xyz[:, self.face_names.index(name), :])
-                if with_error:
-                    errors.append(self.freemocap_data.face.error[:, self.face_names.index(name)])
+        matches = self._find_trajectory(name=name, component_type=component_type)
 
-            for other_component in self.freemocap_data.other.values():
-                if name in other_component.trajectory_names:
-                    if len(other_component.data.shape) == 3:
-                        trajectories.append(
-                            other_component.data[:, other_component.trajectory_names.index(name), :])
-                    elif len(other_component.data.shape) == 2:
-                        trajectories.append(
-                            other_component.data[:, other_component.trajectory_names.index(name)])
-                    else:
-                        raise ValueError(
-                            f"Data shape {other_component.data.shape} is not supported. Should be 2 or 3 dimensional.")
-
-                    if with_error and other_component.error is not None:
-                        errors.append(
-                            other_component.error[:, other_component.trajectory_names.index(name)])
-                    else:
-                        errors.append(None)
-        if trajectories == []:
-            raise ValueError(f"Trajectory {name} not found.")
-
-        if len(trajectories) > 1:
+        if len(matches) > 1:
             raise ValueError(
                 f"Trajectory {name} found in multiple components. Specify component (body, right_hand, left_hand, face, other) to resolve ambiguity.")
 
+        component_name, index = matches[0]
+        trajectory = self._arena.trajectory(component_name=component_name, index=index)
+
         if not with_error:
-            return trajectories[0]
-        else:
-            return {"trajectory": trajectories[0], "error": errors[0]}
+            return trajectory
+
+        component_error = self._arena.components()[component_name].error
+        error = component_error[:, index] if component_error is not None else None
+        return {"trajectory": trajectory, "error": error}
 
     def set_trajectory(self,
                        name: str,
@@ -372,82 +365,37 @@ class FreemocapDataHandler:
                 f"Trajectory data should have 3 dimensions. Got {data.shape[1]} instead.")
 
         try:
-            if component_type is None:
-                if name in self.body_names:
-                    self.freemocap_data.body.data[:, self.body_names.index(name), :] = data
-
-                if name in self.right_hand_names:
-                    self.freemocap_data.hands["right"].data[:, self.right_hand_names.index(name), :] = data
-
-                if name in self.left_hand_names:
-                    self.freemocap_data.hands["left"].data[:, self.left_hand_names.index(name), :] = data
-
-                if name in self.face_names:
-                    self.freemocap_data.face.data[:, self.face_names.index(name), :] = data
-
-                for other_component in self.freemocap_data.other.values():
-                    if name in other_component.trajectory_names:
-                        if len(other_component.data.shape) == 3:
-                            other_component.data[:, other_component.trajectory_names.index(name), :] = data
-                        elif len(other_component.data.shape) == 2:
-                            other_component.data = data
-                        else:
-                            raise ValueError(
-                                f"Data shape {other_component.data.shape} is not supported. Should be 2 or 3 dimensional.")
+            for component_name, index in self._find_trajectory(name=name, component_type=component_type):
+                self._arena.trajectory(component_name=component_name, index=index)[...] = data
         except Exception as e:
             print(f"Error while setting trajectory `{name}`:\n error:\n {e}")
             print(e)
             raise Exception(f"Error while setting trajectory: {e}")
 
-    def _collect_frame_counts(self) -> dict:
-        frame_counts = {
-            'body': self.body_frame_name_xyz.shape[0],
-            'right_hand': self.right_hand_frame_name_xyz.shape[0],
-            'left_hand': self.left_hand_frame_name_xyz.shape[0],
-            'face': self.face_frame_name_xyz.shape[0],
-            'other': [other_component.data.shape[0] for other_component in self.freemocap_data.other.values()],
-        }
-        return frame_counts
-
-    def _validate_frame_counts(self, frame_counts: dict):
-        body_frame_count = frame_counts['body']
-        are_frame_counts_equal = all(
-            body_frame_count == frame_count
-            for frame_count in frame_counts.values()
-            if isinstance(frame_count, int)
-        )
-        are_other_frame_counts_equal = all(
-            body_frame_count == frame_count
-            for frame_count in frame_counts['other']
-        )
-        if not (are_frame_counts_equal and are_other_frame_counts_equal):
-            raise ValueError(f"Number of frames do not match: {frame_counts}")
-
     def mark_processing_stage(self,
                               name: str,
                               metadata: Optional[dict] = None,
                               overwrite: bool = True):
         """
         Mark the current state of the data as a processing stage (e.g. "raw", "reoriented", etc.)
+        Component arrays that are unchanged since an earlier stage are shared with it rather than copied.
         """
         print(f"Marking processing stage {name}")
-        if self._intermediate_stages is None:
-            self._intermediate_stages = {}
         if metadata is None:
             metadata = {}
         self.add_metadata(metadata)
-        if name in self._intermediate_stages.keys() and not overwrite:
+        if name in self._intermediate_stages and not overwrite:
             raise ValueError(f"Processing stage {name} already exists. Set overwrite=True to overwrite.")
-        self._intermediate_stages[name] = FreemocapData(**deepcopy(self.freemocap_data.__dict__))
+        self._intermediate_stages.add(name=name, freemocap_data=self.freemocap_data)
 
     def get_processing_stage(self, name: str) -> "FreemocapData":
         """
         Get the data from a processing stage (e.g. "raw", "reoriented", etc.)
         """
-        if self._intermediate_stages is None:
+        if not self._intermediate_stages.keys():
             raise ValueError("No processing stages have been marked yet.")
 
-        return FreemocapData.from_data(**self._intermediate_stages[name])
+        return self._intermediate_stages.get(name)
 
     def add_metadata(self, metadata: dict):
         if self.freemocap_data.metadata is None:
@@ -461,54 +409,42 @@ class FreemocapDataHandler:
         self.freemocap_data.other[component.name] = component
         self.mark_processing_stage(f"added_{component.name}")
 
-    def extract_data_from_empties(self, empties: Dict[str, Any], stage_name: str = "from_empties"):
+    def extract_data_from_empties(self,
+                                  empties: Dict[str, Any],
+                                  stage_name: str = "from_empties",
+                                  evaluate_constraints: bool = False):
+        """
+        Read the empties' locations back into the handler, from their location F-curves (no `frame_set` per frame).
 
+        Set `evaluate_constraints` to sample empties that have constraints through the depsgraph instead.
+        """
         try:
             import bpy
+            from ajc27_freemocap_blender_addon.core_functions.animation.sample_keyframes import \
+                sample_object_locations
             print(f"Extracting data from empties {empties.keys()}")
 
-            body_frames = []
-            right_hand_frames = []
-            left_hand_frames = []
-            face_frames = []
-            other_components_frames = {}
-
-            for frame_number in range(bpy.context.scene.frame_start, bpy.context.scene.frame_end):
-                print(f"Extracting data from frame {frame_number}...")
-                bpy.context.scene.frame_set(frame_number)
-
-                if "body" in empties.keys():
-                    body_frames.append(np.array(
-                        [bpy.data.objects[empty_name].location for empty_name in empties["body"].keys()]))
-
-                if "hands" in empties.keys():
-                    right_hand_frames.append(np.array(
-                        [bpy.data.objects[empty_name].location for empty_name in empties["hands"]["right"].keys()]))
-
-                    left_hand_frames.append(np.array(
-                        [bpy.data.objects[empty_name].location for empty_name in empties["hands"]["left"].keys()]))
-
-                if "face" in empties.keys():
-                    face_frames.append(np.array(
-                        [bpy.data.objects[empty_name].location for empty_name in empties["face"].keys()]))
-
-                if "other" in empties.keys():
-                    for other_name, other_component in self.freemocap_data.other.items():
-                        if not other_name in other_components_frames.keys():
-                            other_components_frames[other_name] = []
-                        other_components_frames[other_name].append(np.ndarray(bpy.data.objects[other_name].location))
-
-            if len(body_frames) > 0:
-                self.body_frame_name_xyz = np.array(body_frames)
-            if len(right_hand_frames) > 0:
-                self.right_hand_frame_name_xyz = np.array(right_hand_frames)
-            if len(left_hand_frames) > 0:
-                self.left_hand_frame_name_xyz = np.array(left_hand_frames)
-            if len(face_frames) > 0:
-                self.face_frame_name_xyz = np.array(face_frames)
-            if len(other_components_frames) > 0:
-                for other_name, other_component_frames in other_components_frames.items():
-                    self.freemocap_data.other[other_name].data = np.array(other_component_frames)
+            frames = np.arange(bpy.context.scene.frame_start, bpy.context.scene.frame_end)
+
+            def sample(empty_names: List[str]) -> np.ndarray:
+                return sample_object_locations(objects=[bpy.data.objects[empty_name] for empty_name in empty_names],
+                                               frames=frames,
+                                               evaluate_constraints=evaluate_constraints)
+
+            if "body" in empties.keys():
+                self.body_frame_name_xyz = sample(list(empties["body"].keys()))
+
+            if "hands" in empties.keys():
+                self.right_hand_frame_name_xyz = sample(list(empties["hands"]["right"].keys()))
+                self.left_hand_frame_name_xyz = sample(list(empties["hands"]["left"].keys()))
+
+            if "face" in empties.keys():
+                self.face_frame_name_xyz = sample(list(empties["face"].keys()))
+
+            if "other" in empties.keys():
+                for other_name, other_component in self.freemocap_data.other.items():
+                    other_component.data = sample([other_name]).reshape(
+                        (frames.shape[0],) + other_component.data.shape[1:])
 
         except Exception as e:
             print(f"Failed to extract data from empties {empties.keys()}")
@@ -517,14 +453,20 @@ class FreemocapDataHandler:
 
         self.mark_processing_stage(stage_name)
 
-    def calculate_virtual_trajectories(self):
+    def calculate_virtual_trajectories(self, virtual_marker_definitions: Optional[Dict[str, Dict[str, list]]] = None):
+        """
+        Add the virtual markers to the body data (the built-in ones by default, see `calculate_virtual_trajectories`)
+        """
         print(f"Calculating virtual trajectories")
         try:
-            virtual_trajectories = calculate_virtual_trajectories(body_frame_name_xyz=self.body_frame_name_xyz,
-                                                                  body_names=self.body_names)
-            self.add_trajectories(trajectories=virtual_trajectories,
-                                  component_type="body",
-                                  )
+            virtual_names, virtual_frame_name_xyz = calculate_virtual_trajectories(
+                body_frame_name_xyz=self.body_frame_name_xyz,
+                body_names=self.body_names,
+                virtual_marker_definitions=virtual_marker_definitions)
+            self.append_trajectories(frame_name_xyz=virtual_frame_name_xyz,
+                                     trajectory_names=virtual_names,
+                                     component_type="body",
+                                     )
             self.mark_processing_stage("added_virtual_trajectories")
 
         except Exception as e:
@@ -556,7 +498,7 @@ class FreemocapDataHandler:
                rotation: Union[np.ndarray, List[np.ndarray]],
                component_name: FREEMOCAP_DATA_COMPONENT_TYPES = None,
                ):
-        if isinstance(rotation, list):
+        if isinstance(rotation, list) or (isinstance(rotation, np.ndarray) and rotation.ndim == 3):
             self._transformer.apply_rotations(rotation_matricies=rotation,
                                               component_name=component_name)
         elif isinstance(rotation, np.ndarray):
@@ -570,13 +512,23 @@ class FreemocapDataHandler:
                   translation: Union[np.ndarray, List[np.ndarray]],
                   component_name: Optional[FREEMOCAP_DATA_COMPONENT_TYPES] = None,
                   ):
-        if isinstance(translation, np.ndarray):
+        if isinstance(translation, np.ndarray) and translation.ndim == 1:
             self._transformer.apply_translation(vector=translation,
                                                 component_name=component_name)
-        elif isinstance(translation, list):
+        elif isinstance(translation, (list, np.ndarray)):
             self._transformer.apply_translations(vectors=translation,
                                                  component_name=component_name)
 
+    def transform(self,
+                  transform: np.ndarray,
+                  component_name: Optional[FREEMOCAP_DATA_COMPONENT_TYPES] = None,
+                  ):
+        """
+        Apply a 3x3/4x4 transform, or a (number_of_frames, 3|4, 3|4) stack of per-frame transforms
+        """
+        self._transformer.apply_transform(transform=transform,
+                                          component_name=component_name)
+
     def scale(self,
               scale: float,
               component_name: Optional[FREEMOCAP_DATA_COMPONENT_TYPES] = None,
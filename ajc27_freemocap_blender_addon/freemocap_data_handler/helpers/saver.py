@@ -1,19 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict, is_dataclass
 import json
 import pickle
 from pathlib import Path
-from typing import Union, TYPE_CHECKING
+from typing import Callable, Dict, List, Optional, Union, TYPE_CHECKING
 
 import numpy as np
 
+from ..operations.calculate_joint_angles import save_joint_angles
+from ..utilities.file_writing import atomic_write, write_csv
+
 # this allows us to import the `FreemocapDataHandler` class for type hinting without causing a circular import
 if TYPE_CHECKING:
     from ..handler import FreemocapDataHandler
 
 
 class FreemocapDataSaver:
-    def __init__(self, handler: "FreemocapDataHandler"):
+    """
+    Writes the handler's data to `[recording]/saved_data` (readme, info, npy and csv files).
+
+    Independent files are written concurrently on a thread pool (numpy releases the GIL while writing), and every file
+    is written atomically so an interrupted save never leaves half-written files behind.
+    """
+
+    def __init__(self,
+                 handler: "FreemocapDataHandler",
+                 csv_precision: int = 6,
+                 compress_csv: bool = False,
+                 max_workers: Optional[int] = None):
         self.handler = handler
+        self.csv_precision = csv_precision
+        self.compress_csv = compress_csv
+        self.max_workers = max_workers
 
     def save(self, recording_path: Union[str, Path]):
         recording_path = Path(recording_path)
@@ -22,12 +40,20 @@ class FreemocapDataSaver:
             save_path.mkdir(parents=True, exist_ok=True)
             print(f"Saving freemocap data to {save_path}")
 
-            self._save_data_readme(save_path=save_path)
+            components = self._components()
+            all_frame_name_xyz = self.handler.all_frame_name_xyz
 
-            self._save_info(save_path)
+            # the info files go in one task, in order - `save_metadata` converts the metadata in place after pickling
+            tasks = [lambda: self._save_data_readme(save_path=save_path),
+                     lambda: self._save_info(save_path)]
+            tasks.extend(self._npy_tasks(save_path, components=components, all_frame_name_xyz=all_frame_name_xyz))
+            tasks.extend(self._csv_tasks(save_path, components=components, all_frame_name_xyz=all_frame_name_xyz))
+            tasks.extend(self._joint_angle_tasks(save_path))
 
-            self._save_npy(save_path)
-            self._save_csv(save_path)
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [executor.submit(task) for task in tasks]
+                for future in futures:
+                    future.result()
 
             print(f"Saved freemocap data to {save_path}")
 
@@ -36,16 +62,7 @@ class FreemocapDataSaver:
             print(e)
             raise e
 
-    def _save_csv(self, save_path: Union[str, Path]):
-        """
-        Save the data as csv files (use `np` methods to save the data so it will work without pandas (aka, it will run in Blender w/o extra dependencies)
-        :param save_path:
-        :return:
-        """
-        csv_path = Path(save_path) / "csv"
-        csv_path.mkdir(parents=True, exist_ok=True)
-        print(f"Saving csv files to {csv_path}")
-
+    def _components(self) -> Dict[str, np.ndarray]:
         components = {
             'body': self.handler.body_frame_name_xyz,
             'right_hand': self.handler.right_hand_frame_name_xyz,
@@ -55,7 +72,23 @@ class FreemocapDataSaver:
 
         for name, other_component in self.handler.freemocap_data.other.items():
             components[name] = other_component.data
+        return components
 
+    def _csv_tasks(self,
+                   save_path: Union[str, Path],
+                   components: Dict[str, np.ndarray],
+                   all_frame_name_xyz: np.ndarray) -> List[Callable[[], None]]:
+        """
+        Save the data as csv files (use `np` methods to save the data so it will work without pandas (aka, it will run in Blender w/o extra dependencies)
+        :param save_path:
+        :return:
+        """
+        csv_path = Path(save_path) / "csv"
+        csv_path.mkdir(parents=True, exist_ok=True)
+        print(f"Saving csv files to {csv_path}")
+        suffix = ".csv.gz" if self.compress_csv else ".csv"
+
+        tasks = []
         all_csv_header = ""
 
         for component_name, component_data in components.items():
@@ -64,51 +97,67 @@ class FreemocapDataSaver:
                  self.handler.get_trajectory_names(component_name=component_name)])
             all_csv_header += csv_header
 
-            reshaped_data = component_data.reshape(component_data.shape[0], -1)
-            np.savetxt(str(csv_path / f"{component_name}_trajectories.csv"), reshaped_data, delimiter=",",
-                       fmt='%s', header=csv_header)
-            print(
-                f"Saved {component_name}_frame_name_xyz to {csv_path / f'{component_name}_frame_name_xyz.csv'}")
-
-        np.savetxt(str(Path(save_path) / "all_trajectories.csv"),
-                   self.handler.all_frame_name_xyz.reshape(self.handler.all_frame_name_xyz.shape[0], -1), delimiter=",",
-                   fmt='%s', header=all_csv_header)
-        print(f"Saved all_frame_name_xyz to {Path(save_path) / 'all_trajectories.csv'}")
-
-    def _save_npy(self, save_path: Union[str, Path]):
+            tasks.append(self._csv_task(path=csv_path / f"{component_name}_trajectories{suffix}",
+                                        data=component_data,
+                                        header=csv_header))
+
+        tasks.append(self._csv_task(path=Path(save_path) / f"all_trajectories{suffix}",
+                                    data=all_frame_name_xyz,
+                                    header=all_csv_header))
+        return tasks
+
+    def _csv_task(self, path: Path, data: np.ndarray, header: str) -> Callable[[], None]:
+        def task():
+            write_csv(path,
+                      data.reshape(data.shape[0], -1),
+                      header=header,
+                      precision=self.csv_precision,
+                      compress=self.compress_csv)
+            print(f"Saved {path.name} to {path}")
+
+        return task
+
+    def _npy_tasks(self,
+                   save_path: Union[str, Path],
+                   components: Dict[str, np.ndarray],
+                   all_frame_name_xyz: np.ndarray) -> List[Callable[[], None]]:
         npy_path = Path(save_path) / "npy"
         npy_path.mkdir(parents=True, exist_ok=True)
         print(f"Saving npy files to {npy_path}")
 
-        np.save(str(npy_path / "body_frame_name_xyz.npy"), self.handler.body_frame_name_xyz)
-        print(f"Saved body_frame_name_xyz to {npy_path / 'body_frame_name_xyz.npy'}")
+        arrays = {f"{name}_frame_name_xyz": data for name, data in components.items()}
+        arrays["all_frame_name_xyz"] = all_frame_name_xyz
+        return [self._npy_task(path=npy_path / f"{name}.npy", data=data) for name, data in arrays.items()]
 
-        np.save(str(npy_path / "right_hand_frame_name_xyz.npy"), self.handler.right_hand_frame_name_xyz)
-        print(f"Saved right_hand_frame_name_xyz to {npy_path / 'right_hand_frame_name_xyz.npy'}")
+    def _joint_angle_tasks(self, save_path: Union[str, Path]) -> List[Callable[[], None]]:
+        joint_angles = self.handler.calculate_joint_angles()
+        if len(joint_angles["joint_names"]) == 0:
+            return []
+        return [lambda: save_joint_angles(joint_angles,
+                                          save_path=save_path,
+                                          csv_precision=self.csv_precision,
+                                          compress_csv=self.compress_csv)]
 
-        np.save(str(npy_path / "left_hand_frame_name_xyz.npy"), self.handler.left_hand_frame_name_xyz)
-        print(f"Saved left_hand_frame_name_xyz to {npy_path / 'left_hand_frame_name_xyz.npy'}")
+    @staticmethod
+    def _npy_task(path: Path, data: np.ndarray) -> Callable[[], None]:
+        def task():
+            with atomic_write(path) as file:
+                np.save(file, data)
+            print(f"Saved {path.stem} to {path}")
 
-        np.save(str(npy_path / "face_frame_name_xyz.npy"), self.handler.face_frame_name_xyz)
-        print(f"Saved face_frame_name_xyz to {npy_path / 'face_frame_name_xyz.npy'}")
-
-        for name, component in self.handler.freemocap_data.other.items():
-            np.save(str(npy_path / f"{name}_frame_name_xyz.npy"), component.data)
-            print(f"Saved {name}_frame_name_xyz to {npy_path / f'{name}_frame_name_xyz.npy'}")
-
-        np.save(str(npy_path / "all_frame_name_xyz.npy"), self.handler.all_frame_name_xyz)
-        print(f"Saved all_frame_name_xyz to {npy_path / 'all_frame_name_xyz.npy'}")
+        return task
 
     def _save_data_readme(self, save_path: Union[str, Path]):
         print(f"Saving data readme to {save_path}")
         readme_path = Path(save_path) / "_FREEMOCAP_DATA_README.md"
-        readme_path.write_text(DATA_README_TEXT, encoding="utf-8")
+        with atomic_write(readme_path) as file:
+            file.write(DATA_README_TEXT.encode("utf-8"))
 
     def _save_pickle(self, path: Union[str, Path]):
 
         pickle_path = Path(path) / "freemocap_data_handler.pkl"
         print(f"Saving `FreemocapDataHandler` pickle to {pickle_path}")
-        with open(str(pickle_path), "wb") as f:
+        with atomic_write(pickle_path) as f:
             pickle.dump(self.handler, f)
 
     def _save_info(self, save_path: Union[str, Path]):
@@ -148,7 +197,8 @@ class FreemocapDataSaver:
             else:
                 pass
 
-        metadata_path.write_text(json.dumps(metadata, indent=4))
+        with atomic_write(metadata_path) as file:
+            file.write(json.dumps(metadata, indent=4, default=_to_json_serializable).encode())
         print(f"Saved metadata to {metadata_path}")
 
     def _save_trajectory_names(self, path: Union[str, Path]):
@@ -163,7 +213,8 @@ class FreemocapDataSaver:
                 "other": {key: value.trajectory_names for key, value in
                           self.handler.freemocap_data.other.items()}
             }
-            trajectory_names_path.write_text(json.dumps(trajectory_names, indent=4))
+            with atomic_write(trajectory_names_path) as file:
+                file.write(json.dumps(trajectory_names, indent=4).encode())
             print(f"Saved trajectory names to {trajectory_names_path}")
         except Exception as e:
             print(f"Failed to save trajectory names: {e}")
@@ -171,6 +222,13 @@ class FreemocapDataSaver:
             raise e
 
 
+def _to_json_serializable(value):
+    # numpy values nested inside dataclasses (e.g. `BoneDefinition.lengths`) survive `asdict`, so convert them here
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
 DATA_README_TEXT = """
 # Freemocap Data
 This folder contains the data extracted from the recording.
@@ -240,4 +298,10 @@ nose_y = np.load("body_frame_name_xyz.npy")[100, nose_index, 1] # data from the
 - `all_frame_name_xyz.csv`: All trajectory data in the `csv` format
 
 The header of each file is the list of trajectory names, with each marker's x, y, and z coordinates as a separate column (format: `[name]_x`, `[name]_y`, `[name]_z`).                 
+
+### Joint angles
+- `npy/joint_angles.npz`: `joint_names`, `flexion_angles` (frame, joint) in degrees, `plane_normals` (frame, joint, xyz) and `arc_orientations` (frame, joint, 3, 3)
+- `csv/joint_angles.csv`: the flexion angle of each joint (`[joint]_angle`) and the normal of the plane the angle is measured in (`[joint]_normal_x`, `[joint]_normal_y`, `[joint]_normal_z`)
+
+The angle of a joint is the angle between the vectors from the joint to its parent and child points (e.g. the `right_elbow` angle is measured between `right_shoulder` and `right_wrist`). The plane normal is NaN on frames where those vectors are parallel.
 """
@@ -0,0 +1,212 @@
+import hashlib
+from copy import deepcopy
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Union
+
+import numpy as np
+from ajc27_freemocap_blender_addon.data_models.freemocap_data.freemocap_data_model import FreemocapData
+from ajc27_freemocap_blender_addon.data_models.freemocap_data.helpers.freemocap_component_data import \
+    FreemocapComponentData
+
+
+@dataclass
+class _StoredArray:
+    """
+    A read-only copy of a component array, shared by every processing stage in which the array had the same content
+    """
+    array: np.ndarray
+    nbytes: int
+    stage_names: Set[str] = field(default_factory=set)
+    spill_path: Optional[str] = None
+
+    @property
+    def in_memory(self) -> bool:
+        return self.spill_path is None
+
+
+@dataclass
+class _ComponentSnapshot:
+    name: str
+    data_key: str
+    error_key: Optional[str]
+    data_source: str
+    trajectory_names: List[str]
+    data_dimensions: Optional[List[str]]
+    error_type: str
+
+
+@dataclass
+class _StageSnapshot:
+    body: _ComponentSnapshot
+    hands: Dict[str, _ComponentSnapshot]
+    face: _ComponentSnapshot
+    other: Dict[str, _ComponentSnapshot]
+    metadata: Optional[Dict[Any, Any]]
+
+    def components(self) -> List[_ComponentSnapshot]:
+        return [self.body, *self.hands.values(), self.face, *self.other.values()]
+
+
+class ProcessingStageStore:
+    """
+    Copy-on-write store for the processing stages of a `FreemocapDataHandler`.
+
+    Component arrays are deduplicated by content, so a stage only materializes the arrays that changed since the
+    stages before it (e.g. `fix_hand_data` only adds new hand arrays, the body/face arrays are shared).
+
+    If `memory_budget_bytes` is set, the least recently used stages are moved out of memory once the budget is
+    exceeded - spilled to `.npy` files (and memory-mapped back on access) if `spill_directory` is set, otherwise
+    dropped from the store. The most recently marked stage is never evicted.
+    """
+
+    def __init__(self,
+                 memory_budget_bytes: Optional[int] = None,
+                 spill_directory: Optional[Union[str, Path]] = None):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.spill_directory = Path(spill_directory) if spill_directory is not None else None
+        self._arrays: Dict[str, _StoredArray] = {}
+        self._stages: Dict[str, _StageSnapshot] = {}  # ordered from least to most recently used
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._stages
+
+    def keys(self) -> List[str]:
+        return list(self._stages.keys())
+
+    @property
+    def memory_usage_bytes(self) -> int:
+        return sum(stored.nbytes for stored in self._arrays.values() if stored.in_memory)
+
+    def add(self, name: str, freemocap_data: FreemocapData):
+        if name in self._stages:
+            self.remove(name)
+
+        self._stages[name] = _StageSnapshot(
+            body=self._snapshot_component(name, freemocap_data.body),
+            hands={side: self._snapshot_component(name, component)
+                   for side, component in freemocap_data.hands.items()},
+            face=self._snapshot_component(name, freemocap_data.face),
+            other={other_name: self._snapshot_component(name, component)
+                   for other_name, component in freemocap_data.other.items()},
+            metadata=deepcopy(freemocap_data.metadata),
+        )
+        self._enforce_memory_budget()
+
+    def get(self, name: str) -> FreemocapData:
+        if name not in self._stages:
+            raise ValueError(f"Processing stage {name} not found. Available stages: {self.keys()}")
+
+        # mark as most recently used
+        stage = self._stages.pop(name)
+        self._stages[name] = stage
+
+        return FreemocapData(
+            body=self._restore_component(stage.body),
+            hands={side: self._restore_component(component) for side, component in stage.hands.items()},
+            face=self._restore_component(stage.face),
+            other={other_name: self._restore_component(component) for other_name, component in stage.other.items()},
+            metadata=deepcopy(stage.metadata),
+        )
+
+    def remove(self, name: str):
+        stage = self._stages.pop(name)
+        for component in stage.components():
+            for key in [component.data_key, component.error_key]:
+                if key is None or key not in self._arrays:
+                    continue
+                stored = self._arrays[key]
+                stored.stage_names.discard(name)
+                if not stored.stage_names:
+                    self._release(key)
+
+    def _snapshot_component(self, stage_name: str, component: FreemocapComponentData) -> _ComponentSnapshot:
+        return _ComponentSnapshot(
+            name=component.name,
+            data_key=self._store_array(stage_name, component.data),
+            error_key=self._store_array(stage_name, component.error) if component.error is not None else None,
+            data_source=component.data_source,
+            trajectory_names=list(component.trajectory_names),
+            data_dimensions=list(component.data_dimensions) if component.data_dimensions is not None else None,
+            error_type=component.error_type,
+        )
+
+    def _restore_component(self, snapshot: _ComponentSnapshot) -> FreemocapComponentData:
+        error = None
+        if snapshot.error_key is not None:
+            error = np.array(self._arrays[snapshot.error_key].array)
+        return FreemocapComponentData(name=snapshot.name,
+                                      data=np.array(self._arrays[snapshot.data_key].array),
+                                      data_source=snapshot.data_source,
+                                      trajectory_names=list(snapshot.trajectory_names),
+                                      data_dimensions=snapshot.data_dimensions,
+                                      error=error,
+                                      error_type=snapshot.error_type)
+
+    def _store_array(self, stage_name: str, array: np.ndarray) -> str:
+        contiguous = np.ascontiguousarray(array)
+        key = self._content_key(contiguous)
+        if key not in self._arrays:
+            # `ascontiguousarray` already copied non-contiguous arrays (e.g. views into the trajectory arena), only
+            # arrays it returned as they were still need their own copy
+            stored_copy = contiguous.copy() if np.may_share_memory(contiguous, array) else contiguous
+            stored_copy.flags.writeable = False
+            self._arrays[key] = _StoredArray(array=stored_copy, nbytes=stored_copy.nbytes)
+        self._arrays[key].stage_names.add(stage_name)
+        return key
+
+    @staticmethod
+    def _content_key(array: np.ndarray) -> str:
+        content_hash = hashlib.blake2b(digest_size=16)
+        content_hash.update(f"{array.dtype.str}{array.shape}".encode())
+        content_hash.update(array.reshape(-1).view(np.uint8))
+        return content_hash.hexdigest()
+
+    def _enforce_memory_budget(self):
+        if self.memory_budget_bytes is None:
+            return
+
+        # the most recent stage always stays in memory
+        for stage_name in list(self._stages.keys())[:-1]:
+            if self.memory_usage_bytes <= self.memory_budget_bytes:
+                return
+            self._evict(stage_name)
+
+        if self.memory_usage_bytes > self.memory_budget_bytes:
+            print(f"Processing stages use {self.memory_usage_bytes} bytes after eviction, "
+                  f"which is over the memory budget of {self.memory_budget_bytes} bytes")
+
+    def _evict(self, stage_name: str):
+        if self.spill_directory is None:
+            print(f"Dropping processing stage {stage_name} to stay within the memory budget")
+            self.remove(stage_name)
+            return
+
+        print(f"Spilling processing stage {stage_name} to {self.spill_directory}")
+        self.spill_directory.mkdir(parents=True, exist_ok=True)
+        for component in self._stages[stage_name].components():
+            for key in [component.data_key, component.error_key]:
+                if key is None:
+                    continue
+                stored = self._arrays[key]
+                # arrays shared with a newer stage are still in use, so keep them in memory
+                if not stored.in_memory or self._is_used_by_newer_stage(stored, stage_name):
+                    continue
+                spill_path = self.spill_directory / f"{key}.npy"
+                np.save(str(spill_path), stored.array)
+                stored.array = np.load(str(spill_path), mmap_mode="r")
+                stored.spill_path = str(spill_path)
+
+    def _is_used_by_newer_stage(self, stored: _StoredArray, stage_name: str) -> bool:
+        stage_names = list(self._stages.keys())
+        stage_index = stage_names.index(stage_name)
+        return any(stage_names.index(name) > stage_index for name in stored.stage_names if name in self._stages)
+
+    def _release(self, key: str):
+        stored = self._arrays.pop(key)
+        if stored.spill_path is not None:
+            stored.array = None
+            try:
+                Path(stored.spill_path).unlink()
+            except OSError as e:
+                print(f"Failed to remove spilled processing stage array {stored.spill_path}: {e}")
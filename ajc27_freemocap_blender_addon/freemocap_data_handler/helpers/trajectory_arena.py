@@ -0,0 +1,221 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from ajc27_freemocap_blender_addon.data_models.freemocap_data.freemocap_data_model import FreemocapData
+from ajc27_freemocap_blender_addon.data_models.freemocap_data.helpers.freemocap_component_data import \
+    FreemocapComponentData
+
+
+@dataclass
+class _ComponentSlot:
+    start: int
+    size: int
+    capacity: int
+    view: np.ndarray
+    is_2d: bool  # single-trajectory components stored as (frame, xyz), e.g. `center_of_mass`
+
+
+class TrajectoryArena:
+    """
+    Keeps the data of every component of a `FreemocapData` in one preallocated (frame, marker, xyz) buffer.
+
+    Each component's `data` is re-pointed to a view into the buffer, so in-place edits through either the component or
+    the arena are visible to both. Components get spare capacity so trajectories can be appended without copying the
+    whole recording every time, and a name -> (component, index) map makes trajectory lookups O(1).
+
+    If a component's `data` is replaced by a new array from outside (e.g. `component.data = ...`), the new data is
+    copied back into the buffer the next time the arena is used.
+    """
+
+    def __init__(self, freemocap_data: FreemocapData, growth_factor: float = 1.5):
+        self.freemocap_data = freemocap_data
+        self.growth_factor = growth_factor
+        self._buffer: Optional[np.ndarray] = None
+        self._slots: Dict[str, _ComponentSlot] = {}
+        self._name_index: Dict[str, List[Tuple[str, int]]] = {}
+        self._trajectories: Optional[Dict[str, np.ndarray]] = None
+        self._used_columns: Optional[np.ndarray] = None
+        self._build()
+
+    def __getstate__(self):
+        # views don't survive pickling (they come back as independent arrays), so rebuild the buffer on unpickle
+        state = self.__dict__.copy()
+        state["_buffer"] = None
+        state["_slots"] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build()
+
+    @property
+    def number_of_frames(self) -> int:
+        self.sync()
+        return self._buffer.shape[0]
+
+    @property
+    def number_of_trajectories(self) -> int:
+        self.sync()
+        return sum(slot.size for slot in self._slots.values())
+
+    def components(self) -> Dict[str, FreemocapComponentData]:
+        components = {"body": self.freemocap_data.body,
+                      "right_hand": self.freemocap_data.hands["right"],
+                      "left_hand": self.freemocap_data.hands["left"],
+                      "face": self.freemocap_data.face}
+        components.update(self.freemocap_data.other)
+        return components
+
+    def lookup(self, name: str) -> List[Tuple[str, int]]:
+        """
+        Return every (component name, index in component) pair where the trajectory `name` lives
+        """
+        self.sync()
+        return self._name_index.get(name, [])
+
+    def component_data(self, component_name: str) -> np.ndarray:
+        self.sync()
+        return self._slots[component_name].view
+
+    def trajectory(self, component_name: str, index: int) -> np.ndarray:
+        self.sync()
+        slot = self._slots[component_name]
+        if slot.is_2d:
+            return slot.view
+        return slot.view[:, index, :]
+
+    def trajectories(self) -> Dict[str, np.ndarray]:
+        """
+        Return a (cached) dict of trajectory name -> (frame, xyz) view into the buffer
+        """
+        self.sync()
+        if self._trajectories is None:
+            trajectories = {}
+            for component_name, slot in self._slots.items():
+                component = self.components()[component_name]
+                for index, name in enumerate(component.trajectory_names):
+                    trajectories[name] = slot.view if slot.is_2d else slot.view[:, index, :]
+            self._trajectories = trajectories
+        return self._trajectories
+
+    def all_frame_name_xyz(self) -> np.ndarray:
+        """
+        Return a (frame, all_trajectories, xyz) copy of the used part of the buffer, in component order
+        """
+        self.sync()
+        if self._used_columns is None:
+            self._used_columns = np.concatenate([np.arange(slot.start, slot.start + slot.size)
+                                                 for slot in self._slots.values()])
+        return np.take(self._buffer, self._used_columns, axis=1)
+
+    def write_component(self, component_name: str, value: np.ndarray):
+        self.sync()
+        slot = self._slots[component_name]
+        np.copyto(slot.view, np.reshape(value, slot.view.shape))
+
+    def reserve(self, component_name: str, additional_trajectories: int):
+        """
+        Make sure `component_name` has room for `additional_trajectories` more trajectories without reallocating
+        """
+        self.sync()
+        slot = self._slots[component_name]
+        if slot.size + additional_trajectories > slot.capacity:
+            new_capacity = max(int(slot.capacity * self.growth_factor), slot.size + additional_trajectories)
+            self._build(capacities={component_name: new_capacity})
+
+    def append(self, component_name: str, trajectories_frame_name_xyz: np.ndarray, trajectory_names: List[str]):
+        """
+        Append (frame, name, xyz) data to a component, growing its capacity geometrically if needed
+        """
+        if trajectories_frame_name_xyz.shape[1] != len(trajectory_names):
+            raise ValueError(
+                f"Got {trajectories_frame_name_xyz.shape[1]} trajectories but {len(trajectory_names)} names.")
+        self.reserve(component_name, len(trajectory_names))
+
+        slot = self._slots[component_name]
+        start = slot.start + slot.size
+        self._buffer[:, start:start + len(trajectory_names), :] = trajectories_frame_name_xyz
+        slot.size += len(trajectory_names)
+        slot.is_2d = False
+        self.components()[component_name].trajectory_names.extend(trajectory_names)
+        self._bind(component_name)
+        self._invalidate()
+
+    def sync(self):
+        """
+        Pick up changes made to the components from outside the arena (replaced arrays, added components)
+        """
+        if self._buffer is None:
+            self._build()
+            return
+
+        components = self.components()
+        if list(components.keys()) != list(self._slots.keys()):
+            self._build()
+            return
+
+        for component_name, component in components.items():
+            slot = self._slots[component_name]
+            if component.data is slot.view:
+                continue
+            if component.data.shape == slot.view.shape:
+                np.copyto(slot.view, component.data)
+                component.data = slot.view
+            else:
+                self._build()
+                return
+
+    def _build(self, capacities: Optional[Dict[str, int]] = None):
+        components = self.components()
+        capacities = capacities or {}
+
+        number_of_frames = components["body"].data.shape[0]
+        for component_name, component in components.items():
+            if component.data.shape[0] != number_of_frames:
+                raise ValueError(
+                    f"Number of frames in `{component_name}` ({component.data.shape[0]}) does not match "
+                    f"number of frames in `body` ({number_of_frames}).")
+
+        sizes = {name: 1 if component.data.ndim == 2 else component.data.shape[1]
+                 for name, component in components.items()}
+        capacities = {name: max(capacities.get(name, 0), self._slots[name].capacity if name in self._slots else 0,
+                                sizes[name])
+                      for name in components.keys()}
+
+        dtype = np.result_type(*[component.data.dtype for component in components.values()], np.float32)
+        buffer = np.empty((number_of_frames, sum(capacities.values()), 3), dtype=dtype)
+
+        slots = {}
+        start = 0
+        for component_name, component in components.items():
+            is_2d = component.data.ndim == 2
+            used = buffer[:, start:start + sizes[component_name], :]
+            used[...] = component.data[:, np.newaxis, :] if is_2d else component.data
+            slots[component_name] = _ComponentSlot(start=start,
+                                                   size=sizes[component_name],
+                                                   capacity=capacities[component_name],
+                                                   view=used,
+                                                   is_2d=is_2d)
+            start += capacities[component_name]
+
+        self._buffer = buffer
+        self._slots = slots
+        for component_name in components.keys():
+            self._bind(component_name)
+        self._invalidate()
+
+    def _bind(self, component_name: str):
+        slot = self._slots[component_name]
+        slot.view = self._buffer[:, slot.start:slot.start + slot.size, :]
+        if slot.is_2d:
+            slot.view = slot.view[:, 0, :]
+        self.components()[component_name].data = slot.view
+
+    def _invalidate(self):
+        self._trajectories = None
+        self._used_columns = None
+        self._name_index = {}
+        for component_name, component in self.components().items():
+            for index, name in enumerate(component.trajectory_names):
+                self._name_index.setdefault(name, []).append((component_name, index))
@@ -16,19 +16,24 @@ class FreemocapDataTransformer:
         self.handler = handler
 
     def apply_rotations(
-        self, rotation_matricies: List[np.ndarray], component_name: Optional[str] = None
+        self, rotation_matricies: Union[List[np.ndarray], np.ndarray], component_name: Optional[str] = None
     ):
-        if not len(rotation_matricies) == self.handler.number_of_frames:
+        """
+        Apply one rotation matrix per frame (i.e. `rotation_matricies[frame_number]` rotates `frame_number` only)
+        """
+        rotation_matricies = np.asarray(rotation_matricies)
+        if not rotation_matricies.shape[0] == self.handler.number_of_frames:
             raise ValueError(
-                f"Number of rotation matricies ({len(rotation_matricies)})"
+                f"Number of rotation matricies ({rotation_matricies.shape[0]})"
                 f" does not match number of frames ({self.handler.number_of_frames})."
             )
-
-        for rotation_matrix in rotation_matricies:
-            self.apply_rotation(
-                rotation_matrix=rotation_matrix, component_name=component_name
+        if rotation_matricies.shape[1:] != (3, 3):
+            raise ValueError(
+                f"Rotation matricies must have shape (number_of_frames, 3, 3). Got {rotation_matricies.shape} instead."
             )
 
+        self.apply_transform(transform=rotation_matricies, component_name=component_name)
+
     def apply_rotation(
         self,
         rotation_matrix: Union[np.ndarray, List[List[float]]],
@@ -43,86 +48,155 @@ class FreemocapDataTransformer:
             )
 
         print(f"Applying rotation matrix {rotation_matrix}")
+        self.apply_transform(transform=rotation_matrix, component_name=component_name)
+
+    def apply_transform(
+        self,
+        transform: Union[np.ndarray, List[List[float]]],
+        component_name: Optional[str] = None,
+    ):
+        """
+        Apply a transform to the data in a single vectorized pass per component.
+
+        `transform` can be a single 3x3 rotation, a single 4x4 rigid transform, or a per-frame stack of either
+        (shape (number_of_frames, 3, 3) or (number_of_frames, 4, 4)).
+        """
+        transform = np.asarray(transform)
+        self._validate_transform(transform)
+
         if component_name == "body" or component_name is None:
-            self.handler.body_frame_name_xyz = self._rotate_component(
-                self.handler.body_frame_name_xyz, rotation_matrix
+            self.handler.body_frame_name_xyz = self._transform_component(
+                self.handler.body_frame_name_xyz, transform
             )
 
         if component_name == "right_hand" or component_name is None:
-            self.handler.right_hand_frame_name_xyz = self._rotate_component(
-                self.handler.right_hand_frame_name_xyz, rotation_matrix
+            self.handler.right_hand_frame_name_xyz = self._transform_component(
+                self.handler.right_hand_frame_name_xyz, transform
             )
 
         if component_name == "left_hand" or component_name is None:
-            self.handler.left_hand_frame_name_xyz = self._rotate_component(
-                self.handler.left_hand_frame_name_xyz, rotation_matrix
+            self.handler.left_hand_frame_name_xyz = self._transform_component(
+                self.handler.left_hand_frame_name_xyz, transform
             )
 
         if component_name == "face" or component_name is None:
-            self.handler.face_frame_name_xyz = self._rotate_component(
-                self.handler.face_frame_name_xyz, rotation_matrix
+            self.handler.face_frame_name_xyz = self._transform_component(
+                self.handler.face_frame_name_xyz, transform
             )
 
         if component_name == "other" or component_name is None:
             for name, other_component in self.handler.freemocap_data.other.items():
-                other_component.data = self._rotate_component(
-                    other_component.data, rotation_matrix
+                other_component.data = self._transform_component(
+                    other_component.data, transform
                 )
 
+    def _validate_transform(self, transform: np.ndarray):
+        if transform.shape in [(3, 3), (4, 4)]:
+            return
+        if transform.ndim == 3 and transform.shape[1:] in [(3, 3), (4, 4)]:
+            if transform.shape[0] != self.handler.number_of_frames:
+                raise ValueError(
+                    f"Number of per-frame transforms ({transform.shape[0]})"
+                    f" does not match number of frames ({self.handler.number_of_frames})."
+                )
+            return
+        raise ValueError(
+            f"Transform must be a 3x3 or 4x4 matrix, or a (number_of_frames, 3|4, 3|4) stack of them. "
+            f"Got {transform.shape} instead."
+        )
+
     def _rotate_component(
         self,
         data_frame_name_xyz: Union[np.ndarray, List[float]],
         rotation_matrix: Union[np.ndarray, List[List[float]]],
     ) -> np.ndarray:
-        if isinstance(data_frame_name_xyz, list):
-            data_frame_name_xyz = np.array(data_frame_name_xyz)
         if isinstance(rotation_matrix, list):
             rotation_matrix = np.array(rotation_matrix)
 
-        if rotation_matrix.shape != (3, 3):
+        if rotation_matrix.shape[-2:] != (3, 3):
             raise ValueError(
                 f"Rotation matrix must be a 3x3 matrix. Got {rotation_matrix.shape} instead."
             )
+        return self._transform_component(data_frame_name_xyz, rotation_matrix)
+
+    def _transform_component(
+        self,
+        data_frame_name_xyz: Union[np.ndarray, List[float]],
+        transform: np.ndarray,
+        out: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Transform (frame, [name,] xyz) data by a 3x3/4x4 matrix or a per-frame stack of them.
+
+        Points are row vectors, so `R @ p` for every point is computed as `data @ R.T` in one `matmul`.
+        The result keeps the dtype of the data (i.e. float32 data stays float32) and is written into `out`,
+        which is allocated here if not provided.
+        """
+        if isinstance(data_frame_name_xyz, list):
+            data_frame_name_xyz = np.array(data_frame_name_xyz)
 
         if data_frame_name_xyz.shape[-1] == 2:
             print(f"2D data detected. Adding a third dimension with zeros.")
             data_frame_name_xyz = np.concatenate(
                 [
                     data_frame_name_xyz,
-                    np.zeros(
-                        (data_frame_name_xyz.shape[0], data_frame_name_xyz.shape[1], 1)
-                    ),
+                    np.zeros(data_frame_name_xyz.shape[:-1] + (1,), dtype=data_frame_name_xyz.dtype),
                 ],
-                axis=2,
+                axis=-1,
             )
 
-        rotated_data_frame_name_xyz = np.zeros(data_frame_name_xyz.shape)
-        for frame_number in range(data_frame_name_xyz.shape[0]):
-            if len(data_frame_name_xyz.shape) == 2:
-                rotated_data_frame_name_xyz[frame_number, :] = (
-                    rotation_matrix @ data_frame_name_xyz[frame_number, :]
-                )
-            elif len(data_frame_name_xyz.shape) == 3:
-                for trajectory_number in range(data_frame_name_xyz.shape[1]):
-                    rotated_data_frame_name_xyz[frame_number, trajectory_number, :] = (
-                        rotation_matrix
-                        @ data_frame_name_xyz[frame_number, trajectory_number, :]
-                    )
-        return rotated_data_frame_name_xyz
+        if data_frame_name_xyz.ndim not in [2, 3]:
+            raise ValueError(
+                f"Component data must have 2 or 3 dimensions. Got {data_frame_name_xyz.shape} instead."
+            )
+
+        dtype = data_frame_name_xyz.dtype if np.issubdtype(data_frame_name_xyz.dtype, np.floating) else np.float64
+        transform = np.asarray(transform, dtype=dtype)
+        per_frame = transform.ndim == 3
+
+        rotation = transform[..., :3, :3]
+        translation = transform[..., :3, 3] if transform.shape[-1] == 4 else None
+
+        if out is None:
+            out = np.empty(data_frame_name_xyz.shape, dtype=dtype)
+
+        rotation_transposed = np.swapaxes(rotation, -1, -2)
+        if data_frame_name_xyz.ndim == 2 and per_frame:
+            # (frame, xyz) with one matrix per frame -> treat each frame as a single row vector
+            np.matmul(data_frame_name_xyz[:, np.newaxis, :], rotation_transposed, out=out[:, np.newaxis, :])
+        else:
+            # (frame, name, xyz) @ (3, 3) or (frame, 3, 3) broadcast over the `name` axis
+            np.matmul(data_frame_name_xyz, rotation_transposed, out=out)
+
+        if translation is not None:
+            if per_frame and data_frame_name_xyz.ndim == 3:
+                out += translation[:, np.newaxis, :]
+            else:
+                out += translation
+
+        return out
 
     def apply_translations(
         self,
-        vectors: Union[List[np.ndarray], List[List[float]]],
+        vectors: Union[List[np.ndarray], List[List[float]], np.ndarray],
         component_name: Optional[str] = None,
     ):
+        """
+        Apply one translation vector per frame (i.e. `vectors[frame_number]` translates `frame_number` only)
+        """
+        vectors = np.asarray(vectors)
         if not len(vectors) == self.handler.number_of_frames:
             raise ValueError(
                 f"Number of vectors ({len(vectors)}) does not match number of frames ({self.handler.number_of_frames})."
             )
-        for frame_number, vector in enumerate(vectors):
-            self.apply_translation(
-                vector=vector, component_name=component_name, frame_number=frame_number
-            )
+        if vectors.shape[1:] != (3,):
+            raise ValueError(f"Vectors must have shape (number_of_frames, 3). Got {vectors.shape} instead.")
+
+        transforms = np.zeros((vectors.shape[0], 4, 4))
+        transforms[:, :3, :3] = np.eye(3)
+        transforms[:, :3, 3] = vectors
+        transforms[:, 3, 3] = 1
+        self.apply_transform(transform=transforms, component_name=component_name)
 
     def apply_translation(
         self,
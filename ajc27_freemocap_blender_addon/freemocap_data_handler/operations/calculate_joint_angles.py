@@ -0,0 +1,95 @@
+from pathlib import Path
+from typing import Dict, Union
+
+import numpy as np
+
+from ..utilities.file_writing import atomic_write, write_csv
+
+JOINT_ANGLES_FILE_STEM = "joint_angles"
+
+
+def calculate_joint_angles(trajectories: Dict[str, np.ndarray],
+                           joints_angle_points: Dict[str, Dict[str, str]]) -> Dict[str, np.ndarray]:
+    """
+    Calculate the angle at every joint in `joints_angle_points` (joint name -> {'parent': name, 'child': name}) on
+    every frame at once, from (frame, xyz) trajectories. Joints whose points have no trajectory are skipped.
+
+    Returns:
+    - `joint_names`: (joint,) names of the joints that were calculated
+    - `flexion_angles`: (frame, joint) angle between the joint->parent and joint->child vectors, in degrees [0, 180]
+    - `plane_normals`: (frame, joint, xyz) unit normal of the plane of the angle (parent vector x child vector), NaN
+      where the vectors are (nearly) parallel
+    - `arc_orientations`: (frame, joint, 3, 3) rotation matrices with the x axis along the parent vector and the z axis
+      along the plane normal, so the angle sweeps counter-clockwise from x around z (NaN where the normal is)
+    """
+    joint_names = [joint_name for joint_name, points in joints_angle_points.items()
+                   if joint_name in trajectories and points['parent'] in trajectories
+                   and points['child'] in trajectories]
+
+    def stack(names) -> np.ndarray:
+        return np.stack([np.asarray(trajectories[name], dtype=np.float64) for name in names], axis=1)
+
+    if len(joint_names) == 0:
+        number_of_frames = next(iter(trajectories.values())).shape[0] if trajectories else 0
+        return {
+            "joint_names": np.array([], dtype=str),
+            "flexion_angles": np.empty((number_of_frames, 0)),
+            "plane_normals": np.empty((number_of_frames, 0, 3)),
+            "arc_orientations": np.empty((number_of_frames, 0, 3, 3)),
+        }
+
+    joints = stack(joint_names)
+    parent_vectors = stack([joints_angle_points[name]['parent'] for name in joint_names]) - joints
+    child_vectors = stack([joints_angle_points[name]['child'] for name in joint_names]) - joints
+
+    cross_vectors = np.cross(parent_vectors, child_vectors)
+    cross_lengths = np.linalg.norm(cross_vectors, axis=-1, keepdims=True)
+    dot_products = np.einsum("fjx,fjx->fj", parent_vectors, child_vectors)
+    flexion_angles = np.degrees(np.arctan2(cross_lengths[..., 0], dot_products))
+
+    parent_lengths = np.linalg.norm(parent_vectors, axis=-1, keepdims=True)
+    child_lengths = np.linalg.norm(child_vectors, axis=-1, keepdims=True)
+    # (nearly) parallel vectors don't define a plane
+    degenerate = cross_lengths <= 1e-9 * parent_lengths * child_lengths
+    with np.errstate(invalid="ignore", divide="ignore"):
+        plane_normals = np.where(degenerate, np.nan, cross_vectors / cross_lengths)
+        x_axes = parent_vectors / parent_lengths
+    y_axes = np.cross(plane_normals, x_axes)
+
+    return {
+        "joint_names": np.array(joint_names),
+        "flexion_angles": flexion_angles,
+        "plane_normals": plane_normals,
+        "arc_orientations": np.stack([x_axes, y_axes, plane_normals], axis=-1),
+    }
+
+
+def save_joint_angles(joint_angles: Dict[str, np.ndarray],
+                      save_path: Union[str, Path],
+                      csv_precision: int = 6,
+                      compress_csv: bool = False):
+    """
+    Save the output of `calculate_joint_angles` to `save_path`: `npy/joint_angles.npz` (every array) and
+    `csv/joint_angles.csv` (one `[joint]_angle` column per joint, plus `[joint]_normal_x/y/z` columns)
+    """
+    save_path = Path(save_path)
+    (save_path / "npy").mkdir(parents=True, exist_ok=True)
+    (save_path / "csv").mkdir(parents=True, exist_ok=True)
+
+    npz_path = save_path / "npy" / f"{JOINT_ANGLES_FILE_STEM}.npz"
+    with atomic_write(npz_path) as file:
+        np.savez(file, **joint_angles)
+    print(f"Saved joint angles to {npz_path}")
+
+    joint_names = [str(name) for name in joint_angles["joint_names"]]
+    number_of_frames = joint_angles["flexion_angles"].shape[0]
+    header = ",".join([f"{name}_angle" for name in joint_names]
+                      + [f"{name}_normal_{axis}" for name in joint_names for axis in "xyz"])
+    csv_path = save_path / "csv" / f"{JOINT_ANGLES_FILE_STEM}.csv{'.gz' if compress_csv else ''}"
+    write_csv(csv_path,
+              np.concatenate([joint_angles["flexion_angles"],
+                              joint_angles["plane_normals"].reshape(number_of_frames, -1)], axis=1),
+              header=header,
+              precision=csv_precision,
+              compress=compress_csv)
+    print(f"Saved joint angles to {csv_path}")
@@ -1,47 +1,56 @@
-import math
-import statistics
-from typing import Dict, Any
+from typing import Dict, Sequence
 
 import numpy as np
 
 from ajc27_freemocap_blender_addon.data_models.bones.bone_definitions import BoneDefinition
 
+BONE_LENGTH_PERCENTILES = (5, 25, 75, 95)
 
-def calculate_bone_length_statistics(trajectories: Dict[str, np.ndarray],
-                                     bone_definitions: Dict[str, BoneDefinition]):
-    print('Calculating bone length statistics...')
 
-    # Reset the lengths list for every virtual bone
-    for bone in bone_definitions:
-        bone_definitions[bone].lengths = []
+def calculate_bone_lengths(trajectories: Dict[str, np.ndarray],
+                           bone_definitions: Dict[str, BoneDefinition]) -> np.ndarray:
+    """
+    Calculate the length of every bone on every frame, returned as a (frames, bones) array with one column per bone in
+    `bone_definitions` order. Frames where the head or tail trajectory is NaN have a NaN length.
+    """
+    marker_names = list(dict.fromkeys([name
+                                       for bone in bone_definitions.values()
+                                       for name in (bone.head, bone.tail)]))
+    name_to_index = {name: index for index, name in enumerate(marker_names)}
+    frame_marker_xyz = np.stack([trajectories[name] for name in marker_names], axis=1)
+
+    head_indices = np.array([name_to_index[bone.head] for bone in bone_definitions.values()])
+    tail_indices = np.array([name_to_index[bone.tail] for bone in bone_definitions.values()])
 
-    bone_definitions['hand.R'].tail = 'right_hand_middle'
-    bone_definitions['hand.L'].tail = 'left_hand_middle'
+    bone_vectors = frame_marker_xyz[:, tail_indices, :] - frame_marker_xyz[:, head_indices, :]
+    return np.linalg.norm(bone_vectors, axis=2)
 
-    # Iterate through the empty_positions dictionary and calculate the distance between the head and tail and append it to the lengths list
-    for frame_number in range(0, trajectories['hips_center'].shape[0]):
-        # Iterate through each bone
-        for bone_name, bone_definition in bone_definitions.items():
-            # Calculate the length of the bone for this frame
-            head_name = bone_definition.head
-            tail_name = bone_definition.tail
 
-            head_pos = list(trajectories[head_name][frame_number, :])
-            tail_pos = list(trajectories[tail_name][frame_number, :])
+def calculate_bone_length_statistics(trajectories: Dict[str, np.ndarray],
+                                     bone_definitions: Dict[str, BoneDefinition],
+                                     percentiles: Sequence[float] = BONE_LENGTH_PERCENTILES):
+    print('Calculating bone length statistics...')
 
-            bone_definition.lengths.append(math.dist(head_pos, tail_pos))
+    frame_bone_lengths = calculate_bone_lengths(trajectories=trajectories,
+                                                bone_definitions=bone_definitions)
 
     print(f'Bone lengths calculated successfully!\n bones: \n{list(bone_definitions.keys())}')
-    # Update the length median and stdev values for each bone
-    for name, bone in bone_definitions.items():
-        # print(f'Calculating median and stdev for bone: {name}...')
-        # Exclude posible length NaN (produced by an empty with NaN values as position) values from the median and standard deviation
-        bone.median = statistics.median(
-            [length for length in bone.lengths if not math.isnan(length)])
-        # virtual_bone['median'] = statistics.median(virtual_bone['lengths'])
-        bone.stdev = statistics.stdev(
-            [length for length in bone.lengths if not math.isnan(length)])
-        # virtual_bone['stdev'] = statistics.stdev(virtual_bone['lengths'])
+
+    # Exclude NaN lengths (produced by a trajectory with NaN values as position) from the statistics
+    medians = np.nanmedian(frame_bone_lengths, axis=0)
+    stdevs = np.nanstd(frame_bone_lengths, axis=0, ddof=1)
+    median_absolute_deviations = np.nanmedian(np.abs(frame_bone_lengths - medians), axis=0)
+    bone_percentiles = np.nanpercentile(frame_bone_lengths, q=list(percentiles), axis=0)
+
+    # Per-frame lengths are kept as float32 to halve their footprint, the statistics are computed at full precision
+    frame_bone_lengths = frame_bone_lengths.astype(np.float32)
+    for bone_number, bone in enumerate(bone_definitions.values()):
+        bone.lengths = frame_bone_lengths[:, bone_number]
+        bone.median = float(medians[bone_number])
+        bone.stdev = float(stdevs[bone_number])
+        bone.median_absolute_deviation = float(median_absolute_deviations[bone_number])
+        bone.percentiles = {percentile: float(bone_percentiles[percentile_number, bone_number])
+                            for percentile_number, percentile in enumerate(percentiles)}
 
     print(f'Bone length statistics calculated successfully!')
 
@@ -1,10 +1,10 @@
-from copy import deepcopy
 from typing import Dict
 
 import numpy as np
 
 from ajc27_freemocap_blender_addon.data_models.bones.bone_definitions import BoneDefinition, get_bone_definitions
 from ajc27_freemocap_blender_addon.data_models.mediapipe_names.mediapipe_heirarchy import get_mediapipe_hierarchy
+from ajc27_freemocap_blender_addon.data_models.skeleton_topology import get_skeleton_topology
 from .calculate_body_dimensions import calculate_body_dimensions
 from ..enforce_rigid_bodies.calculate_bone_length_statistics import calculate_bone_length_statistics
 from ...handler import FreemocapDataHandler
@@ -14,8 +14,6 @@ def enforce_rigid_bodies(handler: FreemocapDataHandler) -> FreemocapDataHandler:
     print(
         'Enforce "Rigid Bodies Assumption" by altering bone lengths to ensure they are the same length on each frame...')
     original_trajectories = handler.trajectories
-    updated_trajectories = deepcopy(original_trajectories)
-    mediapipe_heirarchy = get_mediapipe_hierarchy()
 
     # Update the information of the virtual bones
     bones = calculate_bone_length_statistics(trajectories=original_trajectories,
@@ -24,41 +22,35 @@ def enforce_rigid_bodies(handler: FreemocapDataHandler) -> FreemocapDataHandler:
     # Print the current bones length median, standard deviation and coefficient of variation
     log_bone_statistics(bones=bones, type='original')
 
-    # Iterate through the lengths array of each bone and check if the length is outside the interval defined by x*stdev with x as a factor
-    # If the bone length is outside the interval, adjust the coordinates of the tail empty and its children so the new bone length is at the border of the interval
-
-    for name, bone in bones.items():
-        # print(f"Enforcing rigid length for bone: {name}...")
-
-        desired_length = bone.median
-
-        head_name = bone.head
-        tail_name = bone.tail
-
-        for frame_number, raw_length in enumerate(bone.lengths):
-            if np.isnan(raw_length) or raw_length == 0:
-                continue
-
-            head_position = original_trajectories[head_name][frame_number, :]
-            tail_position = original_trajectories[tail_name][frame_number, :]
-
-            bone_vector = tail_position - head_position
-
-            # Get the normalized bone vector by dividing the bone_vector by its length
-            try:
-                bone_vector_norm = bone_vector / raw_length
-            except ZeroDivisionError:
-                raw_length = 0.0001
-                bone_vector_norm = bone_vector / raw_length
-
-            # Calculate the new tail position delta by multiplying the normalized bone vector by the difference of desired_length and original_length
-            position_delta = bone_vector_norm * (desired_length - raw_length)
-
-            updated_trajectories = translate_trajectory_and_its_children(name=tail_name,
-                                                                         position_delta=position_delta,
-                                                                         frame_number=frame_number,
-                                                                         updated_trajectories=updated_trajectories,
-                                                                         hierarchy=mediapipe_heirarchy)
+    # The compiled topology orders the markers parents-before-children, so every bone's correction can be propagated
+    # down its subtree for all frames at once
+    topology = get_skeleton_topology()
+    trajectory_names = topology.marker_names
+    original_frame_name_xyz = topology.stack_trajectories(original_trajectories)
+
+    # For every bone and frame, move the tail (and its children) along the bone vector so the bone length becomes the
+    # median length. Frames where the bone length is NaN or zero are left untouched
+    bone_indices = topology.bone_indices(bones.keys())
+    head_xyz = original_frame_name_xyz[:, topology.bone_head_indices[bone_indices], :]
+    tail_indices = topology.bone_tail_indices[bone_indices]
+    tail_xyz = original_frame_name_xyz[:, tail_indices, :]
+    bone_vectors = tail_xyz - head_xyz
+    raw_lengths = np.linalg.norm(bone_vectors, axis=2)
+    desired_lengths = np.array([bone.median for bone in bones.values()])
+
+    valid = ~np.isnan(raw_lengths) & (raw_lengths != 0)
+    safe_lengths = np.where(valid, raw_lengths, 1.0)
+    position_deltas = bone_vectors / safe_lengths[:, :, np.newaxis] * (desired_lengths - safe_lengths)[:, :, np.newaxis]
+    position_deltas[~valid] = 0
+
+    frame_name_delta = np.zeros_like(original_frame_name_xyz)
+    np.add.at(frame_name_delta, (slice(None), tail_indices), position_deltas)
+    frame_name_delta = topology.propagate_to_children(frame_marker_delta=frame_name_delta)
+
+    updated_frame_name_xyz = original_frame_name_xyz + frame_name_delta
+    updated_trajectories = dict(original_trajectories)
+    updated_trajectories.update({name: updated_frame_name_xyz[:, index, :]
+                                 for index, name in enumerate(trajectory_names)})
 
     print('Bone lengths enforced successfully!')
 
@@ -69,8 +61,8 @@ def enforce_rigid_bodies(handler: FreemocapDataHandler) -> FreemocapDataHandler:
     log_bone_statistics(bones=updated_bones, type='updated')
 
     print('Updating freemocap data handler with the new trajectories...')
-    for name, trajectory in updated_trajectories.items():
-        handler.set_trajectory(name=name, data=trajectory)
+    for index, name in enumerate(trajectory_names):
+        handler.set_trajectory(name=name, data=updated_frame_name_xyz[:, index, :])
 
     handler.mark_processing_stage(name='enforced_rigid_bones',
                                   metadata={"bone_data": updated_bones,
@@ -80,30 +72,6 @@ def enforce_rigid_bodies(handler: FreemocapDataHandler) -> FreemocapDataHandler:
     return handler
 
 
-def translate_trajectory_and_its_children(name: str,
-                                          position_delta: np.ndarray,
-                                          frame_number: int,
-                                          updated_trajectories: Dict[str, np.ndarray],
-                                          hierarchy: Dict[str, Dict[str, str]]) -> Dict[str, np.ndarray]:
-    # recursively translate the tail empty and its children by the position delta.
-    try:
-        updated_trajectories[name][frame_number, :] = updated_trajectories[name][frame_number, :] + position_delta
-
-        if name in hierarchy.keys():
-            for child_name in hierarchy[name]['children']:
-                translate_trajectory_and_its_children(name=child_name,
-                                                      position_delta=position_delta,
-                                                      frame_number=frame_number,
-                                                      updated_trajectories=updated_trajectories,
-                                                      hierarchy=hierarchy)
-    except Exception as e:
-        print(f"Error while adjusting trajectory `{name}` and its children:\n error:\n {e}")
-        print(e)
-        raise Exception(f"Error while adjusting trajectory and its children: {e}")
-
-    return updated_trajectories
-
-
 def log_bone_statistics(bones: Dict[str, BoneDefinition], type: str):
     log_string = f'[{type}] Bone Length Statistics:\n'
     header_string = f"{'BONE':<15} {'MEDIAN (cm)':>12} {'STDEV (cm)':>12} {'CV (%)':>12}"
@@ -0,0 +1,260 @@
+import warnings
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from ..handler import FreemocapDataHandler
+
+# scale factor that makes the median absolute deviation a consistent estimator of the standard deviation
+MAD_TO_STANDARD_DEVIATION = 1.4826
+
+
+def reduce_shakiness(handler: 'FreemocapDataHandler',
+                     recording_fps: float = 30.0,
+                     repair_spikes: bool = False,
+                     spike_threshold: float = 6.0,
+                     minimum_spike_acceleration: float = 10.0,
+                     spike_return_ratio: float = 0.5,
+                     maximum_repair_passes: int = 3,
+                     low_pass_cutoff_frequency: Optional[float] = None,
+                     low_pass_filter_order: int = 4) -> Dict[str, List[int]]:
+    """
+    Repair the spikes (single frame jumps) in every trajectory and/or low-pass filter them, all in numpy.
+
+    A sample is a spike if it jumps out and back: its acceleration magnitude is a local maximum above the trajectory's
+    robust threshold (`median + spike_threshold * MAD` of its acceleration magnitudes, but at least
+    `minimum_spike_acceleration` m/s^2), its acceleration points against the acceleration of both neighbour frames, and
+    the neighbour frames are closer to each other than `spike_return_ratio` times the jump to the sample. Fast real
+    motion (e.g. a reach) has large accelerations too, but it doesn't come back. Spikes are replaced by linear
+    interpolation between their neighbours, repeated up to `maximum_repair_passes` times (repairing a spike can uncover
+    one next to it).
+
+    If `low_pass_cutoff_frequency` (Hz) is set, the trajectories are then zero-phase low-pass filtered (Butterworth
+    `filtfilt` if scipy is installed, a Gaussian filter with the same cutoff otherwise).
+
+    Marks the `reduced_shakiness` processing stage and returns the repaired frames of each trajectory that had any.
+    """
+    print("Reducing shakiness (repairing spikes in the trajectories)...")
+    trajectories = handler.trajectories
+    trajectory_names = list(trajectories.keys())
+    if len(trajectory_names) == 0:
+        return {}
+
+    frame_name_xyz = np.stack([trajectories[name] for name in trajectory_names], axis=1).astype(np.float64)
+    repaired = np.zeros(frame_name_xyz.shape[:2], dtype=bool)
+    if repair_spikes:
+        frame_name_xyz, repaired = repair_trajectory_spikes(frame_name_xyz=frame_name_xyz,
+                                                            recording_fps=recording_fps,
+                                                            spike_threshold=spike_threshold,
+                                                            minimum_spike_acceleration=minimum_spike_acceleration,
+                                                            spike_return_ratio=spike_return_ratio,
+                                                            maximum_passes=maximum_repair_passes)
+
+    if low_pass_cutoff_frequency:
+        frame_name_xyz = low_pass_filter(frame_name_xyz=frame_name_xyz,
+                                         recording_fps=recording_fps,
+                                         cutoff_frequency=low_pass_cutoff_frequency,
+                                         order=low_pass_filter_order)
+
+    # the trajectories are views into the handler's data, write the results in place
+    changed = repaired.any(axis=0) if not low_pass_cutoff_frequency else np.ones(len(trajectory_names), dtype=bool)
+    for index in np.flatnonzero(changed):
+        trajectories[trajectory_names[index]][...] = frame_name_xyz[:, index, :]
+
+    report = {trajectory_names[index]: np.flatnonzero(repaired[:, index]).tolist()
+              for index in np.flatnonzero(repaired.any(axis=0))}
+    print(f"Repaired {int(repaired.sum())} spike samples in {len(report)} trajectories")
+    for name, frames in report.items():
+        print(f"    {name}: {len(frames)} frames")
+
+    handler.mark_processing_stage("reduced_shakiness",
+                                  metadata={"reduce_shakiness": {
+                                      "recording_fps": recording_fps,
+                                      "repair_spikes": repair_spikes,
+                                      "spike_threshold": spike_threshold,
+                                      "minimum_spike_acceleration": minimum_spike_acceleration,
+                                      "spike_return_ratio": spike_return_ratio,
+                                      "low_pass_cutoff_frequency": low_pass_cutoff_frequency,
+                                      "repaired_frames": report,
+                                  }})
+    return report
+
+
+def calculate_derivatives(frame_name_xyz: np.ndarray, recording_fps: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Central difference velocity (m/s) and acceleration (m/s^2) magnitudes of (frame, name, xyz) data, as
+    (frame, name) arrays (NaN on the first and last frame)
+    """
+    velocities = np.full(frame_name_xyz.shape[:2], np.nan)
+    accelerations = np.full(frame_name_xyz.shape[:2], np.nan)
+    if frame_name_xyz.shape[0] >= 3:
+        velocities[1:-1] = np.linalg.norm(frame_name_xyz[2:] - frame_name_xyz[:-2], axis=-1) * recording_fps / 2
+        accelerations[1:-1] = np.linalg.norm(frame_name_xyz[2:] - 2 * frame_name_xyz[1:-1] + frame_name_xyz[:-2],
+                                             axis=-1) * recording_fps ** 2
+    return velocities, accelerations
+
+
+def detect_spikes(frame_name_xyz: np.ndarray,
+                  recording_fps: float,
+                  spike_threshold: float = 6.0,
+                  minimum_spike_acceleration: float = 10.0,
+                  spike_return_ratio: float = 0.5) -> np.ndarray:
+    """
+    Flag the (frame, name) samples that jump out and back: their acceleration magnitude is a local maximum above the
+    robust threshold of their trajectory, reverses against both neighbours' accelerations, and the neighbours nearly
+    meet (see `reduce_shakiness`)
+    """
+    _, accelerations = calculate_derivatives(frame_name_xyz=frame_name_xyz, recording_fps=recording_fps)
+    if frame_name_xyz.shape[0] < 3:
+        return np.zeros(frame_name_xyz.shape[:2], dtype=bool)
+
+    with warnings.catch_warnings():
+        # trajectories without any data (e.g. hands out of view) make `np.nanmedian` warn
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        medians = np.nanmedian(accelerations, axis=0)
+        deviations = np.nanmedian(np.abs(accelerations - medians), axis=0) * MAD_TO_STANDARD_DEVIATION
+        thresholds = np.fmax(medians + spike_threshold * deviations, minimum_spike_acceleration)
+
+        # a spike also raises the acceleration of the frames next to it (half as much), keep only the peak
+        padded = np.pad(accelerations, ((1, 1), (0, 0)), constant_values=-np.inf)
+        padded[np.isnan(padded)] = -np.inf
+        is_peak = (padded[1:-1] >= padded[:-2]) & (padded[1:-1] >= padded[2:])
+
+    # the spike shape: the acceleration flips sign on both sides (out -> back -> settle) ...
+    acceleration_vectors = np.full(frame_name_xyz.shape, np.nan)
+    acceleration_vectors[1:-1] = frame_name_xyz[2:] - 2 * frame_name_xyz[1:-1] + frame_name_xyz[:-2]
+    reverses = np.zeros(frame_name_xyz.shape[:2], dtype=bool)
+    with np.errstate(invalid="ignore"):
+        reverses[2:-2] = ((np.sum(acceleration_vectors[2:-2] * acceleration_vectors[1:-3], axis=-1) < 0)
+                          & (np.sum(acceleration_vectors[2:-2] * acceleration_vectors[3:-1], axis=-1) < 0))
+
+    # ... and the trajectory comes back: the neighbours are much closer to each other than to the sample
+    returns = np.zeros(frame_name_xyz.shape[:2], dtype=bool)
+    jumps_out = np.linalg.norm(frame_name_xyz[1:-1] - frame_name_xyz[:-2], axis=-1)
+    jumps_back = np.linalg.norm(frame_name_xyz[2:] - frame_name_xyz[1:-1], axis=-1)
+    net_displacements = np.linalg.norm(frame_name_xyz[2:] - frame_name_xyz[:-2], axis=-1)
+    with np.errstate(invalid="ignore"):
+        returns[1:-1] = net_displacements < spike_return_ratio * np.fmin(jumps_out, jumps_back)
+
+    with np.errstate(invalid="ignore"):
+        return (accelerations > thresholds) & is_peak & reverses & returns
+
+
+def repair_trajectory_spikes(frame_name_xyz: np.ndarray,
+                             recording_fps: float,
+                             spike_threshold: float = 6.0,
+                             minimum_spike_acceleration: float = 10.0,
+                             spike_return_ratio: float = 0.5,
+                             maximum_passes: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Replace the spikes in (frame, name, xyz) data by interpolating their neighbours, returns the repaired data and the
+    (frame, name) mask of repaired samples
+    """
+    frame_name_xyz = np.array(frame_name_xyz, dtype=np.float64)
+    repaired = np.zeros(frame_name_xyz.shape[:2], dtype=bool)
+    for _ in range(maximum_passes):
+        spikes = detect_spikes(frame_name_xyz=frame_name_xyz,
+                               recording_fps=recording_fps,
+                               spike_threshold=spike_threshold,
+                               minimum_spike_acceleration=minimum_spike_acceleration,
+                               spike_return_ratio=spike_return_ratio)
+        if not spikes.any():
+            break
+        frame_name_xyz[spikes] = np.nan
+        frame_name_xyz = interpolate_gaps(frame_name_xyz, mask=spikes)
+        repaired |= spikes
+    return frame_name_xyz, repaired
+
+
+def interpolate_gaps(frame_name_xyz: np.ndarray, mask: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Linearly interpolate the NaN samples of (frame, ...) data along the frames, for all trajectories at once.
+
+    Only the samples in `mask` (same shape as the data, or its leading dimensions) are filled if it's given. Gaps at the
+    start or end of a trajectory take the closest valid value.
+    """
+    data = np.array(frame_name_xyz, dtype=np.float64)
+    if data.shape[0] == 0:
+        return data
+    missing = np.isnan(data)
+    if mask is not None:
+        mask = np.broadcast_to(np.reshape(mask, mask.shape + (1,) * (data.ndim - mask.ndim)), data.shape)
+        missing &= mask
+    if not missing.any():
+        return data
+
+    frame_indices = np.arange(data.shape[0]).reshape((-1,) + (1,) * (data.ndim - 1))
+    valid = ~np.isnan(data)
+    previous_valid = np.maximum.accumulate(np.where(valid, frame_indices, -1), axis=0)
+    next_valid = np.flip(np.minimum.accumulate(np.flip(np.where(valid, frame_indices, data.shape[0]), axis=0),
+                                               axis=0), axis=0)
+
+    has_previous = previous_valid >= 0
+    has_next = next_valid < data.shape[0]
+    previous_values = np.take_along_axis(data, previous_valid.clip(0, data.shape[0] - 1), axis=0)
+    next_values = np.take_along_axis(data, next_valid.clip(0, data.shape[0] - 1), axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weights = (frame_indices - previous_valid) / (next_valid - previous_valid)
+    interpolated = np.where(has_previous & has_next,
+                            previous_values + weights * (next_values - previous_values),
+                            np.where(has_previous, previous_values, next_values))
+
+    data[missing] = interpolated[missing]
+    return data
+
+
+def low_pass_filter(frame_name_xyz: np.ndarray,
+                    recording_fps: float,
+                    cutoff_frequency: float,
+                    order: int = 4) -> np.ndarray:
+    """
+    Zero-phase low-pass filter (frame, ...) data along the frames. NaN samples are interpolated for filtering and
+    stay NaN in the output.
+    """
+    data = np.asarray(frame_name_xyz, dtype=np.float64)
+    nans = np.isnan(data)
+    filled = interpolate_gaps(data)
+    filled[np.isnan(filled)] = 0  # trajectories without any data
+
+    try:
+        from scipy.signal import butter, filtfilt
+    except ImportError:
+        butter = filtfilt = None
+
+    normalized_cutoff = cutoff_frequency / (recording_fps / 2)
+    if filtfilt is not None and normalized_cutoff < 1 and data.shape[0] > 3 * (order + 1):
+        b, a = butter(order, normalized_cutoff, btype="low")
+        filtered = filtfilt(b, a, filled, axis=0)
+    else:
+        filtered = gaussian_low_pass_filter(filled, recording_fps=recording_fps, cutoff_frequency=cutoff_frequency)
+
+    filtered[nans] = np.nan
+    return filtered
+
+
+def gaussian_low_pass_filter(data: np.ndarray, recording_fps: float, cutoff_frequency: float) -> np.ndarray:
+    """
+    Numpy-only zero-phase low-pass filter: a Gaussian smoothing along the first axis whose -3 dB point is at
+    `cutoff_frequency`, with mirrored edges
+    """
+    sigma_frames = np.sqrt(np.log(2)) / (2 * np.pi * cutoff_frequency) * recording_fps
+    radius = int(np.ceil(4 * sigma_frames))
+    if radius == 0 or data.shape[0] < 2:
+        return np.array(data, dtype=np.float64)
+
+    offsets = np.arange(-radius, radius + 1)
+    kernel = np.exp(-0.5 * (offsets / sigma_frames) ** 2)
+    kernel /= kernel.sum()
+
+    pad = min(radius, data.shape[0] - 1)
+    padded = np.pad(data, [(pad, pad)] + [(0, 0)] * (data.ndim - 1), mode="reflect")
+    if pad < radius:
+        padded = np.pad(padded, [(radius - pad, radius - pad)] + [(0, 0)] * (data.ndim - 1), mode="edge")
+
+    filtered = np.zeros(data.shape, dtype=np.float64)
+    for offset_index, weight in enumerate(kernel):
+        filtered += weight * padded[offset_index:offset_index + data.shape[0]]
+    return filtered
+
@@ -0,0 +1,119 @@
+from typing import Dict, Optional, TYPE_CHECKING
+
+import numpy as np
+
+from .fix_hand_data import fix_hand_data
+
+if TYPE_CHECKING:
+    from ..handler import FreemocapDataHandler
+
+ORIGIN_REFERENCE = "hips_center"
+X_AXIS_REFERENCE = "left_hip"
+
+
+def reorient_data(handler: 'FreemocapDataHandler',
+                  z_align_reference: str = "left_knee",
+                  z_align_angle_offset: float = 0.0,
+                  ground_reference: str = "left_foot_index",
+                  z_translation_offset: float = 0.0,
+                  correct_fingers: bool = True,
+                  frame: Optional[int] = None) -> np.ndarray:
+    """
+    Move the data to a body-aligned reference frame, as one transform of the whole (frame, name, xyz) arrays:
+
+    1. the origin goes to `hips_center`, with the x axis pointing at `left_hip`
+    2. the frame rotates about the x axis so the z axis crosses `z_align_reference`, plus `z_align_angle_offset` degrees
+    3. the origin slides along the z axis to the height of `ground_reference`, plus `z_translation_offset`
+
+    The references are taken on `frame` (by default the first frame on which all of them have data). If
+    `correct_fingers` is set, the hand data is then translated so the hand wrists sit on the body wrists.
+
+    Marks the `reoriented` processing stage and returns the 4x4 transform applied to the data.
+    """
+    trajectories = handler.trajectories
+    reference_names = [ORIGIN_REFERENCE, X_AXIS_REFERENCE, z_align_reference, ground_reference]
+    missing_names = [name for name in reference_names if name not in trajectories]
+    if missing_names:
+        raise ValueError(f"Cannot reorient the data, missing reference trajectories: {missing_names}")
+
+    if frame is None:
+        frame = first_complete_frame({name: trajectories[name] for name in reference_names})
+
+    transform = calculate_reorientation_transform(
+        reference_points={name: trajectories[name][frame] for name in reference_names},
+        z_align_reference=z_align_reference,
+        z_align_angle_offset=z_align_angle_offset,
+        ground_reference=ground_reference,
+        z_translation_offset=z_translation_offset)
+
+    print(f"Reorienting the data using frame {frame}")
+    handler.transform(transform=transform)
+    handler.mark_processing_stage("reoriented",
+                                  metadata={"reorientation": {
+                                      "frame": int(frame),
+                                      "z_align_reference": z_align_reference,
+                                      "z_align_angle_offset": z_align_angle_offset,
+                                      "ground_reference": ground_reference,
+                                      "z_translation_offset": z_translation_offset,
+                                      "transform": transform.tolist(),
+                                  }})
+
+    if correct_fingers:
+        fix_hand_data(handler=handler)
+
+    return transform
+
+
+def calculate_reorientation_transform(reference_points: Dict[str, np.ndarray],
+                                      z_align_reference: str,
+                                      z_align_angle_offset: float,
+                                      ground_reference: str,
+                                      z_translation_offset: float) -> np.ndarray:
+    """
+    The 4x4 transform that takes points to the reference frame described in `reorient_data`, from the xyz location of
+    each reference on a single frame
+    """
+    origin = np.asarray(reference_points[ORIGIN_REFERENCE], dtype=np.float64)
+
+    # yaw so the x axis is above/below the x axis reference, then pitch so it crosses it
+    x_reference = np.asarray(reference_points[X_AXIS_REFERENCE], dtype=np.float64) - origin
+    yaw = np.arctan2(x_reference[1], x_reference[0])
+    pitch = np.arctan2(x_reference[2], np.linalg.norm(x_reference[:2]))
+    rotation = _rotation_about_z(yaw) @ _rotation_about_y(-pitch)
+
+    # roll about the new x axis so the z axis crosses the z align reference (on either side of the origin)
+    z_reference = rotation.T @ (np.asarray(reference_points[z_align_reference], dtype=np.float64) - origin)
+    roll = np.arctan(z_reference[1] / z_reference[2])
+    rotation = rotation @ _rotation_about_x(-(roll + np.radians(z_align_angle_offset)))
+
+    # slide the origin along its z axis to the ground reference
+    ground_height = (rotation.T @ (np.asarray(reference_points[ground_reference], dtype=np.float64) - origin))[2]
+    origin = origin + rotation[:, 2] * (ground_height + z_translation_offset)
+
+    # the data moves by the inverse of the new origin's transform
+    transform = np.eye(4)
+    transform[:3, :3] = rotation.T
+    transform[:3, 3] = -rotation.T @ origin
+    return transform
+
+
+def first_complete_frame(trajectories: Dict[str, np.ndarray]) -> int:
+    valid = np.all([~np.isnan(trajectory).any(axis=-1) for trajectory in trajectories.values()], axis=0)
+    if not valid.any():
+        raise ValueError(f"No frame has data for all of {list(trajectories.keys())}")
+    return int(np.argmax(valid))
+
+
+def _rotation_about_x(angle: float) -> np.ndarray:
+    cosine, sine = np.cos(angle), np.sin(angle)
+    return np.array([[1, 0, 0], [0, cosine, -sine], [0, sine, cosine]])
+
+
+def _rotation_about_y(angle: float) -> np.ndarray:
+    cosine, sine = np.cos(angle), np.sin(angle)
+    return np.array([[cosine, 0, sine], [0, 1, 0], [-sine, 0, cosine]])
+
+
+def _rotation_about_z(angle: float) -> np.ndarray:
+    cosine, sine = np.cos(angle), np.sin(angle)
+    return np.array([[cosine, -sine, 0], [sine, cosine, 0], [0, 0, 1]])
@@ -0,0 +1,151 @@
+import gzip
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator, Union
+
+import numpy as np
+
+# number of values formatted at once when writing csv files, bounds the memory used by the formatter
+CSV_VALUES_PER_CHUNK = 2 ** 20
+
+_INT64_LIMIT = 2 ** 62
+
+
+@contextmanager
+def atomic_write(path: Union[str, Path]) -> Iterator[BinaryIO]:
+    """
+    Open `path` for binary writing via a temporary file that is renamed into place once writing succeeds, so a crash
+    never leaves a half-written file behind
+    """
+    path = Path(path)
+    temporary_path = path.with_name(f".{path.name}.tmp")
+    try:
+        with open(str(temporary_path), "wb") as file:
+            yield file
+        os.replace(str(temporary_path), str(path))
+    except BaseException:
+        if temporary_path.exists():
+            temporary_path.unlink()
+        raise
+
+
+def write_csv(path: Union[str, Path],
+              data: np.ndarray,
+              header: str = "",
+              precision: int = 6,
+              compress: bool = False,
+              comments: str = "# "):
+    """
+    Write a 2D array as a fixed-precision csv file (atomically, optionally gzipped).
+
+    Same output as `np.savetxt(..., delimiter=",", fmt=f"%.{precision}f", header=header, comments=comments)`, but the
+    numbers are formatted by `format_fixed_precision` in numpy rather than one Python string conversion per value.
+    """
+    data = np.asarray(data)
+    if data.ndim == 1:
+        data = data[:, np.newaxis]
+    if data.ndim != 2:
+        raise ValueError(f"Data should have 2 dimensions (rows, columns). Got {data.shape} instead.")
+
+    rows_per_chunk = max(1, CSV_VALUES_PER_CHUNK // max(1, data.shape[1]))
+
+    with atomic_write(path) as file:
+        stream = gzip.GzipFile(fileobj=file, mode="wb", compresslevel=6) if compress else file
+        try:
+            if header:
+                stream.write(f"{comments}{header}\n".encode())
+            if data.shape[1] == 0:
+                stream.write(b"\n" * data.shape[0])
+                return
+            for start in range(0, data.shape[0], rows_per_chunk):
+                stream.write(format_fixed_precision(data[start:start + rows_per_chunk], precision=precision))
+        finally:
+            if compress:
+                stream.close()
+
+
+def format_fixed_precision(rows: np.ndarray, precision: int = 6, delimiter: str = ",") -> bytes:
+    """
+    Format a 2D array as delimited text lines, every value as `f"{value:.{precision}f}"`.
+
+    The digits are built as a (character, row, column) uint8 array with integer arithmetic, then blank padding is
+    squeezed out - so the whole chunk is formatted by a handful of numpy operations (which also release the GIL, letting
+    several files be formatted in parallel threads). Values are rounded like `%`-formatting does (see `_round_scaled`).
+    """
+    rows = np.asarray(rows, dtype=np.float64)
+    finite = np.isfinite(rows)
+    values = np.where(finite, rows, 0.0)
+    scale = 10 ** precision
+
+    if rows.size and np.abs(values).max() * scale >= _INT64_LIMIT:
+        # too large for integer formatting, fall back to Python string formatting
+        row_format = delimiter.join([f"%.{precision}f"] * rows.shape[1]) + "\n"
+        return ((row_format * rows.shape[0]) % tuple(rows.ravel().tolist())).encode()
+
+    integer_part, fraction_part = np.divmod(_round_scaled(np.abs(values), precision=precision), scale)
+    integer_digits = len(str(int(integer_part.max()))) if rows.size else 1
+    if not finite.all():
+        # make room for `-inf`
+        integer_digits = max(integer_digits, 3)
+    if integer_part.size and integer_part.max() < np.iinfo(np.int32).max:
+        # int32 division is a lot faster than int64
+        integer_part = integer_part.astype(np.int32)
+    if scale < np.iinfo(np.int32).max:
+        fraction_part = fraction_part.astype(np.int32)
+
+    point = 1 + integer_digits
+    width = point + (1 + precision if precision > 0 else 0) + 1
+    blank = np.uint8(ord(" "))
+    characters = np.empty((width,) + rows.shape, dtype=np.uint8)
+
+    # integer digits, right aligned, then leading zeros blanked and the sign put in front of the first digit
+    _write_digits(characters, start=1, number=integer_part, digits=integer_digits)
+    sign = np.where(np.signbit(values), np.uint8(ord("-")), blank)
+    for position in range(integer_digits):
+        upper = 10 ** (integer_digits - position)
+        lower = upper // 10 if position < integer_digits - 1 else 0
+        characters[position] = np.where(integer_part >= upper,
+                                        characters[position],
+                                        np.where(integer_part >= lower, sign, blank))
+
+    if precision > 0:
+        characters[point] = ord(".")
+        _write_digits(characters, start=point + 1, number=fraction_part, digits=precision)
+
+    if not finite.all():
+        for text, mask in [(b"nan", np.isnan(rows)), (b"inf", rows == np.inf), (b"-inf", rows == -np.inf)]:
+            characters[:-1, mask] = blank
+            for offset, character in enumerate(text):
+                characters[width - 1 - len(text) + offset, mask] = character
+
+    characters[-1] = ord(delimiter)
+    characters[-1, :, -1] = ord("\n")
+
+    text = np.ascontiguousarray(np.moveaxis(characters, 0, -1)).reshape(-1)
+    return text[text != blank].tobytes()
+
+
+def _round_scaled(absolute_values: np.ndarray, precision: int) -> np.ndarray:
+    """
+    `absolute_values * 10 ** precision` rounded to int64 from the exact decimal value of each float, like
+    `f"{value:.{precision}f}"` does.
+
+    The float product is itself rounded, so values whose product lands within a few ulps of a .5 tie can round either
+    way - only those are formatted by Python to get their digits, the rest are rounded in numpy.
+    """
+    scaled = absolute_values * 10 ** precision
+    rounded = np.rint(scaled).astype(np.int64)
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) <= 4 * np.spacing(scaled)
+    if near_tie.any():
+        rounded[near_tie] = [int(f"{value:.{precision}f}".replace(".", ""))
+                             for value in absolute_values[near_tie].tolist()]
+    return rounded
+
+
+def _write_digits(characters: np.ndarray, start: int, number: np.ndarray, digits: int):
+    # write `number` zero padded to `digits` digits into `characters[start:start + digits]`
+    for position in range(start + digits - 1, start - 1, -1):
+        number, digit = np.divmod(number, 10)
+        characters[position] = digit
+        characters[position] += ord("0")
@@ -1,17 +1,40 @@
+from typing import Optional
 
 from ajc27_freemocap_blender_addon.freemocap_data_handler.handler import FreemocapDataHandler
 
 _FREEMOCAP_DATA_HANDLER = None
 
 
-def get_or_create_freemocap_data_handler(recording_path: str):
+def get_or_create_freemocap_data_handler(recording_path: str,
+                                         stage_memory_budget_bytes: Optional[int] = None,
+                                         stage_spill_directory: Optional[str] = None):
     global _FREEMOCAP_DATA_HANDLER
     if _FREEMOCAP_DATA_HANDLER is None:
-        _FREEMOCAP_DATA_HANDLER = FreemocapDataHandler.from_recording_path(recording_path=recording_path)
+        _FREEMOCAP_DATA_HANDLER = FreemocapDataHandler.from_recording_path(
+            recording_path=recording_path,
+            stage_memory_budget_bytes=stage_memory_budget_bytes,
+            stage_spill_directory=stage_spill_directory)
     return _FREEMOCAP_DATA_HANDLER
 
 
-def create_freemocap_data_handler(recording_path: str):
+def create_freemocap_data_handler(recording_path: str,
+                                  stage_memory_budget_bytes: Optional[int] = None,
+                                  stage_spill_directory: Optional[str] = None):
     global _FREEMOCAP_DATA_HANDLER
-    _FREEMOCAP_DATA_HANDLER = FreemocapDataHandler.from_recording_path(recording_path=recording_path)
+    _FREEMOCAP_DATA_HANDLER = FreemocapDataHandler.from_recording_path(
+        recording_path=recording_path,
+        stage_memory_budget_bytes=stage_memory_budget_bytes,
+        stage_spill_directory=stage_spill_directory)
     return _FREEMOCAP_DATA_HANDLER
+
+
+def get_freemocap_data_handler() -> Optional[FreemocapDataHandler]:
+    """
+    The handler of the data loaded in this session, None if no data was loaded
+    """
+    return _FREEMOCAP_DATA_HANDLER
+
+
+def set_freemocap_data_handler(handler: Optional[FreemocapDataHandler]):
+    global _FREEMOCAP_DATA_HANDLER
+    _FREEMOCAP_DATA_HANDLER = handler
@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Optional
 
 from ajc27_freemocap_blender_addon.freemocap_data_handler.handler import FreemocapDataHandler
 from ajc27_freemocap_blender_addon.freemocap_data_handler.utilities.get_or_create_freemocap_data_handler import \
@@ -20,11 +21,15 @@ def get_test_recording_path() -> str:
 
 def load_freemocap_data(
         recording_path: str,
+        stage_memory_budget_bytes: Optional[int] = None,
+        stage_spill_directory: Optional[str] = None,
 ) -> FreemocapDataHandler:
     print(f"Loading freemocap_data from {recording_path}....")
 
     try:
-        handler = create_freemocap_data_handler(recording_path=recording_path)
+        handler = create_freemocap_data_handler(recording_path=recording_path,
+                                                stage_memory_budget_bytes=stage_memory_budget_bytes,
+                                                stage_spill_directory=stage_spill_directory)
         print(f"Loaded freemocap_data from {recording_path} successfully: \n{handler}")
         handler.mark_processing_stage("original_from_file")
     except Exception as e:
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import pickle
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+
+from ajc27_freemocap_blender_addon import __version__
+from ajc27_freemocap_blender_addon.data_models.freemocap_data.freemocap_data_model import FreemocapData
+from ajc27_freemocap_blender_addon.data_models.freemocap_data.helpers.freemocap_component_data import \
+    FreemocapComponentData
+from ajc27_freemocap_blender_addon.data_models.freemocap_data.helpers.freemocap_data_paths import FreemocapDataPaths
+from ajc27_freemocap_blender_addon.data_models.parameter_models.parameter_models import Config
+from ajc27_freemocap_blender_addon.freemocap_data_handler.handler import FreemocapDataHandler
+from ajc27_freemocap_blender_addon.freemocap_data_handler.utilities.file_writing import atomic_write
+
+# `Config` sections that affect the (non-Blender) data processing stages, changing any other section doesn't
+# invalidate the cache
+PIPELINE_CONFIG_SECTIONS = ["adjust_empties", "virtual_markers", "reduce_bone_length_dispersion", "reduce_shakiness"]
+
+_HASH_CHUNK_SIZE = 16 * 1024 * 1024
+
+# written to `[recording]/saved_data` with the key of the processed data saved there (see `write_saved_data_cache_key`)
+SAVED_DATA_CACHE_KEY_FILE_NAME = "processed_data_cache_key.txt"
+
+
+class ProcessedDataCache:
+    """
+    Persistent cache of the output of the data processing stages (load -> virtual trajectories -> inertial reference
+    frame -> rigid bones -> hand fix), so re-running on unchanged input can skip straight to the Blender stages.
+
+    Entries are keyed on the input `.npy` files, the relevant `Config` sections (and the user's virtual marker
+    definitions file, if any) and the add-on version. By default the
+    input files are fingerprinted by size and modification time, set `hash_content=True` to hash their contents instead.
+
+    Each entry is a single uncompressed `.npz` file holding the component arrays plus the pickled metadata
+    (`bone_data`, `body_dimensions`, `rotation_matrix`, etc). Saving an entry deletes the oldest ones beyond
+    `max_entries`, so changing the config doesn't pile up full copies of the recording.
+    """
+
+    def __init__(self,
+                 cache_directory: Union[str, Path],
+                 hash_content: bool = False,
+                 max_entries: int = 1):
+        self.cache_directory = Path(cache_directory)
+        self.hash_content = hash_content
+        self.max_entries = max_entries
+
+    @classmethod
+    def for_recording(cls,
+                      recording_path: Union[str, Path],
+                      hash_content: bool = False,
+                      max_entries: int = 1) -> "ProcessedDataCache":
+        return cls(cache_directory=Path(recording_path) / "saved_data" / "processed_data_cache",
+                   hash_content=hash_content,
+                   max_entries=max_entries)
+
+    def key(self, data_paths: FreemocapDataPaths, config: Config) -> str:
+        key_hash = hashlib.blake2b(digest_size=16)
+        key_hash.update(__version__.encode())
+
+        for path_name, path in sorted(data_paths.__dict__.items()):
+            key_hash.update(path_name.encode())
+            key_hash.update(self._fingerprint(Path(path)).encode())
+
+        config_sections = {section: asdict(getattr(config, section)) for section in PIPELINE_CONFIG_SECTIONS}
+        key_hash.update(json.dumps(config_sections, sort_keys=True).encode())
+        if config.virtual_markers.definitions_path:
+            key_hash.update(self._fingerprint(Path(config.virtual_markers.definitions_path)).encode())
+        return key_hash.hexdigest()
+
+    def load(self, key: str, **handler_kwargs) -> Optional[FreemocapDataHandler]:
+        """
+        Return a handler with the cached data, or None on a cache miss. `handler_kwargs` go to the handler's constructor
+        """
+        entry_path = self._entry_path(key)
+        if not entry_path.exists():
+            print(f"No cached processed data found for key {key}")
+            return None
+
+        try:
+            with np.load(str(entry_path), allow_pickle=False) as entry:
+                manifest = json.loads(entry["manifest"].tobytes().decode())
+                metadata = pickle.loads(entry["metadata"].tobytes())
+                components = {name: self._component_from_entry(entry=entry, name=name, info=info)
+                              for name, info in manifest["components"].items()}
+        except Exception as e:
+            print(f"Failed to load cached processed data from {entry_path}, ignoring it: {e}")
+            return None
+
+        print(f"Loaded cached processed data from {entry_path}")
+        other_names = [name for name in components.keys() if name not in ["body", "right_hand", "left_hand", "face"]]
+        return FreemocapDataHandler(freemocap_data=FreemocapData(
+            body=components["body"],
+            hands={"right": components["right_hand"], "left": components["left_hand"]},
+            face=components["face"],
+            other={name: components[name] for name in other_names},
+            metadata=metadata,
+        ), **handler_kwargs)
+
+    def save(self, key: str, handler: FreemocapDataHandler):
+        self.cache_directory.mkdir(parents=True, exist_ok=True)
+
+        arrays = {}
+        manifest = {"version": __version__, "components": {}}
+        components = {"body": handler.freemocap_data.body,
+                      "right_hand": handler.freemocap_data.hands["right"],
+                      "left_hand": handler.freemocap_data.hands["left"],
+                      "face": handler.freemocap_data.face}
+        components.update(handler.freemocap_data.other)
+
+        for name, component in components.items():
+            arrays[f"{name}__data"] = np.ascontiguousarray(component.data)
+            if component.error is not None:
+                arrays[f"{name}__error"] = np.ascontiguousarray(component.error)
+            manifest["components"][name] = {"name": component.name,
+                                            "data_source": component.data_source,
+                                            "trajectory_names": list(component.trajectory_names),
+                                            "error_type": component.error_type,
+                                            "has_error": component.error is not None}
+
+        arrays["manifest"] = np.frombuffer(json.dumps(manifest).encode(), dtype=np.uint8)
+        arrays["metadata"] = np.frombuffer(pickle.dumps(handler.metadata), dtype=np.uint8)
+
+        # written atomically so an interrupted save never leaves a corrupt entry behind
+        entry_path = self._entry_path(key)
+        with atomic_write(entry_path) as file:
+            np.savez(file, **arrays)
+        print(f"Saved processed data to cache: {entry_path}")
+        self.remove_old_entries(keep_key=key)
+
+    def remove_old_entries(self, keep_key: Optional[str] = None):
+        """
+        Delete the least recently saved entries until at most `max_entries` are left (never the `keep_key` entry)
+        """
+        entry_paths = sorted(self.cache_directory.glob("*.npz"), key=lambda path: path.stat().st_mtime_ns,
+                             reverse=True)
+        if keep_key is not None:
+            entry_paths = [self._entry_path(keep_key)] + [path for path in entry_paths
+                                                          if path != self._entry_path(keep_key)]
+        for entry_path in entry_paths[max(self.max_entries, 1):]:
+            try:
+                entry_path.unlink()
+                print(f"Removed old cached processed data: {entry_path}")
+            except OSError as e:
+                print(f"Failed to remove old cached processed data {entry_path}: {e}")
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_directory / f"{key}.npz"
+
+    def _fingerprint(self, path: Path) -> str:
+        if not path.exists():
+            return "missing"
+        if not self.hash_content:
+            stat = path.stat()
+            return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+        content_hash = hashlib.blake2b(digest_size=16)
+        with open(str(path), "rb") as file:
+            for chunk in iter(lambda: file.read(_HASH_CHUNK_SIZE), b""):
+                content_hash.update(chunk)
+        return content_hash.hexdigest()
+
+    @staticmethod
+    def _component_from_entry(entry: Any, name: str, info: Dict[str, Any]) -> FreemocapComponentData:
+        return FreemocapComponentData(name=info["name"],
+                                      data=entry[f"{name}__data"],
+                                      data_source=info["data_source"],
+                                      trajectory_names=info["trajectory_names"],
+                                      error=entry[f"{name}__error"] if info["has_error"] else None,
+                                      error_type=info["error_type"])
+
+
+def read_saved_data_cache_key(recording_path: Union[str, Path]) -> Optional[str]:
+    """
+    The cache key of the processed data in the recording's `saved_data` folder, None if it is unknown (saved without
+    the cache, or by an older version)
+    """
+    key_path = Path(recording_path) / "saved_data" / SAVED_DATA_CACHE_KEY_FILE_NAME
+    if not key_path.is_file():
+        return None
+    return key_path.read_text().strip() or None
+
+
+def write_saved_data_cache_key(recording_path: Union[str, Path], key: Optional[str]):
+    """
+    Record the cache key of the processed data just saved to the recording's `saved_data` folder, or remove the record
+    if the key is None, so a later cache hit knows whether that folder holds the same data
+    """
+    key_path = Path(recording_path) / "saved_data" / SAVED_DATA_CACHE_KEY_FILE_NAME
+    if key is None:
+        if key_path.is_file():
+            key_path.unlink()
+        return
+    key_path.parent.mkdir(parents=True, exist_ok=True)
+    with atomic_write(key_path) as file:
+        file.write(key.encode())
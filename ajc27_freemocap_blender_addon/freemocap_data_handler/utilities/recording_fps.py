@@ -0,0 +1,75 @@
+import warnings
+from pathlib import Path
+from typing import List, Optional, Union
+
+import numpy as np
+
+# seconds per unit of the timestamps, tried in order until one gives a plausible frame rate
+_TIMESTAMP_UNITS = {"s": 1.0, "ms": 1e-3, "us": 1e-6, "ns": 1e-9}
+_PLAUSIBLE_FPS_RANGE = (1.0, 1000.0)
+
+
+def get_recording_fps(recording_path: Union[str, Path]) -> Optional[float]:
+    """
+    Estimate the recording's frame rate from the timestamps saved with its synchronized videos
+    (`synchronized_videos/timestamps/*.npy` or `*.csv`), as the inverse of the median time between frames.
+
+    The timestamps may be in seconds, milliseconds, microseconds or nanoseconds - the unit that gives a plausible frame
+    rate is used. Returns None if the recording has no (usable) timestamps.
+    """
+    timestamps_directory = Path(recording_path) / "synchronized_videos" / "timestamps"
+    if not timestamps_directory.is_dir():
+        print(f"No timestamps found in {timestamps_directory}")
+        return None
+
+    frame_durations = []
+    for timestamps_path in sorted(timestamps_directory.iterdir()):
+        try:
+            timestamps = load_timestamps(timestamps_path)
+        except Exception as e:
+            print(f"Failed to read timestamps from {timestamps_path}: {e}")
+            continue
+        for camera_timestamps in timestamps:
+            durations = np.diff(camera_timestamps[np.isfinite(camera_timestamps)])
+            frame_durations.extend(durations[durations > 0].tolist())
+
+    if not frame_durations:
+        print(f"No usable timestamps found in {timestamps_directory}")
+        return None
+
+    median_frame_duration = float(np.median(frame_durations))
+    for unit, seconds_per_unit in _TIMESTAMP_UNITS.items():
+        fps = 1 / (median_frame_duration * seconds_per_unit)
+        if _PLAUSIBLE_FPS_RANGE[0] <= fps <= _PLAUSIBLE_FPS_RANGE[1]:
+            print(f"Recording frame rate from the timestamps in {timestamps_directory}: {fps:.3f} fps")
+            return fps
+
+    print(f"Timestamps in {timestamps_directory} don't give a plausible frame rate "
+          f"(median time between frames: {median_frame_duration})")
+    return None
+
+
+def load_timestamps(timestamps_path: Path) -> List[np.ndarray]:
+    """
+    The per-frame timestamps of each camera in a `.npy` file (frame or frame x camera) or a `.csv` file (the numeric
+    columns with `timestamp` in their name, one row per frame). Other files give no timestamps
+    """
+    if timestamps_path.suffix == ".npy":
+        timestamps = np.load(str(timestamps_path)).astype(np.float64)
+        if timestamps.ndim == 1:
+            return [timestamps]
+        if timestamps.ndim == 2:
+            return list(timestamps.T)
+        return []
+
+    if timestamps_path.suffix == ".csv":
+        with warnings.catch_warnings():
+            # non-numeric columns come back as NaN
+            warnings.simplefilter("ignore")
+            table = np.genfromtxt(str(timestamps_path), delimiter=",", names=True, dtype=np.float64)
+        if table.dtype.names is None or table.ndim != 1:
+            return []
+        return [np.asarray(table[name], dtype=np.float64) for name in table.dtype.names
+                if "timestamp" in name.lower()]
+
+    return []